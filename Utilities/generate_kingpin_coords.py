@@ -5,12 +5,17 @@ Usage:
     python generate_kingpin_coords.py --kpi 15 --caster -13.5
     python generate_kingpin_coords.py --kpi 12 --caster 5 --vertical-sep 0.066
     python generate_kingpin_coords.py --kpi 10 --caster 0 --center 0.1579,0.0,0.0
+
+Batch mode computes a whole adjustment table in one call and writes the setup LUTs:
+    python generate_kingpin_coords.py --kpi-range 6 14 1 --caster-range -16.5 -8.5 1 --kpi 10 --caster -12.5 --output-dir out
 """
 
 import argparse
-import math
+import os
 import sys
-from typing import Tuple
+from typing import List, Tuple
+
+import numpy as np
 
 
 def calculate_kingpin_coordinates(
@@ -21,6 +26,8 @@ def calculate_kingpin_coordinates(
 ) -> Tuple[Tuple[float, float, float], Tuple[float, float, float]]:
     """
     Calculate kingpin joint coordinates for given KPI and caster angles.
+    The angles may also be NumPy arrays, in which case each coordinate component is an array
+    broadcast over the inputs.
 
     Args:
         kpi_degrees: King Pin Inclination in degrees (positive = inward lean at top)
@@ -32,18 +39,18 @@ def calculate_kingpin_coordinates(
         Tuple of (top_joint_pos, bottom_joint_pos) as (lateral, vertical, longitudinal)
     """
     # Convert angles to radians
-    kpi_rad = math.radians(kpi_degrees)
-    caster_rad = math.radians(caster_degrees)
+    kpi_rad = np.radians(kpi_degrees)
+    caster_rad = np.radians(caster_degrees)
 
     # Calculate offsets from center
     half_vertical = vertical_separation / 2
 
     # Calculate lateral offset for KPI (viewed from front)
-    lateral_offset = math.tan(kpi_rad) * half_vertical
+    lateral_offset = np.tan(kpi_rad) * half_vertical
 
     # Calculate longitudinal offset for caster (viewed from side)
     # Positive caster = top joint forward of bottom joint
-    longitudinal_offset = math.tan(caster_rad) * half_vertical
+    longitudinal_offset = np.tan(caster_rad) * half_vertical
 
     # Calculate joint positions
     center_lat, center_vert, center_long = center_position
@@ -75,6 +82,7 @@ def verify_angles(
 ) -> Tuple[float, float]:
     """
     Verify the calculated angles from joint positions.
+    Works element-wise when the joint components are NumPy arrays.
 
     Returns:
         Tuple of (actual_kpi, actual_caster) in degrees
@@ -83,8 +91,8 @@ def verify_angles(
     vert_diff = top_joint[1] - bottom_joint[1]
     long_diff = top_joint[2] - bottom_joint[2]
 
-    actual_kpi = math.degrees(math.atan(lat_diff / vert_diff))
-    actual_caster = math.degrees(math.atan(long_diff / vert_diff))
+    actual_kpi = np.degrees(np.arctan(lat_diff / vert_diff))
+    actual_caster = np.degrees(np.arctan(long_diff / vert_diff))
 
     return actual_kpi, actual_caster
 
@@ -100,6 +108,169 @@ def parse_center_position(center_str: str) -> Tuple[float, float, float]:
         raise argparse.ArgumentTypeError(f"Invalid center position format: {e}")
 
 
+def angle_range(start: float, stop: float, step: float) -> np.ndarray:
+    """Inclusive range of angles in degrees, rounded to suppress float drift."""
+    if step <= 0:
+        raise ValueError("Range step must be positive")
+    count = int(np.floor((stop - start) / step + 1e-9)) + 1
+    if count < 1:
+        raise ValueError(f"Empty range: {start} to {stop}")
+    return np.round(start + np.arange(count) * step, 6)
+
+
+def calculate_adjustment_table(
+    kpi_values: np.ndarray,
+    caster_values: np.ndarray,
+    vertical_separation: float = 0.066,
+    center_position: Tuple[float, float, float] = (0.1579, 0.0, 0.0),
+) -> dict:
+    """
+    Calculate joint coordinates for every KPI x caster combination in a single vectorized pass.
+
+    Returns:
+        Dict with flattened "kpi" and "caster" arrays (KPI-major order), "top" and "bottom"
+        joint arrays of shape (N, 3), the verified angles and the max angular error.
+    """
+    kpi_grid, caster_grid = np.meshgrid(kpi_values, caster_values, indexing="ij")
+    kpi_flat = kpi_grid.ravel()
+    caster_flat = caster_grid.ravel()
+
+    top_joint, bottom_joint = calculate_kingpin_coordinates(
+        kpi_flat, caster_flat, vertical_separation, center_position
+    )
+    top = np.column_stack(np.broadcast_arrays(*top_joint))
+    bottom = np.column_stack(np.broadcast_arrays(*bottom_joint))
+
+    actual_kpi, actual_caster = verify_angles(top.T, bottom.T)
+
+    return {
+        "kpi": kpi_flat,
+        "caster": caster_flat,
+        "top": top,
+        "bottom": bottom,
+        "actual_kpi": actual_kpi,
+        "actual_caster": actual_caster,
+        "max_error": float(
+            max(np.max(np.abs(actual_kpi - kpi_flat)), np.max(np.abs(actual_caster - caster_flat)))
+        ),
+    }
+
+
+def format_lut_value(value: float) -> str:
+    """Format a LUT key or value without trailing zeros, matching the hand-written tables."""
+    text = f"{value:.6f}".rstrip("0").rstrip(".")
+    return "0" if text in ("-0", "") else text
+
+
+def write_lut(path: str, rows: List[Tuple[str, str]]):
+    """Write a "key|value" LUT in the same layout as the files in Source/base/data."""
+    with open(path, "w", newline="\n") as f:
+        f.write("\n".join(f"{key}|{value}" for key, value in rows))
+
+
+def write_adjustment_luts(
+    output_dir: str,
+    table: dict,
+    reference_kpi: float,
+    reference_caster: float,
+    vertical_separation: float = 0.066,
+    center_position: Tuple[float, float, float] = (0.1579, 0.0, 0.0),
+    lut_scale: float = 10000.0,
+    precision: int = 6,
+) -> List[str]:
+    """
+    Write the setup tables for an adjustment table produced by calculate_adjustment_table.
+
+    kingpin_adjust_lat.lut / kingpin_adjust_long.lut map the angle offset from the reference
+    setting to the top joint's lateral / longitudinal offset from its reference position,
+    scaled by lut_scale (default 10000, i.e. units of 0.1 mm). kingpin_options.lut lists every
+    combination for a setup selector, and kingpin_positions.ini holds the matching
+    J0_POS_n / J1_POS_n lines for suspensions.ini.
+
+    Returns:
+        List of written file paths
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    reference_top, _ = calculate_kingpin_coordinates(
+        reference_kpi, reference_caster, vertical_separation, center_position
+    )
+
+    kpi_values, kpi_index = np.unique(table["kpi"], return_index=True)
+    caster_values, caster_index = np.unique(table["caster"], return_index=True)
+    lat_offsets = np.round((table["top"][kpi_index, 0] - reference_top[0]) * lut_scale, 3)
+    long_offsets = np.round((table["top"][caster_index, 2] - reference_top[2]) * lut_scale, 3)
+
+    written = []
+
+    lat_path = os.path.join(output_dir, "kingpin_adjust_lat.lut")
+    write_lut(lat_path, [
+        (format_lut_value(kpi - reference_kpi), format_lut_value(offset))
+        for kpi, offset in zip(kpi_values, lat_offsets)
+    ])
+    written.append(lat_path)
+
+    long_path = os.path.join(output_dir, "kingpin_adjust_long.lut")
+    write_lut(long_path, [
+        (format_lut_value(caster - reference_caster), format_lut_value(offset))
+        for caster, offset in zip(caster_values, long_offsets)
+    ])
+    written.append(long_path)
+
+    options_path = os.path.join(output_dir, "kingpin_options.lut")
+    write_lut(options_path, [
+        (f"KPI {format_lut_value(kpi)} Caster {format_lut_value(caster)}", str(i))
+        for i, (kpi, caster) in enumerate(zip(table["kpi"], table["caster"]))
+    ])
+    written.append(options_path)
+
+    positions_path = os.path.join(output_dir, "kingpin_positions.ini")
+    with open(positions_path, "w", newline="\n") as f:
+        for i, (kpi, caster, top, bottom) in enumerate(
+            zip(table["kpi"], table["caster"], table["top"], table["bottom"])
+        ):
+            suffix = "" if i == 0 else f"_{i}"
+            comment = f" ; KPI {format_lut_value(kpi)} caster {format_lut_value(caster)}"
+            f.write(f"J0_POS{suffix}={format_coordinates(top, precision)}{comment}\n")
+            f.write(f"J1_POS{suffix}={format_coordinates(bottom, precision)}{comment}\n")
+    written.append(positions_path)
+
+    return written
+
+
+def run_batch(args) -> None:
+    """Compute and write a full KPI x caster adjustment table."""
+    kpi_values = angle_range(*args.kpi_range) if args.kpi_range else np.array([args.kpi])
+    caster_values = angle_range(*args.caster_range) if args.caster_range else np.array([args.caster])
+
+    # Offsets in the adjustment LUTs are relative to --kpi/--caster, or the middle of each range.
+    reference_kpi = args.kpi if args.kpi is not None else float(kpi_values[len(kpi_values) // 2])
+    reference_caster = (
+        args.caster if args.caster is not None else float(caster_values[len(caster_values) // 2])
+    )
+
+    table = calculate_adjustment_table(kpi_values, caster_values, args.vertical_sep, args.center)
+
+    print(f"Kingpin adjustment table: {len(kpi_values)} KPI x {len(caster_values)} caster "
+          f"= {len(table['kpi'])} settings")
+    print(f"Reference setting: KPI={reference_kpi}° Caster={reference_caster}°")
+    print(f"Max angular error: {table['max_error']:.3e}°")
+
+    if args.output_dir:
+        written = write_adjustment_luts(
+            args.output_dir,
+            table,
+            reference_kpi,
+            reference_caster,
+            args.vertical_sep,
+            args.center,
+            args.lut_scale,
+            args.precision,
+        )
+        print()
+        for path in written:
+            print(f"Wrote {path}")
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="Generate kingpin coordinates for given KPI and caster angles",
@@ -109,21 +280,51 @@ Examples:
   %(prog)s --kpi 15 --caster -13.5
   %(prog)s --kpi 12 --caster 5 --vertical-sep 0.066
   %(prog)s --kpi 10 --caster 0 --center 0.16,0.0,0.0
+  %(prog)s --kpi-range 6 14 1 --caster-range -16.5 -8.5 1 --output-dir out
         """,
     )
 
     parser.add_argument(
         "--kpi",
         type=float,
-        required=True,
-        help="King Pin Inclination in degrees (positive = inward lean at top)",
+        help="King Pin Inclination in degrees (positive = inward lean at top). "
+        "In batch mode, the reference setting for the adjustment LUTs",
     )
 
     parser.add_argument(
         "--caster",
         type=float,
-        required=True,
-        help="Caster angle in degrees (positive = forward lean at top)",
+        help="Caster angle in degrees (positive = forward lean at top). "
+        "In batch mode, the reference setting for the adjustment LUTs",
+    )
+
+    parser.add_argument(
+        "--kpi-range",
+        type=float,
+        nargs=3,
+        metavar=("START", "STOP", "STEP"),
+        help="Batch mode: inclusive range of KPI angles in degrees",
+    )
+
+    parser.add_argument(
+        "--caster-range",
+        type=float,
+        nargs=3,
+        metavar=("START", "STOP", "STEP"),
+        help="Batch mode: inclusive range of caster angles in degrees",
+    )
+
+    parser.add_argument(
+        "--output-dir",
+        type=str,
+        help="Batch mode: directory to write the adjustment LUTs and J0_POS/J1_POS lines to",
+    )
+
+    parser.add_argument(
+        "--lut-scale",
+        type=float,
+        default=10000.0,
+        help="Batch mode: multiplier from meters to adjustment LUT units (default: 10000, 0.1 mm)",
     )
 
     parser.add_argument(
@@ -153,7 +354,20 @@ Examples:
 
     args = parser.parse_args()
 
+    batch_mode = args.kpi_range is not None or args.caster_range is not None
+    if batch_mode:
+        if args.kpi_range is None and args.kpi is None:
+            parser.error("batch mode needs --kpi-range or a fixed --kpi")
+        if args.caster_range is None and args.caster is None:
+            parser.error("batch mode needs --caster-range or a fixed --caster")
+    elif args.kpi is None or args.caster is None:
+        parser.error("--kpi and --caster are required (or use --kpi-range/--caster-range)")
+
     try:
+        if batch_mode:
+            run_batch(args)
+            return
+
         # Calculate coordinates
         top_joint, bottom_joint = calculate_kingpin_coordinates(
             args.kpi, args.caster, args.vertical_sep, args.center
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+This script sweeps the front wheel through a range of steering angles about the kingpin axis
+placed by generate_kingpin_coords.py and reports the derived steering geometry:
+scrub radius, mechanical trail, jacking height, camber change and road wheel angle.
+Every KPI x caster x steer combination is evaluated in a single vectorized pass.
+
+Coordinates follow generate_kingpin_coords.py: (lateral, vertical, longitudinal) in meters,
+with lateral positive inboard and longitudinal positive forward.
+
+Usage:
+    python kingpin_kinematics.py --kpi 10 --caster -12.5
+    python kingpin_kinematics.py --kpi-range 6 14 2 --caster-range -16 -8 2 --steer-range 0 90 5
+    python kingpin_kinematics.py --kpi 10 --caster -12.5 --output-dir out --quantities camber_change jacking_height
+"""
+
+import argparse
+import os
+import sys
+from typing import List, Tuple
+
+import numpy as np
+
+from generate_kingpin_coords import (
+    angle_range,
+    calculate_kingpin_coordinates,
+    format_lut_value,
+    parse_center_position,
+    write_lut,
+)
+
+QUANTITIES = {
+    "scrub_radius": "Scrub radius in meters (positive = kingpin axis meets the ground inboard of the contact patch)",
+    "mechanical_trail": "Mechanical trail in meters (positive = kingpin axis meets the ground ahead of the contact patch)",
+    "jacking_height": "Height the contact patch drops below the static ground plane in meters (lifts the chassis)",
+    "camber_change": "Camber relative to zero steer in degrees (positive = top of the wheel outboard)",
+    "road_wheel_angle": "Heading of the wheel about the vertical axis in degrees",
+}
+
+UP = np.array([0.0, 1.0, 0.0])
+INBOARD = np.array([1.0, 0.0, 0.0])
+FORWARD = np.array([0.0, 0.0, 1.0])
+
+
+def kingpin_axes(
+    kpi_degrees: np.ndarray,
+    caster_degrees: np.ndarray,
+    vertical_separation: float = 0.066,
+    center_position: Tuple[float, float, float] = (0.1579, 0.0, 0.0),
+) -> np.ndarray:
+    """
+    Unit kingpin axis (bottom joint -> top joint) for each KPI/caster pair.
+
+    Returns:
+        Array of shape broadcast(kpi, caster) + (3,)
+    """
+    top_joint, bottom_joint = calculate_kingpin_coordinates(
+        kpi_degrees, caster_degrees, vertical_separation, center_position
+    )
+    axis = np.stack(np.broadcast_arrays(*(t - b for t, b in zip(top_joint, bottom_joint))), axis=-1)
+    return axis / np.linalg.norm(axis, axis=-1, keepdims=True)
+
+
+def rotation_matrices(axes: np.ndarray, angles_degrees: np.ndarray) -> np.ndarray:
+    """
+    Rodrigues rotation matrices for every axis/angle combination.
+
+    Args:
+        axes: Unit axes of shape (..., 3)
+        angles_degrees: Rotation angles of shape (S,)
+
+    Returns:
+        Array of shape (..., S, 3, 3)
+    """
+    theta = np.radians(angles_degrees)
+    cos = np.cos(theta)[:, None, None]
+    sin = np.sin(theta)[:, None, None]
+
+    x, y, z = axes[..., 0], axes[..., 1], axes[..., 2]
+    zero = np.zeros_like(x)
+    cross = np.stack([
+        np.stack([zero, -z, y], axis=-1),
+        np.stack([z, zero, -x], axis=-1),
+        np.stack([-y, x, zero], axis=-1),
+    ], axis=-2)
+    outer = axes[..., :, None] * axes[..., None, :]
+
+    cross = cross[..., None, :, :]
+    outer = outer[..., None, :, :]
+    return cos * np.eye(3) + sin * cross + (1.0 - cos) * outer
+
+
+def contact_points(wheel_centers: np.ndarray, spin_axes: np.ndarray, tire_radius: float) -> np.ndarray:
+    """Lowest point of each wheel circle, given its center and spin axis."""
+    down_in_plane = UP - np.sum(UP * spin_axes, axis=-1, keepdims=True) * spin_axes
+    down_in_plane /= np.linalg.norm(down_in_plane, axis=-1, keepdims=True)
+    return wheel_centers - tire_radius * down_in_plane
+
+
+def sweep_steering(
+    kpi_values: np.ndarray,
+    caster_values: np.ndarray,
+    steer_values: np.ndarray,
+    wheel_center: Tuple[float, float, float] = (0.0, 0.0, 0.0),
+    tire_radius: float = 0.130,
+    vertical_separation: float = 0.066,
+    center_position: Tuple[float, float, float] = (0.1579, 0.0, 0.0),
+) -> dict:
+    """
+    Rotate the wheel about the kingpin axis for every KPI x caster x steer combination.
+
+    The wheel starts with zero camber and toe. Steering angles are rotations about the kingpin
+    axis, which is why road_wheel_angle is reported separately.
+
+    Returns:
+        Dict with the input "kpi", "caster" and "steer" arrays and one array of shape
+        (len(kpi), len(caster), len(steer)) per entry in QUANTITIES.
+    """
+    kpi_values = np.asarray(kpi_values, dtype=float)
+    caster_values = np.asarray(caster_values, dtype=float)
+    steer_values = np.asarray(steer_values, dtype=float)
+
+    kpi_grid, caster_grid = np.meshgrid(kpi_values, caster_values, indexing="ij")
+    axes = kingpin_axes(kpi_grid, caster_grid, vertical_separation, center_position)
+    rotations = rotation_matrices(axes, steer_values)  # (K, C, S, 3, 3)
+
+    pivot = np.asarray(center_position, dtype=float)
+    wheel = np.asarray(wheel_center, dtype=float)
+
+    wheel_centers = pivot + np.einsum("...ij,j->...i", rotations, wheel - pivot)
+    spin_axes = np.einsum("...ij,j->...i", rotations, INBOARD)
+    headings = np.einsum("...ij,j->...i", rotations, FORWARD)
+    contacts = contact_points(wheel_centers, spin_axes, tire_radius)
+
+    # Static ground plane sits under the unsteered wheel.
+    ground_height = wheel[1] - tire_radius
+
+    # Kingpin axis intersection with the ground plane, per setup.
+    t = (ground_height - pivot[1]) / axes[..., 1]
+    axis_ground = pivot + t[..., None] * axes  # (K, C, 3)
+    offset = axis_ground[..., None, :] - contacts  # (K, C, S, 3)
+
+    # Project the rotated heading onto the ground to get the wheel's longitudinal/lateral frame.
+    heading_ground = headings * np.array([1.0, 0.0, 1.0])
+    heading_ground /= np.linalg.norm(heading_ground, axis=-1, keepdims=True)
+    lateral_ground = np.cross(UP, heading_ground)
+
+    return {
+        "kpi": kpi_values,
+        "caster": caster_values,
+        "steer": steer_values,
+        "scrub_radius": np.sum(offset * lateral_ground, axis=-1),
+        "mechanical_trail": np.sum(offset * heading_ground, axis=-1),
+        "jacking_height": ground_height - contacts[..., 1],
+        # The unsteered wheel has zero camber, so the spin axis tilt is the camber change.
+        "camber_change": np.degrees(np.arcsin(np.clip(spin_axes[..., 1], -1.0, 1.0))),
+        "road_wheel_angle": np.degrees(np.arctan2(heading_ground[..., 0], heading_ground[..., 2])),
+    }
+
+
+def write_sweep_luts(
+    output_dir: str,
+    sweep: dict,
+    quantities: List[str],
+    scale: float = 1.0,
+    precision: int = 6,
+) -> List[str]:
+    """
+    Write one steer-angle keyed LUT per setup and quantity, in the same "x|y" layout as
+    steer_sin.lut and tierod_adjust.lut. Values are multiplied by scale before writing.
+
+    Returns:
+        List of written file paths
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    written = []
+    steer_keys = [format_lut_value(s) for s in sweep["steer"]]
+
+    for i, kpi in enumerate(sweep["kpi"]):
+        for j, caster in enumerate(sweep["caster"]):
+            setup_tag = f"kpi{format_lut_value(kpi)}_caster{format_lut_value(caster)}"
+            for quantity in quantities:
+                values = np.round(sweep[quantity][i, j] * scale, precision)
+                path = os.path.join(output_dir, f"{quantity}_{setup_tag}.lut")
+                write_lut(path, list(zip(steer_keys, (format_lut_value(v) for v in values))))
+                written.append(path)
+
+    return written
+
+
+def print_summary(sweep: dict) -> None:
+    """Print static and full-lock geometry for each setup."""
+    print(f"{'KPI':>6} {'Caster':>7} | {'Scrub mm':>8} {'Trail mm':>8} | "
+          f"@ {format_lut_value(sweep['steer'][-1])}°: {'Jack mm':>7} {'Camber °':>8} {'RWA °':>7}")
+    for i, kpi in enumerate(sweep["kpi"]):
+        for j, caster in enumerate(sweep["caster"]):
+            print(
+                f"{kpi:6.2f} {caster:7.2f} | "
+                f"{sweep['scrub_radius'][i, j, 0] * 1000:8.2f} "
+                f"{sweep['mechanical_trail'][i, j, 0] * 1000:8.2f} | "
+                f"{'':>{len(format_lut_value(sweep['steer'][-1])) + 4}}"
+                f"{sweep['jacking_height'][i, j, -1] * 1000:7.2f} "
+                f"{sweep['camber_change'][i, j, -1]:8.3f} "
+                f"{sweep['road_wheel_angle'][i, j, -1]:7.2f}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Sweep steering geometry about the kingpin axis for one or many KPI/caster setups",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="Quantities:\n" + "\n".join(f"  {name}: {desc}" for name, desc in QUANTITIES.items()),
+    )
+
+    parser.add_argument("--kpi", type=float, help="King Pin Inclination in degrees")
+    parser.add_argument("--caster", type=float, help="Caster angle in degrees")
+    parser.add_argument(
+        "--kpi-range", type=float, nargs=3, metavar=("START", "STOP", "STEP"),
+        help="Inclusive range of KPI angles in degrees",
+    )
+    parser.add_argument(
+        "--caster-range", type=float, nargs=3, metavar=("START", "STOP", "STEP"),
+        help="Inclusive range of caster angles in degrees",
+    )
+    parser.add_argument(
+        "--steer-range", type=float, nargs=3, metavar=("START", "STOP", "STEP"), default=[0, 90, 5],
+        help="Inclusive range of steering rotations about the kingpin in degrees (default: 0 90 5)",
+    )
+    parser.add_argument(
+        "--wheel-center", type=parse_center_position, default=(0.0, 0.0, 0.0),
+        help='Wheel center as "lat,vert,long" in meters (default: 0.0, 0.0, 0.0)',
+    )
+    parser.add_argument(
+        "--tire-radius", type=float, default=0.130,
+        help="Tire radius in meters (default: 0.130)",
+    )
+    parser.add_argument(
+        "--vertical-sep", type=float, default=0.066,
+        help="Vertical separation between kingpin joints in meters (default: 0.066)",
+    )
+    parser.add_argument(
+        "--center", type=parse_center_position, default=(0.1579, 0.0, 0.0),
+        help='Kingpin center as "lat,vert,long" in meters (default: 0.1579, 0.0, 0.0)',
+    )
+    parser.add_argument(
+        "--output-dir", type=str,
+        help="Directory to write one steer-keyed LUT per setup and quantity to",
+    )
+    parser.add_argument(
+        "--quantities", nargs="+", choices=list(QUANTITIES), default=list(QUANTITIES),
+        help="Quantities to write as LUTs (default: all)",
+    )
+    parser.add_argument(
+        "--scale", type=float, default=1.0,
+        help="Multiplier applied to LUT values, e.g. 1000 for millimeters (default: 1.0)",
+    )
+    parser.add_argument(
+        "--precision", type=int, default=6,
+        help="Decimal precision for LUT values (default: 6)",
+    )
+
+    args = parser.parse_args()
+
+    if args.kpi_range is None and args.kpi is None:
+        parser.error("--kpi or --kpi-range is required")
+    if args.caster_range is None and args.caster is None:
+        parser.error("--caster or --caster-range is required")
+
+    try:
+        kpi_values = angle_range(*args.kpi_range) if args.kpi_range else np.array([args.kpi])
+        caster_values = angle_range(*args.caster_range) if args.caster_range else np.array([args.caster])
+        steer_values = angle_range(*args.steer_range)
+
+        sweep = sweep_steering(
+            kpi_values,
+            caster_values,
+            steer_values,
+            args.wheel_center,
+            args.tire_radius,
+            args.vertical_sep,
+            args.center,
+        )
+
+        print(f"Steering sweep: {len(kpi_values)} KPI x {len(caster_values)} caster x "
+              f"{len(steer_values)} steer angles")
+        print()
+        print_summary(sweep)
+
+        if args.output_dir:
+            written = write_sweep_luts(args.output_dir, sweep, args.quantities, args.scale, args.precision)
+            print()
+            print(f"Wrote {len(written)} LUT(s) to {args.output_dir}")
+
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
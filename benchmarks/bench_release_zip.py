@@ -0,0 +1,80 @@
+"""
+bench_release_zip.py
+
+Times write_release_zip() on synthetic release members under each --backend, to show how
+deflating large members on the process pool (hybrid, processes) scales with cores compared
+with zipfile deflating them one by one (threads).
+
+Usage:
+    python benchmarks/bench_release_zip.py [--files 16] [--size 8M] [--repeat 3] [--workers N]
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import builder  # noqa: E402
+
+
+def make_members(folder, files, size, seed=0):
+    """Writes files of size bytes that deflate about as well as car data (partly repetitive)."""
+    rng = random.Random(seed)
+    members = []
+    for index in range(files):
+        path = os.path.join(folder, f"car_{index % 4}", f"member_{index}.bin")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            written = 0
+            while written < size:
+                if rng.random() < 0.5:
+                    block = rng.getrandbits(4096 * 8).to_bytes(4096, "little")
+                else:
+                    block = bytes([rng.randrange(256)]) * 4096
+                f.write(block[:size - written])
+                written += len(block)
+        members.append((path, f"content/cars/car_{index % 4}/member_{index}.bin"))
+    return members
+
+
+def time_backend(backend, members, out_dir, workers, repeat):
+    executors = builder.BuildExecutors(backend, workers)
+    try:
+        # The first run also starts the process pool; it is not counted.
+        builder.write_release_zip(os.path.join(out_dir, f"{backend}.zip"), members, executors)
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            builder.write_release_zip(os.path.join(out_dir, f"{backend}.zip"), members, executors)
+            timings.append(time.perf_counter() - start)
+    finally:
+        executors.shutdown()
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark release zip packing per --backend")
+    parser.add_argument("--files", type=int, default=16, help="Number of large members (default: 16)")
+    parser.add_argument("--size", type=builder.parse_byte_size, default=8 * 1024 * 1024, help="Size of each member (default: 8M)")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per backend, median reported (default: 3)")
+    parser.add_argument("--workers", type=int, default=4, help="--workers passed to BuildExecutors (default: 4)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        members = make_members(os.path.join(folder, "Build"), args.files, args.size)
+        total = args.files * args.size
+        print(f"{args.files} member(s) x {builder.format_bytes(args.size)} on {os.cpu_count()} CPU(s)")
+        baseline = None
+        for backend in ("threads", "hybrid", "processes"):
+            seconds = time_backend(backend, members, folder, args.workers, args.repeat)
+            baseline = baseline or seconds
+            print(f"  {backend:<10} {seconds:7.3f} s  {total / seconds / 1024 ** 2:8.1f} MiB/s  x{baseline / seconds:.2f}")
+
+
+if __name__ == "__main__":
+    main()
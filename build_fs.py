@@ -0,0 +1,490 @@
+"""
+build_fs.py
+
+Filesystems the builder writes car folders and releases through.
+
+Every backend offers the same small set of operations on absolute, OS-style paths: scan (list
+a folder), stat, open_read, open_write, link and remove, plus helpers built on them (walk,
+exists, rename, rmtree, copy_in). The builder's stages only use these for their output, so the
+same pipeline can assemble cars on:
+
+    DiskFileSystem      the real disk (the default; operations map straight to os/shutil)
+    MemoryFileSystem    a thread-safe tree in RAM, e.g. for builder.py --in-memory or tests
+    ZipFileSystem       a write-only zip archive, for the release and patch zips
+
+Stages that hand files to other programs (QuickBMS, the PNG process pool, ...) need real paths;
+export_tree() and import_tree() move a subtree between a backend and a disk folder for them.
+
+Release zip members can be compressed elsewhere (e.g. on a process pool) with deflate_file()
+and appended with ZipFileSystem.write_raw_member().
+"""
+
+import io
+import os
+import time
+import shutil
+import threading
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class FileStat(NamedTuple):
+    st_size: int
+    st_mtime_ns: int
+
+
+class FileEntry(NamedTuple):
+    """A folder entry as returned by scan(); mirrors the parts of os.DirEntry the builder uses."""
+
+    name: str
+    path: str
+    dir: bool
+
+    def is_dir(self) -> bool:
+        return self.dir
+
+    def is_file(self) -> bool:
+        return not self.dir
+
+
+class FileSystem:
+    """Operations the build pipeline writes through. Subclasses implement the first six."""
+
+    is_disk = False
+
+    def scan(self, path: str) -> List[FileEntry]:
+        raise NotImplementedError
+
+    def stat(self, path: str) -> FileStat:
+        raise NotImplementedError
+
+    def open_read(self, path: str):
+        raise NotImplementedError
+
+    def open_write(self, path: str):
+        """A binary file object; missing parent folders are created."""
+        raise NotImplementedError
+
+    def link(self, src: str, dst: str):
+        """Makes dst a file with the same content as src, sharing it where the backend can."""
+        raise NotImplementedError
+
+    def remove(self, path: str):
+        raise NotImplementedError
+
+    def isdir(self, path: str) -> bool:
+        raise NotImplementedError
+
+    def makedirs(self, path: str):
+        raise NotImplementedError
+
+    def exists(self, path: str) -> bool:
+        try:
+            self.stat(path)
+            return True
+        except FileNotFoundError:
+            return self.isdir(path)
+
+    def walk(self, top: str) -> Iterator[Tuple[str, List[str], List[str]]]:
+        """Like os.walk (top-down); the dirs list may be pruned or reordered in place."""
+        try:
+            entries = self.scan(top)
+        except FileNotFoundError:
+            return
+        dirs = [entry.name for entry in entries if entry.is_dir()]
+        files = [entry.name for entry in entries if not entry.is_dir()]
+        yield top, dirs, files
+        for name in dirs:
+            yield from self.walk(os.path.join(top, name))
+
+    def rename(self, src: str, dst: str):
+        self.link(src, dst)
+        self.remove(src)
+
+    def rmtree(self, path: str):
+        for root, dirs, files in list(self.walk(path)):
+            for name in files:
+                self.remove(os.path.join(root, name))
+
+    def read_bytes(self, path: str) -> bytes:
+        with self.open_read(path) as f:
+            return f.read()
+
+    def copy_in(self, src: str, dst: str):
+        """Copies the disk file src to dst on this filesystem."""
+        with open(src, "rb") as fsrc, self.open_write(dst) as fdst:
+            shutil.copyfileobj(fsrc, fdst, CHUNK_SIZE)
+
+
+class DiskFileSystem(FileSystem):
+    is_disk = True
+
+    def scan(self, path):
+        with os.scandir(path) as entries:
+            return [FileEntry(entry.name, entry.path, entry.is_dir()) for entry in entries]
+
+    def stat(self, path):
+        return os.stat(path)
+
+    def open_read(self, path):
+        return open(path, "rb")
+
+    def open_write(self, path):
+        try:
+            return open(path, "wb")
+        except FileNotFoundError:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            return open(path, "wb")
+
+    def link(self, src, dst):
+        if os.path.exists(dst):
+            os.remove(dst)
+        try:
+            os.link(src, dst)
+        except OSError:
+            shutil.copyfile(src, dst)
+
+    def remove(self, path):
+        os.remove(path)
+
+    def isdir(self, path):
+        return os.path.isdir(path)
+
+    def makedirs(self, path):
+        os.makedirs(path, exist_ok=True)
+
+    def exists(self, path):
+        return os.path.exists(path)
+
+    def walk(self, top):
+        return os.walk(top)
+
+    def rename(self, src, dst):
+        os.replace(src, dst)
+
+    def rmtree(self, path):
+        shutil.rmtree(path)
+
+    def copy_in(self, src, dst):
+        shutil.copyfile(src, dst)
+
+
+DISK = DiskFileSystem()
+
+
+class _MemoryWriter(io.BytesIO):
+    """Collects a file's bytes and stores them in the MemoryFileSystem when closed."""
+
+    def __init__(self, filesystem: "MemoryFileSystem", path: str):
+        super().__init__()
+        self.filesystem = filesystem
+        self.path = path
+
+    def close(self):
+        if not self.closed:
+            self.filesystem._store(self.path, self.getvalue())
+        super().close()
+
+
+class MemoryFileSystem(FileSystem):
+    """
+    Files and folders held in RAM under the same absolute paths they would have on disk. File
+    contents are immutable bytes, so link() shares them and readers never see a half-written
+    file: a write becomes visible when its file object is closed.
+    """
+
+    def __init__(self):
+        self.files: Dict[str, Tuple[bytes, int]] = {}
+        self.children: Dict[str, Dict[str, bool]] = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _key(path: str) -> str:
+        return os.path.abspath(path)
+
+    def _add_parents(self, key: str):
+        # Caller holds the lock. Registers key in its folder, creating missing folders up to the root.
+        is_dir = key in self.children
+        while True:
+            parent = os.path.dirname(key)
+            if parent == key:
+                return
+            siblings = self.children.get(parent)
+            if siblings is not None:
+                siblings[os.path.basename(key)] = is_dir
+                return
+            self.children[parent] = {os.path.basename(key): is_dir}
+            key, is_dir = parent, True
+
+    def _store(self, path: str, content: bytes):
+        key = self._key(path)
+        with self.lock:
+            if key in self.children:
+                raise IsADirectoryError(path)
+            self.files[key] = (content, time.time_ns())
+            self._add_parents(key)
+
+    def scan(self, path):
+        key = self._key(path)
+        with self.lock:
+            if key not in self.children:
+                raise FileNotFoundError(path)
+            names = sorted(self.children[key].items())
+        return [FileEntry(name, os.path.join(path, name), is_dir) for name, is_dir in names]
+
+    def stat(self, path):
+        with self.lock:
+            entry = self.files.get(self._key(path))
+        if entry is None:
+            raise FileNotFoundError(path)
+        return FileStat(len(entry[0]), entry[1])
+
+    def open_read(self, path):
+        with self.lock:
+            entry = self.files.get(self._key(path))
+        if entry is None:
+            raise FileNotFoundError(path)
+        return io.BytesIO(entry[0])
+
+    def open_write(self, path):
+        return _MemoryWriter(self, path)
+
+    def link(self, src, dst):
+        with self.lock:
+            entry = self.files.get(self._key(src))
+        if entry is None:
+            raise FileNotFoundError(src)
+        self._store(dst, entry[0])
+
+    def remove(self, path):
+        key = self._key(path)
+        with self.lock:
+            if self.files.pop(key, None) is None:
+                raise FileNotFoundError(path)
+            self.children[os.path.dirname(key)].pop(os.path.basename(key), None)
+
+    def isdir(self, path):
+        with self.lock:
+            return self._key(path) in self.children
+
+    def makedirs(self, path):
+        key = self._key(path)
+        with self.lock:
+            if key in self.files:
+                raise FileExistsError(path)
+            self.children.setdefault(key, {})
+            self._add_parents(key)
+
+    def rmtree(self, path):
+        key = self._key(path)
+        prefix = key.rstrip(os.sep) + os.sep
+        with self.lock:
+            for name in [name for name in self.files if name.startswith(prefix)]:
+                del self.files[name]
+            for name in [name for name in self.children if name == key or name.startswith(prefix)]:
+                del self.children[name]
+            parent = self.children.get(os.path.dirname(key))
+            if parent is not None:
+                parent.pop(os.path.basename(key), None)
+
+    def total_bytes(self) -> int:
+        with self.lock:
+            return sum(len(content) for content, mtime_ns in self.files.values())
+
+
+class _ZipMemberWriter(io.RawIOBase):
+    """One member being written to a ZipFileSystem; holds the archive's lock until closed."""
+
+    def __init__(self, filesystem: "ZipFileSystem", zinfo, member):
+        super().__init__()
+        self.filesystem = filesystem
+        self.zinfo = zinfo
+        self.member = member
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        return self.member.write(data)
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            self.member.close()
+            self.filesystem.written[self.zinfo.filename] = FileStat(self.zinfo.file_size, time.time_ns())
+        finally:
+            super().close()
+            self.filesystem.lock.release()
+
+
+def deflate_file(src_path: str, raw_path: str) -> Tuple[int, int, int]:
+    """
+    Raw-deflates src_path into raw_path the way zipfile would for ZIP_DEFLATED, for
+    ZipFileSystem.write_raw_member(). Safe to run in a worker process; returns
+    (crc32, file_size, compress_size).
+    """
+    import zlib
+
+    compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+    crc = 0
+    file_size = 0
+    compress_size = 0
+    with open(src_path, "rb") as src, open(raw_path, "wb") as dst:
+        for chunk in iter(lambda: src.read(CHUNK_SIZE), b""):
+            crc = zlib.crc32(chunk, crc)
+            file_size += len(chunk)
+            compressed = compressor.compress(chunk)
+            compress_size += len(compressed)
+            dst.write(compressed)
+        compressed = compressor.flush()
+        compress_size += len(compressed)
+        dst.write(compressed)
+    return crc, file_size, compress_size
+
+
+# zipfile has no public way to add already-compressed data. write_raw_member() does what
+# ZipFile's own member writer does when it closes, through these internals (present in
+# current CPython releases); ZipFileSystem.raw_members says whether this zipfile has them all.
+_RAW_MEMBER_ATTRIBUTES = ("fp", "filelist", "NameToInfo", "start_dir", "_writing", "_writecheck", "_didModify")
+
+
+class ZipFileSystem(FileSystem):
+    """
+    A write-only zip archive (ZIP_DEFLATED) whose paths are archive names ("content/cars/...").
+    Members are written one at a time in the order their files are closed; reading, linking and
+    removing are not supported. write_raw_member() appends members compressed elsewhere when
+    raw_members is true; otherwise callers write them normally.
+    """
+
+    def __init__(self, zip_path: str):
+        import zipfile
+
+        self.zipfile = zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED)
+        self.written: Dict[str, FileStat] = {}
+        self.lock = threading.Lock()
+        self.raw_members = (all(hasattr(self.zipfile, name) for name in _RAW_MEMBER_ATTRIBUTES)
+                            and hasattr(zipfile.ZipInfo, "FileHeader"))
+
+    def close(self):
+        self.zipfile.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def open_write(self, path, date_time: Optional[Tuple[int, int, int, int, int, int]] = None,
+                   large: bool = False):
+        """A writer for one member; others wait until it is closed. large allows members over 2 GiB."""
+        import zipfile
+
+        zinfo = zipfile.ZipInfo(path.replace("\\", "/"), date_time or time.localtime()[:6])
+        zinfo.compress_type = zipfile.ZIP_DEFLATED
+        self.lock.acquire()
+        try:
+            return _ZipMemberWriter(self, zinfo, self.zipfile.open(zinfo, "w", force_zip64=large))
+        except BaseException:
+            self.lock.release()
+            raise
+
+    def write_from(self, filesystem: FileSystem, path: str, archive_name: str):
+        """Adds the file at path on filesystem as archive_name, keeping its modification time."""
+        if filesystem.is_disk:
+            with self.lock:
+                self.zipfile.write(path, archive_name)
+                self.written[archive_name] = FileStat(os.path.getsize(path), time.time_ns())
+            return
+        import zipfile
+
+        stat = filesystem.stat(path)
+        date_time = time.localtime(stat.st_mtime_ns / 1e9)[:6]
+        large = stat.st_size >= zipfile.ZIP64_LIMIT
+        with filesystem.open_read(path) as src, self.open_write(archive_name, date_time, large) as dst:
+            shutil.copyfileobj(src, dst, CHUNK_SIZE)
+
+    def write_raw_member(self, src_path: str, archive_name: str, raw_path: str,
+                         crc: int, file_size: int, compress_size: int) -> bool:
+        """
+        Appends the disk file src_path as archive_name from raw_path, its data as deflate_file()
+        compressed it (keeping src_path's modification time and permissions). Returns False,
+        writing nothing, if raw_members is false or the member would need ZIP64 sizes; the
+        caller then writes it with write_from().
+        """
+        import zipfile
+
+        if not self.raw_members or max(file_size, compress_size) >= zipfile.ZIP64_LIMIT:
+            return False
+
+        zinfo = zipfile.ZipInfo.from_file(src_path, archive_name)
+        zinfo.compress_type = zipfile.ZIP_DEFLATED
+        zinfo.CRC = crc
+        zinfo.file_size = file_size
+        zinfo.compress_size = compress_size
+        archive = self.zipfile
+        with self.lock:
+            # The same checks ZipFile.write() makes: no member open for writing, a writable
+            # archive, and a warning for a duplicate name.
+            if archive._writing:
+                raise ValueError("Can't write to ZIP archive while an open writing handle exists")
+            archive._writecheck(zinfo)
+            archive._didModify = True
+            zinfo.header_offset = archive.fp.tell()
+            archive.fp.write(zinfo.FileHeader(False))
+            with open(raw_path, "rb") as f:
+                shutil.copyfileobj(f, archive.fp, CHUNK_SIZE)
+            archive.start_dir = archive.fp.tell()
+            archive.filelist.append(zinfo)
+            archive.NameToInfo[zinfo.filename] = zinfo
+            self.written[zinfo.filename] = FileStat(file_size, time.time_ns())
+        return True
+
+    def stat(self, path):
+        stat = self.written.get(path.replace("\\", "/"))
+        if stat is None:
+            raise FileNotFoundError(path)
+        return stat
+
+    def isdir(self, path):
+        prefix = path.replace("\\", "/").rstrip("/") + "/"
+        return any(name.startswith(prefix) for name in self.written)
+
+    def makedirs(self, path):
+        pass
+
+    def scan(self, path):
+        raise io.UnsupportedOperation("zip archives are write-only")
+
+    def open_read(self, path):
+        raise io.UnsupportedOperation("zip archives are write-only")
+
+    def link(self, src, dst):
+        raise io.UnsupportedOperation("zip archives are write-only")
+
+    def remove(self, path):
+        raise io.UnsupportedOperation("zip archives are write-only")
+
+
+def export_tree(filesystem: FileSystem, src: str, dst: str):
+    """Writes the subtree src of filesystem into the disk folder dst."""
+    for root, dirs, files in filesystem.walk(src):
+        target_dir = os.path.join(dst, os.path.relpath(root, src))
+        os.makedirs(target_dir, exist_ok=True)
+        for name in files:
+            with filesystem.open_read(os.path.join(root, name)) as fsrc, \
+                    open(os.path.join(target_dir, name), "wb") as fdst:
+                shutil.copyfileobj(fsrc, fdst, CHUNK_SIZE)
+
+
+def import_tree(filesystem: FileSystem, src: str, dst: str):
+    """Replaces the subtree dst of filesystem with the contents of the disk folder src."""
+    if filesystem.exists(dst):
+        filesystem.rmtree(dst)
+    filesystem.makedirs(dst)
+    for root, dirs, files in os.walk(src):
+        target_dir = os.path.join(dst, os.path.relpath(root, src))
+        filesystem.makedirs(target_dir)
+        for name in files:
+            filesystem.copy_in(os.path.join(root, name), os.path.join(target_dir, name))
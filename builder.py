@@ -11,12 +11,81 @@ It does the following:
    - Creates a folder in Build with the car folder's name.
    - Copies the global data (from Source/data) into a "data" subfolder in the new car folder.
    - Copies all other files and folders (skipping any "data" item) from the source car folder into the new built car folder.
-   - Renames "model.kn5" in the new car folder to "[CAR_FOLDER_NAME].kn5".
-   - Edits the "lods.ini" file in the built car folder's data directory so that under the "[LOD_0]" group the line
-     "FILE=" is set to the new kn5 filename.
+   - Substitutes the car's identity while copying (see TokenSubstitution): "model.kn5" becomes
+     "[CAR_FOLDER_NAME].kn5" both as a file name and in text files, the sound bank in sfx/ becomes
+     "[CAR_FOLDER_NAME].bank" with its references in GUIDs.txt, "FILE=" under [LOD_0] in lods.ini
+     names "[CAR_FOLDER_NAME].kn5", tokens listed under [build.substitute] "tokens" in info.toml
+     (e.g. the template car's name in GUIDs.txt) become their per-car values, and ui_car.json gets
+     the version, year and build timestamp.
+
+Before building, every .lut/.rto table in Source/base and the selected cars is parsed and checked
+(see lut.py); malformed, non-monotonic or NaN entries fail the build with their file and line.
 
 Options:
-   --pack-release: Create a release zip file from the Build folder contents.
+   --pack-release: Create a release zip file from the Build folder contents, and a
+     "<project> v<version>.manifest.json" listing the size and SHA-256 of every file in it.
+   --pack-patch FROM_MANIFEST: Instead of a full zip, create "<project> v<old> to v<new> patch.zip"
+     with only the files added or changed since the release FROM_MANIFEST describes, plus patch.json
+     listing files to delete. The patch is verified to turn the old manifest into the new one.
+   --skip-lut-validation: Build without checking the .lut/.rto tables.
+   --tree-shake: Drop files in data/ and extension/ that nothing references, starting from the files
+     the game loads by name (TREE_SHAKE_ROOTS). Extra roots and always-shipped patterns can be listed
+     under [build.tree_shake] "roots" / "keep" in info.toml. Pruned files are listed in build.log.
+   --minify-lua: Strip comments and redundant whitespace from the Lua scripts (see lua_minify.py).
+     Line numbers are preserved and results are cached by content hash in .builder_cache/lua.
+   --optimize-png: Losslessly recompress every PNG in the built cars on a process pool (see
+     png_optimize.py). Each distinct image is optimized once and cached in .builder_cache/png.
+   --suggest-base: Report files that are identical at the same path in several car folders, the
+     bytes wasted copying them, and which ones could be moved into Source/base. Does not build.
+   --share-duplicates: Treat those files as an implicit shared layer: read them from Source once
+     and write the same bytes into every car that carries them.
+   --log-level {DEBUG,INFO}: build.log level. At INFO, per-file work (copies, skips, INI merges,
+     prunes) is summarised per car and folder, and every pruned file is still listed; DEBUG also
+     logs every individual event.
+   --log-jsonl PATH: Write every build event as one JSON object per line to PATH.
+   Kart-class matrix: a [matrix] table in info.toml (or Source/matrix.toml) generates extra cars from
+     class folders crossed with parameter axes; see expand_matrix(). Overlay folders for the axes live
+     in Source/overlays. Base + class (+ overlays) is merged once per unique combination in
+     .builder_cache/stages and copied into every variant, which then gets its INI and ui_car.json values.
+   --index-config: Record every INI key the built cars ship (data/ and extension/), its effective
+     value and the layer it came from in config_index.sqlite, per car and version. Query and diff it
+     with config_index.py without building.
+   --backend {threads,hybrid,processes,asyncio}: threads (default) builds every car on a thread. hybrid
+     keeps cars on threads but hashes duplicate candidates and deflates large release zip members on a
+     process pool. processes also builds each car in a worker process, which logs through the builder.
+     asyncio starts every car at once on an event loop and bounds each resource separately instead of
+     whole cars: --disk-jobs N copy/merge steps (default 8), --cpu-jobs N tree shake, index, minify,
+     PNG and manifest steps (default: CPU count) and --subprocess-jobs N QuickBMS runs (default 2),
+     so one car's packing overlaps others' copying (see car_build_steps). Ctrl-C kills running
+     QuickBMS processes, lets steps already on a thread finish and removes the rebuilder input files.
+   --profile DIR: Profile every car's build stages with cProfile (one .prof per car and stage, merged
+     into DIR/combined.prof) and take tracemalloc snapshots around INI merging, data.acd packing and
+     release zipping. The hottest functions and largest allocation sites are printed at the end.
+     Snapshots cover the whole process, so memory is only reported for stages that ran alone;
+     use --workers 1 to measure every car's stages.
+   --rev COMMIT: Build Source (info.toml, base and every car) as of a git revision without checking
+     it out. Blobs are streamed from one "git cat-file --batch" process into .builder_cache/git, keyed
+     by blob id, and the revision's Source is assembled there from hard links (see git_source.py), so
+     a file unchanged between revisions is read from git and hashed once.
+   serve: Run a build daemon that keeps info.toml, the stat index and caches in memory and answers
+     JSON requests on a Unix socket (.builder_cache/serve.sock, or --socket; 127.0.0.1:47389 on
+     Windows): "status", "rebuild" (optionally of given cars) and "shutdown", streaming progress
+     events back; see BuildServer. Requests must carry the random token the daemon writes to
+     .builder_cache/serve.token when it starts, so only users who can read it can drive the daemon.
+     "builder.py request status|rebuild [CAR...]|shutdown" sends one and prints the events.
+   --in-memory: Assemble the cars in a MemoryFileSystem (see build_fs.py) under the paths they would
+     have in Build, which is left untouched; every stage writes through the same filesystem layer.
+     Stages that run other programs (QuickBMS, the PNG pool, ...) get a temporary disk copy of the
+     car only when one of them is enabled. With --pack-release or --pack-patch the release zip is
+     written straight from memory; otherwise the build is only checked.
+   --max-memory SIZE: Cap the file data buffered at once across all workers (e.g. 512M). Every stage
+     reserves what it holds from one MemoryBudget; files up to SLURP_MAX_BYTES are read whole and
+     larger ones streamed in chunks, and a data folder counts in full while QuickBMS packs it. With
+     --backend processes each worker gets an equal share. Peak RSS is reported at the end of every build.
+   --status: Report which cars are out of date and why, without building: each car's manifest in
+     Build records the files it was built from, and .builder_cache/stat_index.json keeps their
+     (size, mtime, inode) and digest, so only files whose stat changed are hashed. Exits 1 if any
+     car is out of date. A build where every car is up to date does nothing unless --force is given.
      
 Note: This script requires Python 3.8+ for the use of shutil.copytree(..., dirs_exist_ok=True).
 """
@@ -28,25 +97,103 @@ import sys
 import logging
 import json
 import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
 import fnmatch
+import hashlib
+import re
 from typing import List
-import configparser
-import subprocess
 import argparse
-import zipfile
+import io
 from queue import SimpleQueue
 from logging.handlers import QueueHandler, QueueListener
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from build_fs import DISK
+# configparser, subprocess, zipfile, zlib, tempfile and multiprocessing are imported where they
+# are used, so --status and up-to-date builds do not pay for them at startup.
 
 logger = logging.getLogger("builder")
 PROGRESS_BAR_WIDTH = 28
 
-class CaseConfigParser(configparser.ConfigParser):
+# Files the game or CSP loads by name, relative to the car folder. Tree shaking starts from these
+# and never prunes them; info.toml's [build.tree_shake] "roots" and "keep" extend the lists.
+TREE_SHAKE_ROOTS = [
+    "data/aero.ini", "data/ai.ini", "data/ambient_shadows.ini", "data/brakes.ini",
+    "data/cameras.ini", "data/car.ini", "data/colliders.ini", "data/dash_cam.ini",
+    "data/digital_instruments.ini", "data/driver3d.ini", "data/drivetrain.ini",
+    "data/electronics.ini", "data/engine.ini", "data/escmode.ini", "data/fuel_cons.ini",
+    "data/lights.ini", "data/lods.ini", "data/mirrors.ini", "data/proview_nodes.ini",
+    "data/setup.ini", "data/sounds.ini", "data/suspension_graphics.ini", "data/suspensions.ini",
+    "data/tyres.ini", "data/wing_animations.ini", "data/script.lua",
+    "extension/ext_config.ini",
+]
+# Folders whose contents are pruned when unreachable. Everything else in the car is shipped as-is.
+TREE_SHAKE_SCOPE = ["data", "extension"]
+FILE_REFERENCE_RE = re.compile(r"[\w\-./\\]+\.(?:lut|rto|ini|lua|kn5|png|dds|bank|json|txt)\b", re.IGNORECASE)
+# Car-folder files up to this size that are identical across cars are read once and kept in memory.
+SHARED_LAYER_MAX_BYTES = 16 * 1024 * 1024
+HASH_CHUNK_SIZE = 1024 * 1024
+# --max-memory: files up to this size are read whole; larger ones are streamed in HASH_CHUNK_SIZE
+# chunks. Both hold their bytes under the build's MemoryBudget.
+SLURP_MAX_BYTES = 256 * 1024
+# Token substitution while copying: literal tokens always replaced (info.toml [build.substitute]
+# "tokens" adds more) and the text file types it is applied to unless "extensions" is set.
+SUBSTITUTE_TOKENS = {"model.kn5": "{kn5}"}
+SUBSTITUTE_EXTENSIONS = (".ini", ".txt", ".json", ".lua")
+# A "key": value pair in ui_car.json whose plain value (string, number, true/false/null) can be set in place.
+UI_JSON_FIELD_PATTERN = rb'"(?P<field>[A-Za-z_]\w*)"(?P<sep>\s*:\s*)(?P<value>"(?:[^"\\]|\\.)*"|[-+.\w]+)'
+# --status / up-to-date builds: files next to the script that every car's output depends on, and
+# how many changed inputs are named per car.
+BUILD_INPUT_SCRIPTS = ("builder.py", "lua_minify.py", "png_optimize.py", "assetto_corsa_acd_rebuilder.bms")
+STATUS_MAX_LISTED = 5
+STAT_INDEX_FILE = "stat_index.json"
+# builder.py serve: socket in .builder_cache, or this localhost address where there are no Unix sockets.
+# Every request must carry the random token the daemon writes to .builder_cache/SERVE_TOKEN_NAME.
+SERVE_SOCKET_NAME = "serve.sock"
+SERVE_TCP_ADDRESS = ("127.0.0.1", 47389)
+SERVE_TOKEN_NAME = "serve.token"
+LUA_REQUIRE_RE = re.compile(r"require\s*\(?\s*[\"']([\w.\-/]+)[\"']")
+# Patch zips carry the deletion list and the new release manifest in this member.
+PATCH_INFO_NAME = "patch.json"
+# Kart-class matrix: generated variants are declared in info.toml [matrix] or Source/matrix.toml,
+# and their overlay folders live under Source/overlays (never built as a car by itself).
+MATRIX_FILE = "matrix.toml"
+OVERLAYS_FOLDER = "overlays"
+# --profile: stages bracketed by tracemalloc snapshots, traceback depth kept per allocation,
+# and how many functions/allocation sites the report lists.
+PROFILE_MEMORY_STAGES = ("Merging car content", "Packing data.acd", "Packing release zip")
+PROFILE_TRACEMALLOC_FRAMES = 1
+PROFILE_TOP_N = 20
+# --backend: where per-car pipelines and CPU-bound steps (release zip deflate, hashing) run.
+BACKENDS = ("threads", "hybrid", "processes", "asyncio")
+# --backend asyncio: default concurrency per resource (--disk-jobs, --cpu-jobs, --subprocess-jobs);
+# cpu defaults to the number of CPUs.
+ASYNC_DISK_JOBS = 8
+ASYNC_SUBPROCESS_JOBS = 2
+# The dummy input ACD QuickBMS's rebuilder is pointed at inside a car's build folder while packing.
+PACK_INPUT_NAME = "__builder_input_data.acd"
+# Release zip members smaller than this are compressed in place rather than shipped to a process.
+PROCESS_OFFLOAD_MIN_BYTES = 64 * 1024
+
+def case_config_parser():
     """ConfigParser that leaves option keys untouched."""
+    import configparser
+
+    parser = configparser.ConfigParser()
+    parser.optionxform = str
+    return parser
+
+def read_config(config, path, fs=DISK):
+    """Reads path on fs into config; like ConfigParser.read, a missing file is skipped."""
+    if fs.is_disk:
+        config.read(path, encoding='utf-8')
+    elif fs.exists(path):
+        config.read_string(fs.read_bytes(path).decode('utf-8'), source=path)
 
-    def optionxform(self, optionstr: str) -> str:
-        return optionstr
+def write_config(config, path, fs=DISK):
+    with io.TextIOWrapper(fs.open_write(path), encoding='utf-8') as f:
+        config.write(f, space_around_delimiters=False)
 
 try:
     import tomllib
@@ -70,31 +217,42 @@ def confirm_deletion(build_dir):
             ).strip().lower() == 'y'
     return True
 
-def update_lods_ini(lods_ini_path, kn5_filename):
-    """
-    Reads lods.ini, finds the [LOD_0] section and replaces the first "FILE=" line with:
-      FILE=<kn5_filename>
-    Then writes the file back.
-    """
+# "FILE=" under [LOD_0] in lods.ini: the mesh the game loads for the car (see set_lod0_file).
+LOD0_FILE_RE = re.compile(rb"^(?P<key>[ \t]*FILE[ \t]*=[ \t]*)(?P<value>[^\r\n]*)", re.MULTILINE)
+
+def set_lod0_file(data, kn5_filename):
+    """lods.ini content (bytes) with every "FILE=" line under [LOD_0] naming kn5_filename."""
+    lines = data.splitlines(keepends=True)
+    in_lod0 = False
+    for i, line in enumerate(lines):
+        stripped = line.strip()
+        if stripped.startswith(b"["):
+            in_lod0 = stripped == b"[LOD_0]"
+        elif in_lod0:
+            lines[i] = LOD0_FILE_RE.sub(lambda match: match.group("key") + kn5_filename, line, count=1)
+    return b"".join(lines)
+
+def check_lods_ini(lods_ini_path, kn5_filename, fs=DISK):
+    """Warns if a built lods.ini has no "FILE=" line under [LOD_0] naming the car's kn5."""
     try:
-        with open(lods_ini_path, "r") as f:
+        with io.TextIOWrapper(fs.open_read(lods_ini_path), encoding="utf-8", errors="replace") as f:
             lines = f.readlines()
+    except OSError as e:
+        logger.error(f"Failed to read {lods_ini_path}: {e}")
+        return
 
-        in_lod0 = False
-        for i, line in enumerate(lines):
-            stripped = line.strip()
-            if stripped == "[LOD_0]":
-                in_lod0 = True
-            elif stripped.startswith("["):
-                in_lod0 = False
-            elif in_lod0 and stripped.startswith("FILE="):
-                lines[i] = f"FILE={kn5_filename}\n"
-
-        with open(lods_ini_path, "w") as f:
-            f.writelines(lines)
-        logger.info(f"Updated lods.ini in {os.path.dirname(lods_ini_path)}")
-    except Exception as e:
-        logger.error(f"Failed to write {lods_ini_path}: {e}")
+    in_lod0 = False
+    for line in lines:
+        stripped = line.strip()
+        if stripped == "[LOD_0]":
+            in_lod0 = True
+        elif stripped.startswith("["):
+            in_lod0 = False
+        elif in_lod0 and stripped.startswith("FILE="):
+            if stripped != f"FILE={kn5_filename}":
+                logger.warning(f"{lods_ini_path}: [LOD_0] {stripped} is not {kn5_filename}")
+            return
+    logger.warning(f"{lods_ini_path}: no FILE= line under [LOD_0]")
 
 def should_ignore_file(path: str, ignore_patterns: List[str]) -> bool:
     """
@@ -130,88 +288,189 @@ def should_ignore_file(path: str, ignore_patterns: List[str]) -> bool:
     
     return False
 
-def update_ui_json(ui_json_path, version, year):
+def update_ui_json(text, fields, append_text):
     """
-    Loads the ui/ui_car.json file, updates its 'version' and 'year',
-    and appends a timestamp to the 'description' field.
+    Sets fields (version, year, a matrix variant's overrides, ...) in ui_car.json text and
+    appends append_text to its 'description'. Returns the re-dumped JSON.
     """
-    try:
-        with open(ui_json_path, "r") as f:
-            data = json.load(f)
-    except Exception as e:
-        logger.error(f"Failed to load {ui_json_path}: {e}")
-        return
-
-    data["version"] = version
-    data["year"] = year
-    now_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    append_text = f"<br><br>Car compiled on {now_str}."
+    data = json.loads(text)
+    data.update(fields)
     if "description" in data and isinstance(data["description"], str):
         data["description"] += append_text
     else:
         data["description"] = append_text.strip()
+    return json.dumps(data, indent=4)
 
-    try:
-        with open(ui_json_path, "w") as f:
-            json.dump(data, f, indent=4)
-        logger.info(f"Updated ui_car.json at {ui_json_path}")
-    except Exception as e:
-        logger.error(f"Failed to write {ui_json_path}: {e}")
-
-def handle_sfx_files(car_build_dir, car_name):
+class TokenSubstitution:
     """
-    Special handling for sfx files:
-    1. Rename the .bank file to match the car name
-    2. Update references in GUIDs.txt
+    Per-car identity patched into text files while they are copied, compiled once per build.
+
+    tokens maps literal text to a template formatted per car with {car}, {kn5}, {version} and
+    {year}; ${car}, ${kn5}, ${version} and ${year} placeholders are replaced as well. Every
+    token and placeholder is matched by one combined regex in a single pass over each line of
+    files with the given extensions. The literal tokens also rename copied files (model.kn5 ->
+    <car>.kn5). A car whose sources ship a sound bank under another name gets per-car tokens
+    from its stem (see for_car) that rename it to <car>.bank and repoint its bank:/ and
+    event:/cars/ references. lods.ini always gets "FILE=" under [LOD_0] set to <car>.kn5, and
+    ui_car.json its version, year and the variant's ui fields set and its description stamped
+    (see CarSubstitution).
     """
+
+    def __init__(self, tokens, extensions):
+        self.tokens = dict(tokens)
+        self.extensions = tuple(extension.lower() for extension in extensions)
+        literals = [re.escape(token.encode("utf-8")) for token in sorted(self.tokens, key=len, reverse=True)]
+        self.text_re = re.compile(b"|".join(literals + [rb"\$\{(?P<placeholder>\w+)\}"]))
+        self.ui_re = re.compile(UI_JSON_FIELD_PATTERN + b"|" + self.text_re.pattern)
+
+    def applies_to(self, path):
+        return path.lower().endswith(self.extensions)
+
+    def for_car(self, car_name, version, year, ui_overrides=None, bank_stem=None):
+        """CarSubstitution for one car; bank_stem is the stem of the sound bank its sources ship."""
+        values = {"car": car_name, "kn5": f"{car_name}.kn5", "version": version, "year": year}
+        compiled_on = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        ui_fields = {"version": version, "year": year, **(ui_overrides or {})}
+        substitution = self
+        if bank_stem is not None and bank_stem != car_name:
+            # Compiled per car, only for cars whose bank is not already named after them
+            bank_tokens = {
+                f"{bank_stem}.bank": "{car}.bank",
+                f"bank:/{bank_stem}": "bank:/{car}",
+                f"event:/cars/{bank_stem}/": "event:/cars/{car}/",
+            }
+            substitution = TokenSubstitution({**bank_tokens, **self.tokens}, self.extensions)
+        return CarSubstitution(substitution, values, ui_fields, f"<br><br>Car compiled on {compiled_on}.")
+
+class CarSubstitution:
+    """The token values of one car; see TokenSubstitution."""
+
+    def __init__(self, substitution, values, ui_fields, ui_append_text):
+        self.substitution = substitution
+        self.replacements = {
+            token.encode("utf-8"): template.format_map(values).encode("utf-8")
+            for token, template in substitution.tokens.items()
+        }
+        self.placeholders = {name: str(value).encode("utf-8") for name, value in values.items()}
+        self.ui_fields = ui_fields
+        self.ui_append_text = ui_append_text
+
+    def _replace(self, match):
+        placeholder = match.group("placeholder")
+        if placeholder is not None:
+            return self.placeholders.get(placeholder.decode("ascii"), match.group(0))
+        return self.replacements[match.group(0)]
+
+    def substitute(self, data):
+        return self.substitution.text_re.sub(self._replace, data)
+
+    def rename(self, path):
+        """path with the tokens in its file name replaced."""
+        directory, name = os.path.split(path)
+        return os.path.join(directory, self.substitute(name.encode("utf-8")).decode("utf-8"))
+
+    def applies_to(self, path):
+        return os.path.basename(path).lower() == "lods.ini" or self.substitution.applies_to(path)
+
+    def substitute_content(self, path, data):
+        """data of the file at path, whole, with the tokens substituted (and lods.ini's LOD_0 set)."""
+        data = self.substitute(data)
+        if os.path.basename(path).lower() == "lods.ini":
+            data = set_lod0_file(data, self.placeholders["kn5"])
+        return data
+
+    def copy(self, src, dst, fs=DISK):
+        """Copies src to dst on fs, substituting line by line. Returns the SHA-256 of what was written."""
+        name = os.path.basename(dst).lower()
+        if name == "ui_car.json":
+            with memory_budget.reserve(2 * os.path.getsize(src)):
+                return self._copy_ui_json(src, dst, fs)
+        if name == "lods.ini":
+            with memory_budget.reserve(2 * os.path.getsize(src)):
+                with open(src, "rb") as f:
+                    result = self.substitute_content(dst, f.read())
+                with fs.open_write(dst) as f:
+                    f.write(result)
+                return hashlib.sha256(result).hexdigest()
+        return self.substitute_file(src, dst, fs)
+
+    def substitute_file(self, src, dst, fs=DISK, src_fs=DISK):
+        """Copies src to dst, substituting the tokens line by line. Returns the SHA-256 of what was written."""
+        digest = hashlib.sha256()
+        with memory_budget.reserve(HASH_CHUNK_SIZE), src_fs.open_read(src) as fsrc, fs.open_write(dst) as fdst:
+            for line in fsrc:
+                line = self.substitute(line)
+                digest.update(line)
+                fdst.write(line)
+        return digest.hexdigest()
+
+    def _copy_ui_json(self, src, dst, fs):
+        # Small enough to handle whole: fields are set in place, keeping the source formatting;
+        # if one is missing (or not a plain value) the JSON is re-dumped with every field set.
+        with open(src, "rb") as f:
+            content = f.read()
+        pending = {key: json.dumps(value, ensure_ascii=False).encode("utf-8") for key, value in self.ui_fields.items()}
+        described = []
+
+        def replace(match):
+            field = match.group("field")
+            if field is None:
+                return self._replace(match)
+            name = field.decode("utf-8")
+            if name in pending and not isinstance(self.ui_fields[name], (dict, list)):
+                return b'"%s"%s%s' % (field, match.group("sep"), pending.pop(name))
+            if name == "description" and not described and match.group("value").startswith(b'"'):
+                described.append(name)
+                appended = json.dumps(self.ui_append_text, ensure_ascii=False).encode("utf-8")[1:-1]
+                return b'"description"%s%s%s"' % (match.group("sep"), self.substitute(match.group("value")[:-1]), appended)
+            return self.substitute(match.group(0))
+
+        result = self.substitution.ui_re.sub(replace, content)
+        if pending or not described:
+            result = update_ui_json(self.substitute(content).decode("utf-8"), self.ui_fields, self.ui_append_text).encode("utf-8")
+        with fs.open_write(dst) as f:
+            f.write(result)
+        return hashlib.sha256(result).hexdigest()
+
+def find_sfx_bank(source_dir, layers):
+    """Stem of the sound bank in the topmost of layers (relative to source_dir) with one in sfx/, or None."""
+    for layer in reversed(layers):
+        sfx_dir = os.path.join(source_dir, layer, "sfx")
+        if os.path.isdir(sfx_dir):
+            banks = sorted(file for file in os.listdir(sfx_dir) if file.endswith(".bank"))
+            if banks:
+                return os.path.splitext(banks[0])[0]
+    return None
+
+def check_sfx_bank(car_build_dir, car_name, fs=DISK):
+    """Returns False (logging why) if sfx/ holds a sound bank not renamed to <car>.bank while copying."""
     sfx_dir = os.path.join(car_build_dir, "sfx")
-    if not os.path.exists(sfx_dir):
-        return
-    
-    # Find and rename the .bank file
-    for file in os.listdir(sfx_dir):
-        if file.endswith(".bank"):
-            old_bank_path = os.path.join(sfx_dir, file)
-            new_bank_name = f"{car_name}.bank"
-            new_bank_path = os.path.join(sfx_dir, new_bank_name)
-            
-            try:
-                os.rename(old_bank_path, new_bank_path)
-                logger.info(f"Renamed sfx bank file from '{file}' to '{new_bank_name}'")
-                
-                # Update GUIDs.txt
-                guids_path = os.path.join(sfx_dir, "GUIDs.txt")
-                if os.path.exists(guids_path):
-                    try:
-                        with open(guids_path, 'r') as f:
-                            content = f.read()
-                        old_name = os.path.splitext(file)[0]
-                        updated_content = content.replace(f"bank:/{old_name}", f"bank:/{car_name}")
-                        updated_content = updated_content.replace(f"event:/cars/{old_name}/", f"event:/cars/{car_name}/")
-                        with open(guids_path, 'w') as f:
-                            f.write(updated_content)
-                        logger.info(f"Updated bank and event references in GUIDs.txt from '{old_name}' to '{car_name}'")
-                    except Exception as e:
-                        logger.error(f"Error updating GUIDs.txt: {e}")
-            except Exception as e:
-                logger.error(f"Error handling sfx files: {e}")
-            break
+    if not fs.isdir(sfx_dir):
+        return True
+    misnamed = sorted(entry.name for entry in fs.scan(sfx_dir)
+                      if entry.name.endswith(".bank") and entry.name != f"{car_name}.bank")
+    for file in misnamed:
+        logger.error(f"Sound bank '{file}' in {car_name} is not named '{car_name}.bank'; "
+                     f"keep a single .bank file in the car's sfx folder")
+    return not misnamed
 
-def merge_ini_files(base_ini_path, addon_ini_path, output_path):
+def merge_ini_files(base_ini_path, addon_ini_path, output_path, fs=DISK, base_fs=DISK):
     """
     Merge an addon INI file into a base INI file.
     The addon INI can contain partial sections that will override
     corresponding sections in the base INI.
     If a section contains only a single 'DELETE=1' key,
     the entire section will be removed from the base INI.
+    The output is written to fs; the base is read from base_fs.
     """
+    start = time.perf_counter()
     try:
         # Create parsers that preserve option case
-        base_config = CaseConfigParser()
-        addon_config = CaseConfigParser()
+        base_config = case_config_parser()
+        addon_config = case_config_parser()
         
         # Read the base INI file
-        base_config.read(base_ini_path, encoding='utf-8')
+        read_config(base_config, base_ini_path, base_fs)
         
         # Read the addon INI file
         addon_config.read(addon_ini_path, encoding='utf-8')
@@ -228,7 +487,7 @@ def merge_ini_files(base_ini_path, addon_ini_path, output_path):
                 # Remove the section from base config if it exists
                 if base_config.has_section(section_name):
                     base_config.remove_section(section_name)
-                    logger.info(f"Deleted section [{section_name}] from base INI")
+                    build_events.emit("ini_delete_section", output_path, detail=section_name)
                 continue
             
             # Normal merge logic for non-DELETE sections
@@ -241,23 +500,35 @@ def merge_ini_files(base_ini_path, addon_ini_path, output_path):
                 base_config.set(section_name, option_name, option_value)
         
         # Write the merged result
-        with open(output_path, 'w', encoding='utf-8') as f:
-            base_config.write(f, space_around_delimiters=False)
+        write_config(base_config, output_path, fs)
         
-        logger.info(f"Merged INI: {os.path.basename(addon_ini_path)} -> {os.path.basename(output_path)}")
+        build_events.emit("ini_merge", output_path, fs.stat(output_path).st_size, time.perf_counter() - start,
+                          detail=os.path.basename(addon_ini_path))
         
     except Exception as e:
         logger.error(f"Error merging INI files {base_ini_path} + {addon_ini_path}: {e}")
 
-def merge_directories(src, dst, ignore_patterns):
+def copy_tree(src, dst, copy_function, fs=DISK):
+    """shutil.copytree(src, dst, dirs_exist_ok=True) from the disk folder src into dst on fs."""
+    if fs.is_disk:
+        shutil.copytree(src, dst, dirs_exist_ok=True, copy_function=copy_function)
+        return
+    for root, dirs, files in os.walk(src):
+        target_dir = dst if root == src else os.path.join(dst, os.path.relpath(root, src))
+        fs.makedirs(target_dir)
+        for name in files:
+            copy_function(os.path.join(root, name), os.path.join(target_dir, name))
+
+def merge_directories(src, dst, ignore_patterns, copy_function=shutil.copyfile, fs=DISK):
     """
     Recursively merge contents of src directory into dst directory.
     Files from src will overwrite those in dst.
     Skips files matching ignore patterns.
     Special handling for .addon.ini files which are merged with their base INI files.
+    Plain files are copied with copy_function(src, dst); dst is on fs.
     """
-    if not os.path.exists(dst):
-        os.makedirs(dst)
+    if not fs.exists(dst):
+        fs.makedirs(dst)
     
     # First pass: collect .addon.ini files for processing
     addon_files = {}
@@ -265,7 +536,7 @@ def merge_directories(src, dst, ignore_patterns):
     
     for entry in os.scandir(src):
         if should_ignore_file(entry.path, ignore_patterns):
-            logger.info(f"Skipping ignored file/folder '{entry.name}'")
+            build_events.emit("skip", os.path.join(dst, entry.name))
             continue
 
         if entry.name.endswith('.addon.ini'):
@@ -282,51 +553,962 @@ def merge_directories(src, dst, ignore_patterns):
         
         try:
             if os.path.isdir(s_item):
-                if not os.path.exists(d_item):
-                    shutil.copytree(s_item, d_item, copy_function=shutil.copyfile)
-                    logger.info(f"Copied new folder '{item}' from source merge.")
+                if not fs.exists(d_item):
+                    copy_tree(s_item, d_item, copy_function, fs)
                 else:
-                    merge_directories(s_item, d_item, ignore_patterns)
+                    merge_directories(s_item, d_item, ignore_patterns, copy_function, fs)
                 continue
 
             # Check if this file has a corresponding .addon.ini file
             if item.endswith('.ini') and item in addon_files:
-                merge_ini_files(s_item, addon_files[item], d_item)
+                merge_ini_files(s_item, addon_files[item], d_item, fs)
             else:
-                shutil.copyfile(s_item, d_item)
-                logger.info(f"Overwritten file '{item}' from source merge.")
+                copy_function(s_item, d_item)
         except Exception as e:
             logger.error(f"Error merging {s_item} into {d_item}: {e}")
     
     # Third pass: handle .addon.ini files that don't have corresponding base files
     for base_name, addon_path in addon_files.items():
         base_exists_in_src = os.path.exists(os.path.join(src, base_name))
-        base_exists_in_dst = os.path.exists(os.path.join(dst, base_name))
+        base_exists_in_dst = fs.exists(os.path.join(dst, base_name))
         
         if not base_exists_in_src and base_exists_in_dst:
             # Addon file exists but no base file in src - merge with existing dst file
             d_item = os.path.join(dst, base_name)
             try:
-                merge_ini_files(d_item, addon_path, d_item)
+                merge_ini_files(d_item, addon_path, d_item, fs, fs)
             except Exception as e:
                 logger.error(f"Error merging addon {addon_path} with existing {d_item}: {e}")
         elif not base_exists_in_src and not base_exists_in_dst:
             # No base file anywhere - treat addon as the complete file
             d_item = os.path.join(dst, base_name)
             try:
-                shutil.copyfile(addon_path, d_item)
-                logger.info(f"Copied addon file '{os.path.basename(addon_path)}' as '{base_name}' (no base file found)")
+                copy_function(addon_path, d_item)
+                logger.debug("Copied addon file '%s' as '%s' (no base file found)", os.path.basename(addon_path), base_name)
             except Exception as e:
                 logger.error(f"Error copying addon file {addon_path}: {e}")
 
-def setup_logging(script_dir):
+class MemoryBudget:
+    """
+    Bytes the stages of a build may hold in memory at once (--max-memory), shared by every car.
+    Anything that buffers file data reserves its size first and waits while the budget is used
+    up; a request larger than the whole budget waits until nothing else is reserved and then
+    runs alone. Without a limit nothing waits, but the peak is still tracked for the summary.
+    """
+
+    def __init__(self, limit=None):
+        self.limit = limit
+        self.in_use = 0
+        self.peak = 0
+        self.waits = 0
+        self.condition = threading.Condition()
+
+    def _fits(self, size):
+        return self.limit is None or self.in_use + size <= self.limit
+
+    def acquire(self, size):
+        """Blocks until size bytes (at most the whole budget) are free. Returns the amount reserved."""
+        if self.limit is not None:
+            size = min(size, self.limit)
+        with self.condition:
+            if not self._fits(size):
+                self.waits += 1
+                self.condition.wait_for(lambda: self._fits(size))
+            self.in_use += size
+            self.peak = max(self.peak, self.in_use)
+        return size
+
+    def try_acquire(self, size):
+        """Reserves size bytes if they are free right now, for memory kept around as a cache."""
+        with self.condition:
+            if not self._fits(size):
+                return False
+            self.in_use += size
+            self.peak = max(self.peak, self.in_use)
+        return True
+
+    def release(self, size):
+        with self.condition:
+            self.in_use -= size
+            self.condition.notify_all()
+
+    @contextmanager
+    def reserve(self, size):
+        size = self.acquire(size)
+        try:
+            yield
+        finally:
+            self.release(size)
+
+    def report(self):
+        limit = format_bytes(self.limit) if self.limit is not None else "no limit"
+        return f"buffered data peaked at {format_bytes(self.peak)} ({limit}, {self.waits} wait(s))"
+
+memory_budget = MemoryBudget()
+
+def parse_byte_size(text):
+    """argparse type for sizes such as 512M, 2G or 1048576 (bytes)."""
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([KMG]?)i?B?\s*", text, re.IGNORECASE)
+    if not match:
+        raise argparse.ArgumentTypeError(f"invalid size {text!r}; use e.g. 512M or 2G")
+    scale = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}[match.group(2).upper()]
+    size = int(float(match.group(1)) * scale)
+    if size < HASH_CHUNK_SIZE:
+        raise argparse.ArgumentTypeError(f"size must be at least {format_bytes(HASH_CHUNK_SIZE)}")
+    return size
+
+def format_bytes(size):
+    for unit in ("B", "KiB", "MiB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GiB"
+
+def peak_rss():
+    """
+    (this process, largest child process) peak resident set size in bytes; either is None where
+    the platform does not report it. Children are worker processes and QuickBMS, once finished.
+    """
+    try:
+        import resource
+    except ImportError:
+        resource = None
+    if resource is not None:
+        # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+        scale = 1 if sys.platform == "darwin" else 1024
+        return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale,
+                resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale or None)
+    if sys.platform == "win32":
+        import ctypes
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD)] + [
+                (name, ctypes.c_size_t) for name in (
+                    "PeakWorkingSetSize", "WorkingSetSize", "QuotaPeakPagedPoolUsage", "QuotaPagedPoolUsage",
+                    "QuotaPeakNonPagedPoolUsage", "QuotaNonPagedPoolUsage", "PagefileUsage", "PeakPagefileUsage")]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        get_memory_info = ctypes.windll.psapi.GetProcessMemoryInfo
+        get_memory_info.argtypes = [wintypes.HANDLE, ctypes.POINTER(PROCESS_MEMORY_COUNTERS), wintypes.DWORD]
+        if get_memory_info(ctypes.windll.kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb):
+            return counters.PeakWorkingSetSize, None
+    return None, None
+
+def memory_report():
+    """One line on peak memory use for the build summary."""
+    own, children = peak_rss()
+    parts = []
+    if own is not None:
+        parts.append(f"peak RSS {format_bytes(own)}")
+    if children is not None:
+        parts.append(f"largest child process {format_bytes(children)}")
+    parts.append(memory_budget.report())
+    return "Memory: " + "; ".join(parts) + "."
+
+def hash_file(path, fs=DISK):
+    """SHA-256 hex digest of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with memory_budget.reserve(HASH_CHUNK_SIZE), fs.open_read(path) as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def hashing_copy(src, dst, fs=DISK):
+    """
+    Copies the disk file src to dst on fs in one read -> hash -> write pass: whole if it is at
+    most SLURP_MAX_BYTES, otherwise in HASH_CHUNK_SIZE chunks. Returns the SHA-256 hex digest.
+    """
+    size = os.path.getsize(src)
+    if size <= SLURP_MAX_BYTES:
+        with memory_budget.reserve(size):
+            with open(src, "rb") as fsrc:
+                content = fsrc.read()
+            with fs.open_write(dst) as fdst:
+                fdst.write(content)
+            return hashlib.sha256(content).hexdigest()
+
+    digest = hashlib.sha256()
+    with memory_budget.reserve(HASH_CHUNK_SIZE):
+        buffer = bytearray(HASH_CHUNK_SIZE)
+        view = memoryview(buffer)
+        with open(src, "rb") as fsrc, fs.open_write(dst) as fdst:
+            while True:
+                count = fsrc.readinto(buffer)
+                if not count:
+                    break
+                digest.update(view[:count])
+                fdst.write(view[:count])
+    return digest.hexdigest()
+
+class DigestCache:
+    """
+    SHA-256 digests of source files keyed by path and stat signature (size, mtime_ns, inode),
+    shared by every car of a build so a base file copied into each car is hashed once. seed()
+    adds digests that are already known (e.g. from the shared layer) without a signature.
+
+    load()/save() persist the digests as the stat index (.builder_cache/stat_index.json), so
+    later runs only hash files whose stat changed.
+    """
+
+    def __init__(self):
+        self.digests = {}
+        self.lock = threading.Lock()
+        self.hashed = 0
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["lock"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def signature(stat):
+        return (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+
+    def load(self, index_path):
+        try:
+            with open(index_path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            return
+        with self.lock:
+            for path, (size, mtime_ns, inode, digest) in entries.items():
+                self.digests[path] = ((size, mtime_ns, inode), digest)
+
+    def save(self, index_path, roots):
+        """Writes the entries for files under roots (paths or folder prefixes) to the stat index."""
+        import tempfile
+
+        roots = tuple(os.path.normcase(os.path.abspath(root)) for root in roots)
+        with self.lock:
+            entries = {
+                path: [*signature, digest]
+                for path, (signature, digest) in self.digests.items()
+                if signature is not None and path.startswith(roots)
+            }
+        os.makedirs(os.path.dirname(index_path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(index_path), suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(entries, f, separators=(",", ":"))
+        os.replace(tmp_path, index_path)
+
+    def seed(self, path, digest):
+        with self.lock:
+            self.digests.setdefault(os.path.normcase(os.path.abspath(path)), (None, digest))
+
+    def lookup(self, path, stat):
+        with self.lock:
+            entry = self.digests.get(os.path.normcase(os.path.abspath(path)))
+        if entry is None or (entry[0] is not None and entry[0] != self.signature(stat)):
+            return None
+        return entry[1]
+
+    def store(self, path, stat, digest):
+        with self.lock:
+            self.digests[os.path.normcase(os.path.abspath(path))] = (self.signature(stat), digest)
+            self.hashed += 1
+
+    def digest_many(self, paths, map_function=map):
+        """
+        {path: digest} for existing files, hashing (through map_function) only those whose stat
+        changed since they were last hashed. Unreadable paths are left out.
+        """
+        digests = {}
+        stale = []
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            digest = self.lookup(path, stat)
+            if digest is None:
+                stale.append((path, stat))
+            else:
+                digests[path] = digest
+        for (path, stat), digest in zip(stale, map_function(hash_file, [path for path, stat in stale])):
+            self.store(path, stat, digest)
+            digests[path] = digest
+        return digests
+
+class CarManifest:
+    """
+    Per-car record of file digests, filled in while the car is copied. copy() hashes a file in
+    the same pass that copies it, or reuses the DigestCache digest and copies it with
+    copy_function. finalize() re-hashes only the files later stages changed or created and
+    writes Build/<car>.manifest.json, together with the inputs the car was built from (see
+    collect_build_inputs) so --status can tell whether it is out of date. The car folder and
+    manifest are on fs; sources are always read from disk.
+    """
+
+    def __init__(self, car_name, car_build_dir, digest_cache, copy_function=shutil.copyfile, inputs=None,
+                 substitution=None, fs=DISK):
+        self.car_name = car_name
+        self.car_build_dir = car_build_dir
+        self.digest_cache = digest_cache
+        self.copy_function = copy_function if fs.is_disk else fs.copy_in
+        self.inputs = inputs
+        self.substitution = substitution
+        self.fs = fs
+        self.entries = {}
+
+    def copy(self, src, dst):
+        if self.substitution is not None:
+            dst = self.substitution.rename(dst)
+            if self.substitution.applies_to(dst):
+                digest = self.substitution.copy(src, dst, self.fs)
+                self._record(dst, digest)
+                return dst
+
+        src_stat = os.stat(src)
+        digest = self.digest_cache.lookup(src, src_stat)
+        if digest is None:
+            digest = hashing_copy(src, dst, self.fs)
+            self.digest_cache.store(src, src_stat, digest)
+        else:
+            self.copy_function(src, dst)
+        self._record(dst, digest)
+        return dst
+
+    def _record(self, path, digest):
+        stat = self.fs.stat(path)
+        self.entries[os.path.normcase(os.path.abspath(path))] = (stat.st_size, stat.st_mtime_ns, digest)
+
+    def substitute_unrecorded(self):
+        """
+        Applies the token substitution to files written without copy() or changed since (INI
+        files merged with an .addon.ini). Returns how many files were rewritten.
+        """
+        fs = self.fs
+        rewritten = 0
+        for root, dirs, files in fs.walk(self.car_build_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                entry = self.entries.get(os.path.normcase(os.path.abspath(path)))
+                stat = fs.stat(path)
+                if entry is not None and entry[:2] == (stat.st_size, stat.st_mtime_ns):
+                    continue
+                target = self.substitution.rename(path)
+                if not self.substitution.applies_to(target):
+                    if target == path:
+                        continue
+                    fs.rename(path, target)
+                    digest = hash_file(target, fs)
+                elif stat.st_size <= SLURP_MAX_BYTES or os.path.basename(target).lower() == "lods.ini":
+                    with memory_budget.reserve(2 * stat.st_size):
+                        result = self.substitution.substitute_content(target, fs.read_bytes(path))
+                        if target != path:
+                            fs.remove(path)
+                        with fs.open_write(target) as f:
+                            f.write(result)
+                    digest = hashlib.sha256(result).hexdigest()
+                else:
+                    partial_path = target + ".partial"
+                    digest = self.substitution.substitute_file(path, partial_path, fs, fs)
+                    fs.remove(path)
+                    fs.rename(partial_path, target)
+                self._record(target, digest)
+                rewritten += 1
+        return rewritten
+
+    def finalize(self, build_dir):
+        """Writes the car's manifest next to its folder. Returns (reused, rehashed) file counts."""
+        files = {}
+        reused = rehashed = 0
+        for root, dirs, names in self.fs.walk(self.car_build_dir):
+            dirs.sort()
+            for name in sorted(names):
+                path = os.path.join(root, name)
+                stat = self.fs.stat(path)
+                entry = self.entries.get(os.path.normcase(os.path.abspath(path)))
+                if entry is not None and entry[:2] == (stat.st_size, stat.st_mtime_ns):
+                    digest = entry[2]
+                    reused += 1
+                else:
+                    digest = hash_file(path, self.fs)
+                    rehashed += 1
+                rel_path = os.path.relpath(path, self.car_build_dir).replace('\\', '/')
+                files[rel_path] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": digest}
+
+        with io.TextIOWrapper(self.fs.open_write(car_manifest_path(build_dir, self.car_name)), encoding="utf-8") as f:
+            json.dump({"car": self.car_name, "files": files, "inputs": self.inputs}, f, indent=1, sort_keys=True)
+        return reused, rehashed
+
+def car_manifest_path(build_dir, car_name):
+    return os.path.join(build_dir, f"{car_name}.manifest.json")
+
+def load_car_manifest_digests(build_dir, fs=DISK):
+    """{normalized file path: (size, mtime_ns, sha256)} from every car manifest in Build."""
+    known = {}
+    for entry in fs.scan(build_dir):
+        if not entry.is_dir():
+            continue
+        manifest_path = car_manifest_path(build_dir, entry.name)
+        if not fs.exists(manifest_path):
+            continue
+        try:
+            files = json.loads(fs.read_bytes(manifest_path))["files"]
+        except (OSError, ValueError, KeyError):
+            continue
+        for rel_path, info in files.items():
+            path = os.path.normcase(os.path.abspath(os.path.join(entry.path, rel_path)))
+            known[path] = (info["size"], info["mtime_ns"], info["sha256"])
+    return known
+
+def _walk_source_layer(layer_dir, ignore_patterns):
+    """Files under a Source folder that the builder copies or merges, in a stable order."""
+    for root, dirs, files in os.walk(layer_dir):
+        dirs[:] = sorted(d for d in dirs if not should_ignore_file(os.path.join(root, d), ignore_patterns))
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            if not should_ignore_file(path, ignore_patterns):
+                yield path
+
+def collect_build_inputs(script_dir, source_dir, builds, ignore_patterns, digest_cache, options, map_function=map):
+    """
+    What each car is built from: {car_name: {"files": {path: sha256}, "options": options}}, with
+    paths like "builder.py" and "Source/base/..." (also for a --rev tree, so a revision and the
+    working tree compare by content). Files are the builder scripts (BUILD_INPUT_SCRIPTS),
+    Source/info.toml and matrix.toml, Source/base and the car folder (or a variant's class and
+    overlay folders). Only files whose stat changed since the stat index was saved are hashed.
+    """
+    common = [os.path.join(script_dir, name) for name in BUILD_INPUT_SCRIPTS]
+    common += [os.path.join(source_dir, "info.toml"), os.path.join(source_dir, MATRIX_FILE)]
+    layer_files = {}
+    build_paths = {}
+    for car_name, variant in builds:
+        layers = ["base"] + (variant.layers if variant is not None else [car_name])
+        paths = list(common)
+        for layer in layers:
+            if layer not in layer_files:
+                layer_files[layer] = list(_walk_source_layer(os.path.join(source_dir, layer), ignore_patterns))
+            paths += layer_files[layer]
+        build_paths[car_name] = paths
+
+    unique_paths = list(dict.fromkeys(path for paths in build_paths.values() for path in paths))
+    digests = digest_cache.digest_many(unique_paths, map_function)
+    key_roots = {path: script_dir for path in common[:len(BUILD_INPUT_SCRIPTS)]}
+    source_parent = os.path.dirname(source_dir)
+    inputs = {}
+    for car_name, paths in build_paths.items():
+        files = {
+            os.path.relpath(path, key_roots.get(path, source_parent)).replace('\\', '/'): digests[path]
+            for path in paths if path in digests
+        }
+        inputs[car_name] = {"files": files, "options": options}
+    return inputs
+
+def car_build_status(build_dir, car_name, inputs):
+    """
+    Why a built car is out of date, as a list of reasons (empty if it is up to date): compares
+    its manifest's inputs with the current ones and stats every file in Build/<car>.
+    """
+    try:
+        with open(car_manifest_path(build_dir, car_name), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return ["not built"]
+
+    reasons = []
+    built_inputs = manifest.get("inputs") or {"files": {}, "options": None}
+    if built_inputs["options"] != inputs["options"]:
+        reasons.append("built with different options")
+    old_files = built_inputs["files"]
+    new_files = inputs["files"]
+    changed = sorted(path for path in old_files.keys() | new_files.keys() if old_files.get(path) != new_files.get(path))
+    if changed:
+        shown = ", ".join(changed[:STATUS_MAX_LISTED])
+        more = f" (+{len(changed) - STATUS_MAX_LISTED} more)" if len(changed) > STATUS_MAX_LISTED else ""
+        reasons.append(f"{len(changed)} input file(s) changed: {shown}{more}")
+
+    car_build_dir = os.path.join(build_dir, car_name)
+    built_files = manifest.get("files", {})
+    seen = 0
+    modified = False
+    for root, dirs, files in os.walk(car_build_dir):
+        for name in files:
+            path = os.path.join(root, name)
+            info = built_files.get(os.path.relpath(path, car_build_dir).replace('\\', '/'))
+            stat = os.stat(path)
+            if info is None or (info["size"], info["mtime_ns"]) != (stat.st_size, stat.st_mtime_ns):
+                modified = True
+                break
+            seen += 1
+        if modified:
+            break
+    if modified or seen != len(built_files):
+        reasons.append(f"output in Build/{car_name} was modified")
+    return reasons
+
+def find_duplicate_car_files(source_dir, cars, ignore_patterns, map_function=map, digest_cache=None):
+    """
+    Finds files with identical content at the same relative path in two or more car folders.
+    Only files whose size matches another car's file at the same path are compared, by digest:
+    from digest_cache where it knows the file unchanged (a build has already digested every
+    input, see collect_build_inputs), otherwise hashed through map_function (e.g.
+    BuildExecutors.map_cpu to hash on a process pool) and stored in it.
+    Returns a list of dicts with "path" (relative to the car folder), "size", "digest" and
+    "cars", sorted by wasted bytes, largest first.
+    """
+    by_path = {}
+    for car_name in cars:
+        car_dir = os.path.join(source_dir, car_name)
+        for root, dirs, files in os.walk(car_dir):
+            dirs[:] = [d for d in dirs if not should_ignore_file(os.path.join(root, d), ignore_patterns)]
+            for file in files:
+                file_path = os.path.join(root, file)
+                if should_ignore_file(file_path, ignore_patterns) or file.endswith('.addon.ini'):
+                    continue
+                if not os.path.isfile(file_path):
+                    continue
+                rel_path = os.path.relpath(file_path, car_dir).replace('\\', '/')
+                by_path.setdefault(rel_path, []).append((car_name, os.path.getsize(file_path)))
+
+    candidates = []
+    for rel_path, entries in by_path.items():
+        sizes = {}
+        for car_name, size in entries:
+            sizes.setdefault(size, []).append(car_name)
+        for size, same_size_cars in sizes.items():
+            if len(same_size_cars) > 1:
+                candidates.append((rel_path, size, same_size_cars))
+
+    paths = [os.path.join(source_dir, car_name, rel_path)
+             for rel_path, size, same_size_cars in candidates for car_name in same_size_cars]
+    digests = (digest_cache if digest_cache is not None else DigestCache()).digest_many(paths, map_function)
+
+    groups = []
+    for rel_path, size, same_size_cars in candidates:
+        by_digest = {}
+        for car_name in same_size_cars:
+            digest = digests.get(os.path.join(source_dir, car_name, rel_path))
+            if digest is not None:
+                by_digest.setdefault(digest, []).append(car_name)
+        for digest, identical_cars in by_digest.items():
+            if len(identical_cars) > 1:
+                groups.append({"path": rel_path, "size": size, "digest": digest, "cars": sorted(identical_cars)})
+
+    groups.sort(key=lambda group: group["size"] * (len(group["cars"]) - 1), reverse=True)
+    return groups
+
+def report_duplicate_car_files(groups, cars, global_base_dir):
+    """
+    Prints the duplicate report for --suggest-base: wasted bytes per duplicated file and which
+    files are identical in every car and could move into Source/base.
+    """
+    wasted = sum(group["size"] * (len(group["cars"]) - 1) for group in groups)
+    print(f"{len(groups)} duplicated file(s) across {len(cars)} car(s), {wasted} bytes copied more than once.")
+
+    everywhere = [group for group in groups if len(group["cars"]) == len(cars)]
+    if everywhere:
+        print("\nIdentical in every car, could be moved into Source/base:")
+        for group in everywhere:
+            note = ""
+            if os.path.exists(os.path.join(global_base_dir, group["path"])):
+                note = "  (base already has a different file at this path)"
+            print(f"  {group['path']}  {group['size']} bytes x {len(group['cars'])}{note}")
+
+    partial = [group for group in groups if len(group["cars"]) < len(cars)]
+    if partial:
+        print("\nShared by some cars:")
+        for group in partial:
+            print(f"  {group['path']}  {group['size']} bytes x {len(group['cars'])}: {', '.join(group['cars'])}")
+
+class SharedLayer:
+    """
+    Implicit shared layer for car-folder files that are identical across cars: each one is read
+    from Source once, by the first car that copies it, and the same bytes are written into every
+    car that carries it. Every car still gets its own file, so later in-place stages cannot
+    affect other cars. Use copy() as the copy function when copying car folders. read_bytes and
+    reused_bytes count what was read from Source for the layer and what that saved reading.
+
+    For worker processes, publish() reads every shared file into one shared memory segment
+    that the pickled copies attach to, so the bytes are not re-read or pickled per car.
+    """
+
+    def __init__(self, source_dir, groups):
+        self.members = {}
+        for group in groups:
+            if group["size"] > SHARED_LAYER_MAX_BYTES:
+                continue
+            for car_name in group["cars"]:
+                path = os.path.normcase(os.path.abspath(os.path.join(source_dir, car_name, group["path"])))
+                self.members[path] = group["digest"]
+        # digest -> Future of the file's bytes, set by the car that reads it first
+        self.contents = {}
+        self.lock = threading.Lock()
+        self.read_bytes = 0
+        self.reused_bytes = 0
+        self.reserved_bytes = 0
+        self.shared_memory = None
+        self.shared_offsets = {}
+
+    def publish(self):
+        """Moves the shared files into a shared memory segment for worker processes. Call close() when done."""
+        from multiprocessing import shared_memory
+
+        sources = {}
+        for path, digest in self.members.items():
+            sources.setdefault(digest, path)
+        offset = 0
+        for digest, path in sources.items():
+            size = os.path.getsize(path)
+            self.shared_offsets[digest] = (offset, size)
+            offset += size
+        if not offset:
+            return
+        if not memory_budget.try_acquire(offset):
+            logger.info(f"Shared layer: {format_bytes(offset)} does not fit in --max-memory; workers read it from Source.")
+            self.shared_offsets = {}
+            return
+        self.reserved_bytes = offset
+
+        self.shared_memory = shared_memory.SharedMemory(create=True, size=offset)
+        for digest, (start, size) in self.shared_offsets.items():
+            with open(sources[digest], "rb") as f:
+                f.readinto(self.shared_memory.buf[start:start + size])
+        self.read_bytes = offset
+        # Every member after the first copy of each file is served from memory.
+        self.reused_bytes = sum(self.shared_offsets[digest][1] for digest in self.members.values()) - offset
+
+    def close(self):
+        if self.shared_memory is not None:
+            self.shared_memory.close()
+            self.shared_memory.unlink()
+            self.shared_memory = None
+        self.contents = {}
+        memory_budget.release(self.reserved_bytes)
+        self.reserved_bytes = 0
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["lock"] = None
+        state["contents"] = {}
+        state["reserved_bytes"] = 0
+        state["shared_memory"] = self.shared_memory.name if self.shared_memory is not None else None
+        return state
+
+    def __setstate__(self, state):
+        from multiprocessing import shared_memory
+
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+        if self.shared_memory is not None:
+            self.shared_memory = shared_memory.SharedMemory(name=self.shared_memory)
+
+    def copy(self, src, dst):
+        digest = self.members.get(os.path.normcase(os.path.abspath(src)))
+        if digest is None:
+            return shutil.copyfile(src, dst)
+
+        if self.shared_memory is not None:
+            start, size = self.shared_offsets[digest]
+            with open(dst, "wb") as f:
+                f.write(self.shared_memory.buf[start:start + size])
+            return dst
+
+        # Only the first car to copy a file reads it; others wait for that file alone.
+        with self.lock:
+            pending = self.contents.get(digest)
+            reader = pending is None
+            if reader:
+                pending = self.contents[digest] = Future()
+        if reader:
+            content = None
+            try:
+                # Kept for the rest of the build, so only while the budget has room for it.
+                size = os.path.getsize(src)
+                if memory_budget.try_acquire(size):
+                    try:
+                        with open(src, "rb") as f:
+                            content = f.read()
+                    except BaseException:
+                        memory_budget.release(size)
+                        raise
+                    with self.lock:
+                        self.reserved_bytes += size
+                        self.read_bytes += size
+            finally:
+                if content is None:
+                    # Not cached: this and waiting copies read Source; a later copy may try again.
+                    with self.lock:
+                        del self.contents[digest]
+                pending.set_result(content)
+        else:
+            content = pending.result()
+            if content is not None:
+                with self.lock:
+                    self.reused_bytes += len(content)
+        if content is None:
+            return shutil.copyfile(src, dst)
+
+        with open(dst, "wb") as f:
+            f.write(content)
+        return dst
+
+class BuildEvents:
+    """
+    Structured, low-overhead record of per-file build work (copies, skips, INI merges, prunes).
+
+    Each event carries a type, car, path, byte count and duration. Events are aggregated per
+    car, event type and output directory, and those roll-ups are what reaches build.log at
+    INFO level. Individual events are only formatted when DEBUG logging is enabled, and are
+    written to a JSONL file when one is configured. The time spent recording events is
+    tracked so the logging overhead of a build can be reported.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.context = threading.local()
+        self.rollups = {}
+        self.jsonl = None
+        self.count = 0
+        # One [nanoseconds] counter per thread that records events, summed by summary().
+        self.overhead_counters = []
+
+    def open_jsonl(self, path):
+        self.jsonl = open(path, "w", encoding="utf-8")
+        atexit.register(self.close)
+
+    def close(self):
+        with self.lock:
+            if self.jsonl is not None:
+                self.jsonl.close()
+                self.jsonl = None
+
+    def flush(self):
+        with self.lock:
+            if self.jsonl is not None:
+                self.jsonl.flush()
+
+    def bind(self, car_name, car_build_dir):
+        """Attributes events emitted from the current thread to car_name, with paths relative to its build folder."""
+        self.context.car = car_name
+        self.context.car_dir = car_build_dir
+
+    def emit(self, event, path, nbytes=None, duration=None, detail=None):
+        start = time.perf_counter_ns()
+        car = getattr(self.context, "car", None)
+        car_dir = getattr(self.context, "car_dir", None)
+        # Paths outside the car folder (e.g. matrix staging) are kept as they are.
+        rel_path = os.path.relpath(path, car_dir) if car_dir and path.startswith(car_dir + os.sep) else path
+        rel_path = rel_path.replace('\\', '/')
+        folder = os.path.dirname(rel_path) or "."
+
+        with self.lock:
+            rollup = self.rollups.get((car, event, folder))
+            if rollup is None:
+                rollup = self.rollups[(car, event, folder)] = [0, 0, 0.0]
+            rollup[0] += 1
+            rollup[1] += nbytes or 0
+            rollup[2] += duration or 0.0
+            self.count += 1
+            if self.jsonl is not None:
+                record = {"time": time.time(), "event": event, "car": car, "path": rel_path,
+                          "bytes": nbytes, "duration_s": duration}
+                if detail is not None:
+                    record["detail"] = detail
+                self.jsonl.write(json.dumps(record) + "\n")
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("%s [%s] %s%s%s", event, car, rel_path,
+                         f" ({nbytes} bytes)" if nbytes is not None else "",
+                         f" {detail}" if detail is not None else "")
+        self._add_overhead(start)
+
+    def copier(self, copy_function=shutil.copyfile, fs=DISK):
+        """Wraps a copy function (writing to fs) so that every file it copies is recorded as a "copy" event."""
+        def copy(src, dst):
+            start = time.perf_counter()
+            result = copy_function(src, dst)
+            # Copy functions that write under another name (token substitution) return it.
+            written = result if isinstance(result, str) else dst
+            self.emit("copy", written, fs.stat(written).st_size, time.perf_counter() - start)
+            return result
+        return copy
+
+    def flush_car(self, car_name):
+        """Logs one INFO line per (event type, directory) recorded for car_name and unbinds the thread."""
+        start = time.perf_counter_ns()
+        self.context.car = None
+        self.context.car_dir = None
+        with self.lock:
+            keys = sorted(key for key in self.rollups if key[0] == car_name)
+            rollups = [(key, self.rollups.pop(key)) for key in keys]
+        for (car, event, folder), (count, nbytes, duration) in rollups:
+            logger.info("%s: %s %d file(s) in %s/, %d bytes, %.1f ms",
+                        car, event, count, folder, nbytes, duration * 1000)
+        self._add_overhead(start)
+
+    def _add_overhead(self, start):
+        # Each thread only ever adds to its own counter, so no update is lost without locking.
+        counter = getattr(self.context, "overhead", None)
+        if counter is None:
+            counter = self.context.overhead = [0]
+            with self.lock:
+                self.overhead_counters.append(counter)
+        counter[0] += time.perf_counter_ns() - start
+
+    @property
+    def overhead_ns(self):
+        with self.lock:
+            return sum(counter[0] for counter in self.overhead_counters)
+
+    def summary(self, wall_seconds):
+        """One-line summary of how many events were recorded and what they cost."""
+        overhead = self.overhead_ns / 1e9
+        share = 100 * overhead / wall_seconds if wall_seconds > 0 else 0.0
+        return (f"Build took {wall_seconds:.3f} s; {self.count} build event(s) recorded, "
+                f"logging overhead {overhead * 1000:.1f} ms ({share:.1f}%)")
+
+build_events = BuildEvents()
+
+class BuildProfiler:
+    """
+    Per-stage CPU and memory profiling for --profile.
+
+    Every (car, stage) a worker thread runs gets its own cProfile, dumped to
+    DIR/<car>.<stage>.prof. Stages listed in PROFILE_MEMORY_STAGES are additionally bracketed
+    by tracemalloc snapshots, and the allocation sites that grew the most are written to
+    DIR/<car>.<stage>.memory.txt. tracemalloc sees the whole process, so a stage is only
+    measured if it ran alone: one that starts while another stage runs, or during which
+    another one starts, is counted as skipped instead (--workers 1 measures every stage).
+    report() merges all profiles into DIR/combined.prof and prints the hottest functions and
+    allocation sites. Nothing here is created unless --profile is given.
+    """
+
+    def __init__(self, out_dir):
+        import tracemalloc
+
+        self.out_dir = out_dir
+        os.makedirs(out_dir, exist_ok=True)
+        self.lock = threading.Lock()
+        self.context = threading.local()
+        self.profile_paths = []
+        self.memory_sites = {}
+        self.warned_busy = False
+        # Stages running right now, stages started so far, and memory stages that overlapped others.
+        self.active_stages = 0
+        self.started_stages = 0
+        self.skipped_memory_stages = 0
+        tracemalloc.start(PROFILE_TRACEMALLOC_FRAMES)
+
+    def _file_name(self, car_name, stage, suffix):
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", stage).strip("_").lower()
+        return os.path.join(self.out_dir, f"{car_name}.{slug}{suffix}")
+
+    def stage(self, car_name, stage):
+        """Ends the current thread's stage (if any) and starts profiling the next one. stage=None only ends it."""
+        import cProfile
+        import tracemalloc
+
+        self.finish()
+        if stage is None:
+            return
+
+        with self.lock:
+            self.active_stages += 1
+            self.started_stages += 1
+            started = self.started_stages
+            alone = self.active_stages == 1
+            if stage in PROFILE_MEMORY_STAGES and not alone:
+                self.skipped_memory_stages += 1
+        snapshot = tracemalloc.take_snapshot() if stage in PROFILE_MEMORY_STAGES and alone else None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Python 3.12+ allows only one active cProfile at a time across threads.
+            profile = None
+            with self.lock:
+                if not self.warned_busy:
+                    self.warned_busy = True
+                    logger.warning("Profiling: another stage is already being profiled; "
+                                   "use --workers 1 for complete CPU profiles on this Python version.")
+        self.context.current = (car_name, stage, profile, snapshot, started)
+
+    def finish(self):
+        import cProfile
+        import tracemalloc
+
+        current = getattr(self.context, "current", None)
+        if current is None:
+            return
+        self.context.current = None
+        car_name, stage, profile, before, started = current
+        with self.lock:
+            self.active_stages -= 1
+            if before is not None and self.started_stages != started:
+                # Another stage ran during this one; its allocations would be mixed in.
+                self.skipped_memory_stages += 1
+                before = None
+
+        if profile is not None:
+            profile.disable()
+            path = self._file_name(car_name, stage, ".prof")
+            profile.dump_stats(path)
+            with self.lock:
+                self.profile_paths.append(path)
+
+        if before is not None:
+            growth = tracemalloc.take_snapshot().compare_to(before, "lineno")
+            # Leave out what the profiler itself allocated.
+            own_files = (tracemalloc.__file__, cProfile.__file__)
+            top = [stat for stat in growth
+                   if stat.size_diff > 0 and stat.traceback[0].filename not in own_files][:PROFILE_TOP_N]
+            with open(self._file_name(car_name, stage, ".memory.txt"), "w", encoding="utf-8") as f:
+                f.write(f"Allocation growth during '{stage}' for {car_name}:\n")
+                for stat in top:
+                    f.write(f"{stat}\n")
+            with self.lock:
+                for stat in top:
+                    site = str(stat.traceback[0])
+                    self.memory_sites[site] = max(self.memory_sites.get(site, 0), stat.size_diff)
+
+    def report(self):
+        """Merges the per-stage profiles and prints the hottest functions and allocation sites."""
+        import io
+        import pstats
+        import tracemalloc
+
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        output = io.StringIO()
+        if self.profile_paths:
+            combined_path = os.path.join(self.out_dir, "combined.prof")
+            stats = pstats.Stats(*self.profile_paths, stream=output)
+            stats.dump_stats(combined_path)
+            output.write(f"Merged {len(self.profile_paths)} stage profile(s) into {combined_path}\n")
+            stats.sort_stats("cumulative").print_stats(PROFILE_TOP_N)
+
+        output.write(f"Peak traced memory (whole process): {peak} bytes\n")
+        if self.skipped_memory_stages:
+            output.write(f"{self.skipped_memory_stages} memory-profiled stage(s) overlapped other stages and were "
+                         f"not measured; use --workers 1 to measure every one.\n")
+        if self.memory_sites:
+            output.write("Largest allocation growth by site during memory-profiled stages that ran alone:\n")
+            for site, size in sorted(self.memory_sites.items(), key=lambda item: -item[1])[:PROFILE_TOP_N]:
+                output.write(f"  {size:>12} bytes  {site}\n")
+
+        text = output.getvalue()
+        with open(os.path.join(self.out_dir, "report.txt"), "w", encoding="utf-8") as f:
+            f.write(text)
+        print(text)
+        logger.info(f"Profiling report written to {os.path.join(self.out_dir, 'report.txt')}")
+
+def setup_logging(script_dir, level=logging.INFO, jsonl_path=None):
     log_path = os.path.join(script_dir, "build.log")
-    logger.setLevel(logging.INFO)
+    logger.setLevel(level)
     logger.propagate = False
     logger.handlers.clear()
 
     file_handler = logging.FileHandler(log_path, mode="w", encoding="utf-8")
-    file_handler.setLevel(logging.INFO)
+    file_handler.setLevel(level)
     file_handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s"))
 
     console_handler = logging.StreamHandler()
@@ -335,7 +1517,7 @@ def setup_logging(script_dir):
 
     log_queue = SimpleQueue()
     queue_handler = QueueHandler(log_queue)
-    queue_handler.setLevel(logging.INFO)
+    queue_handler.setLevel(level)
 
     logger.addHandler(queue_handler)
 
@@ -347,16 +1529,33 @@ def setup_logging(script_dir):
     )
     queue_listener.start()
     atexit.register(queue_listener.stop)
+
+    if jsonl_path:
+        build_events.open_jsonl(jsonl_path)
     return log_path, queue_listener
 
 class BuildProgress:
-    def __init__(self, total):
+    def __init__(self, total, profiler=None):
         self.total = total
         self.completed = 0
         self.active_steps = {}
         self.lock = threading.Lock()
+        self.profiler = profiler
+
+    def __getstate__(self):
+        # Only the silent BuildProgress(0) handed to worker processes is ever pickled.
+        state = self.__dict__.copy()
+        state["lock"] = None
+        state["profiler"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
 
     def update(self, car_name, step):
+        if self.profiler is not None:
+            self.profiler.stage(car_name, step)
         if self.total <= 0:
             return
         with self.lock:
@@ -364,6 +1563,8 @@ class BuildProgress:
             self._render(car_name, step)
 
     def complete(self, car_name):
+        if self.profiler is not None:
+            self.profiler.stage(car_name, None)
         if self.total <= 0:
             return
         with self.lock:
@@ -382,40 +1583,204 @@ class BuildProgress:
         sys.stdout.write("\r" + status.ljust(140))
         sys.stdout.flush()
 
-def pack_data_folder(car_build_dir, car_name):
+def _init_build_worker(log_queue, log_level, jsonl_path, memory_limit):
     """
-    Uses QuickBMS with the rebuilder script to pack the data folder into data.acd,
-    then deletes the original data folder.
+    Initializer for --backend processes car workers: log through the builder process, append to
+    its JSONL and buffer at most memory_limit bytes (the worker's share of --max-memory).
     """
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    quickbms_path = os.path.join(script_dir, "quickbms.exe")
-    rebuilder_script = os.path.join(script_dir, "assetto_corsa_acd_rebuilder.bms")
-    data_dir = os.path.join(car_build_dir, "data")
-    
-    # Check if QuickBMS and the rebuilder script exist
-    if not os.path.exists(quickbms_path):
-        logger.warning(f"QuickBMS not found at {quickbms_path}. Skipping data packing for {car_name}")
-        return False
-    
-    if not os.path.exists(rebuilder_script):
-        logger.warning(f"Rebuilder script not found at {rebuilder_script}. Skipping data packing for {car_name}")
-        return False
-    
-    if not os.path.exists(data_dir):
-        logger.warning(f"Data folder not found for {car_name}. Skipping data packing.")
-        return False
-    
-    input_acd = None
-    try:
-        # The rebuilder derives the XOR key from the input ACD path context.
-        # Keep input as <car_name>/data.acd while scanning files from the data folder.
-        input_acd = os.path.join(car_build_dir, "__builder_input_data.acd")
-        if os.path.exists(input_acd):
+    memory_budget.limit = memory_limit
+    logger.setLevel(log_level)
+    logger.propagate = False
+    logger.handlers.clear()
+    logger.addHandler(QueueHandler(log_queue))
+    # A forked worker inherits the parent's (already flushed) JSONL file object; use its own handle.
+    build_events.jsonl = open(jsonl_path, "a", encoding="utf-8", buffering=1) if jsonl_path else None
+
+class BuildExecutors:
+    """
+    Executors for the chosen --backend.
+
+    cars runs one build_one_car per car: a thread pool, or for "processes" a process pool whose
+    workers log through the builder process. cpu runs CPU-bound steps (release zip deflate,
+    hashing) on a process pool for "hybrid" and "processes"; with "threads" those steps run
+    inline in the calling thread. Work is handed to processes by file path, never as file
+    contents. "asyncio" builds cars on its own event loop (see build_cars_async) and, like
+    "threads", runs CPU-bound release steps inline.
+    """
+
+    def __init__(self, backend, workers):
+        self.backend = backend
+        self.workers = workers
+        self.log_listener = None
+        self._cars = None
+        self.cpu = None
+        if backend in ("hybrid", "processes"):
+            from concurrent.futures import ProcessPoolExecutor
+            self.cpu = ProcessPoolExecutor()
+
+    @property
+    def cars(self):
+        if self._cars is None:
+            if self.backend == "processes":
+                import multiprocessing
+                from concurrent.futures import ProcessPoolExecutor
+
+                log_queue = multiprocessing.Queue()
+                self.log_listener = QueueListener(log_queue, *logger.handlers)
+                self.log_listener.start()
+                jsonl_path = build_events.jsonl.name if build_events.jsonl is not None else None
+                build_events.flush()
+                self._cars = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    initializer=_init_build_worker,
+                    initargs=(log_queue, logger.level, jsonl_path,
+                              memory_budget.limit // self.workers if memory_budget.limit is not None else None),
+                )
+            else:
+                self._cars = ThreadPoolExecutor(max_workers=self.workers)
+        return self._cars
+
+    def map_cpu(self, function, iterable):
+        if self.cpu is None:
+            return map(function, iterable)
+        return self.cpu.map(function, iterable, chunksize=16)
+
+    def submit_cpu(self, function, *args):
+        """Returns a future; without a process pool the function runs immediately in this thread."""
+        if self.cpu is not None:
+            return self.cpu.submit(function, *args)
+        future = Future()
+        try:
+            future.set_result(function(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def shutdown(self):
+        if self._cars is not None:
+            self._cars.shutdown()
+        if self.cpu is not None:
+            self.cpu.shutdown()
+        if self.log_listener is not None:
+            self.log_listener.stop()
+            self.log_listener = None
+
+class BuildStep:
+    """
+    One unit of work in a car's build, yielded by car_build_steps() and pack_data_steps() for a
+    runner to execute: function(*args) on resource "disk" or "cpu", or for "subprocess" the
+    command args[0] in the folder args[1], whose (returncode, stdout, stderr) is sent back. name,
+    if set, becomes the car's progress step; memory is reserved from memory_budget meanwhile.
+    The generator gets each result back from its yield, or the step's exception raised there.
+    """
+
+    __slots__ = ("resource", "name", "function", "args", "memory")
+
+    def __init__(self, resource, name, function, args=(), memory=0):
+        self.resource = resource
+        self.name = name
+        self.function = function
+        self.args = args
+        self.memory = memory
+
+def run_build_steps(steps, car_name=None, progress=None):
+    """Runs a BuildStep generator in the calling thread and returns its return value."""
+    import subprocess
+
+    send, value = steps.send, None
+    while True:
+        try:
+            step = send(value)
+        except StopIteration as stop:
+            return stop.value
+        try:
+            if step.name is not None and progress is not None:
+                progress.update(car_name, step.name)
+            with memory_budget.reserve(step.memory):
+                if step.resource == "subprocess":
+                    command, cwd = step.args
+                    result = subprocess.run(command, capture_output=True, text=True, cwd=cwd)
+                    value = (result.returncode, result.stdout, result.stderr)
+                else:
+                    value = step.function(*step.args)
+            send = steps.send
+        except Exception as e:
+            send, value = steps.throw, e
+
+def quickbms_tools():
+    """Paths of QuickBMS and the ACD rebuilder script, next to this script."""
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(script_dir, "quickbms.exe"), os.path.join(script_dir, "assetto_corsa_acd_rebuilder.bms")
+
+def write_pack_input(input_acd, data_dir):
+    """Writes the dummy input ACD the rebuilder reads; returns the size of data_dir's files."""
+    with open(input_acd, 'wb') as f:
+        f.write(b'\x00' * 16)
+    return sum(os.path.getsize(os.path.join(root, file)) for root, dirs, files in os.walk(data_dir) for file in files)
+
+def install_rebuilt_acd(car_build_dir, car_name):
+    """Moves the rebuilder's output to <car>/data.acd and removes the data folder. Returns False if there is none."""
+    data_dir = os.path.join(car_build_dir, "data")
+
+    # Rebuilder outputs to ./<car_name>/<input_filename>.rebuilt.
+    rebuilt_file = None
+    expected_rebuilt = os.path.join(data_dir, car_name, PACK_INPUT_NAME + ".rebuilt")
+    if os.path.exists(expected_rebuilt):
+        rebuilt_file = expected_rebuilt
+
+    for root, dirs, files in os.walk(data_dir):
+        if rebuilt_file:
+            break
+        for file in files:
+            if file.endswith('.rebuilt'):
+                rebuilt_file = os.path.join(root, file)
+                break
+
+    if not rebuilt_file:
+        logger.error(f"No .rebuilt file generated for {car_name}")
+        return False
+
+    # Move the .rebuilt file to data.acd in the car root and remove unpacked data folder.
+    final_acd = os.path.join(car_build_dir, "data.acd")
+    if os.path.exists(final_acd):
+        os.remove(final_acd)
+    shutil.move(rebuilt_file, final_acd)
+    shutil.rmtree(data_dir)
+    return True
+
+def pack_data_steps(car_build_dir, car_name):
+    """
+    Uses QuickBMS with the rebuilder script to pack the data folder into data.acd,
+    then deletes the original data folder. A BuildStep generator (see pack_data_folder);
+    returns True if data.acd was written. The rebuilder's input file is removed even if
+    the generator is closed part way, as when an --backend asyncio build is cancelled.
+    """
+    quickbms_path, rebuilder_script = quickbms_tools()
+    data_dir = os.path.join(car_build_dir, "data")
+    
+    # Check if QuickBMS and the rebuilder script exist
+    if not os.path.exists(quickbms_path):
+        logger.warning(f"QuickBMS not found at {quickbms_path}. Skipping data packing for {car_name}")
+        return False
+    
+    if not os.path.exists(rebuilder_script):
+        logger.warning(f"Rebuilder script not found at {rebuilder_script}. Skipping data packing for {car_name}")
+        return False
+    
+    if not os.path.exists(data_dir):
+        logger.warning(f"Data folder not found for {car_name}. Skipping data packing.")
+        return False
+    
+    input_acd = None
+    try:
+        # The rebuilder derives the XOR key from the input ACD path context.
+        # Keep input as <car_name>/data.acd while scanning files from the data folder.
+        input_acd = os.path.join(car_build_dir, PACK_INPUT_NAME)
+        if os.path.exists(input_acd):
             logger.error(f"Unexpected existing '{input_acd}' before packing; skipping {car_name}")
             return False
 
-        with open(input_acd, 'wb') as f:
-            f.write(b'\x00' * 16)
+        data_size = yield BuildStep("disk", "Packing data.acd", write_pack_input, (input_acd, data_dir))
 
         cmd = [
             quickbms_path,
@@ -424,46 +1789,25 @@ def pack_data_folder(car_build_dir, car_name):
             "."
         ]
         
+        # QuickBMS assembles the whole archive in memory before writing it out.
         logger.info(f"Packing data folder for {car_name}...")
         logger.info(f"Command: {' '.join(cmd)} (in directory: {data_dir})")
-        result = subprocess.run(cmd, capture_output=True, text=True, cwd=data_dir)
+        returncode, stdout, stderr = yield BuildStep("subprocess", None, None, (cmd, data_dir), data_size)
         
         # Log full QuickBMS output to file only (info-level).
-        if result.stdout:
+        if stdout:
             logger.info("QuickBMS stdout:")
-            logger.info(result.stdout)
-        if result.stderr:
+            logger.info(stdout)
+        if stderr:
             logger.info("QuickBMS stderr:")
-            logger.info(result.stderr)
+            logger.info(stderr)
 
-        if result.returncode != 0:
-            logger.error(f"Error packing data for {car_name}: QuickBMS returned code {result.returncode}")
+        if returncode != 0:
+            logger.error(f"Error packing data for {car_name}: QuickBMS returned code {returncode}")
             return False
 
-        # Rebuilder outputs to ./<car_name>/<input_filename>.rebuilt.
-        rebuilt_file = None
-        expected_rebuilt = os.path.join(data_dir, car_name, "__builder_input_data.acd.rebuilt")
-        if os.path.exists(expected_rebuilt):
-            rebuilt_file = expected_rebuilt
-
-        for root, dirs, files in os.walk(data_dir):
-            if rebuilt_file:
-                break
-            for file in files:
-                if file.endswith('.rebuilt'):
-                    rebuilt_file = os.path.join(root, file)
-                    break
-
-        if not rebuilt_file:
-            logger.error(f"No .rebuilt file generated for {car_name}")
+        if not (yield BuildStep("disk", None, install_rebuilt_acd, (car_build_dir, car_name))):
             return False
-
-        # Move the .rebuilt file to data.acd in the car root and remove unpacked data folder.
-        final_acd = os.path.join(car_build_dir, "data.acd")
-        if os.path.exists(final_acd):
-            os.remove(final_acd)
-        shutil.move(rebuilt_file, final_acd)
-        shutil.rmtree(data_dir)
         
         logger.info(f"Successfully packed data folder for {car_name} -> data.acd")
         return True
@@ -478,13 +1822,119 @@ def pack_data_folder(car_build_dir, car_name):
             except Exception:
                 pass
 
-def pack_release_zip(script_dir, build_dir, project_name, version):
+def pack_data_folder(car_build_dir, car_name):
+    """Packs car_build_dir/data into data.acd in the calling thread (see pack_data_steps)."""
+    return run_build_steps(pack_data_steps(car_build_dir, car_name))
+
+def collect_release_files(script_dir, build_dir, fs=DISK):
+    """
+    Lists what a release contains as (file_path, archive_name) pairs: every file of every car
+    folder in Build under content/cars/<car>/, plus LICENSE.txt if it exists. Paths are on fs.
+    """
+    members = []
+    # Add each car folder to content/cars/
+    for item in sorted(entry.name for entry in fs.scan(build_dir)):
+        item_path = os.path.join(build_dir, item)
+        if fs.isdir(item_path):
+            car_name = item
+            logger.info(f"Adding car '{car_name}' to release...")
+
+            # Add all files in the car folder
+            for root, dirs, files in fs.walk(item_path):
+                dirs.sort()
+                for file in sorted(files):
+                    file_path = os.path.join(root, file)
+                    # Calculate the relative path from the car folder
+                    rel_path = os.path.relpath(file_path, item_path)
+                    # Create the zip path as content/cars/car_name/rel_path
+                    members.append((file_path, f"content/cars/{car_name}/{rel_path}".replace('\\', '/')))
+
+    # Add LICENSE.txt if it exists
+    license_path = os.path.join(script_dir, "LICENSE.txt")
+    if fs.exists(license_path):
+        members.append((license_path, "LICENSE.txt"))
+        logger.info("Added LICENSE.txt to release")
+    else:
+        logger.warning("LICENSE.txt not found, skipping")
+    return members
+
+def write_release_zip(zip_path, members, executors=None, extra_files=None, fs=DISK):
+    """
+    Writes (file_path, archive_name) members (paths on fs) into a new zip, plus extra_files
+    ({archive_name: str or bytes}) at the end. With a process-pool backend, disk members of
+    PROCESS_OFFLOAD_MIN_BYTES or more are deflated in parallel worker processes (spooled
+    through temporary files) and appended in order with ZipFileSystem.write_raw_member().
+    """
+    import tempfile
+    from build_fs import ZipFileSystem, deflate_file
+
+    with ZipFileSystem(zip_path) as zip_fs, tempfile.TemporaryDirectory() as spool_dir:
+        offload = fs.is_disk and executors is not None and executors.cpu is not None and zip_fs.raw_members
+        futures = []
+        for index, (file_path, archive_name) in enumerate(members):
+            future = None
+            if offload and os.path.getsize(file_path) >= PROCESS_OFFLOAD_MIN_BYTES:
+                future = executors.submit_cpu(deflate_file, file_path, os.path.join(spool_dir, str(index)))
+            futures.append(future)
+
+        for index, ((file_path, archive_name), future) in enumerate(zip(members, futures)):
+            if future is None:
+                zip_fs.write_from(fs, file_path, archive_name)
+            else:
+                spool_path = os.path.join(spool_dir, str(index))
+                if not zip_fs.write_raw_member(file_path, archive_name, spool_path, *future.result()):
+                    zip_fs.write_from(fs, file_path, archive_name)
+                os.remove(spool_path)
+
+        for archive_name, content in (extra_files or {}).items():
+            with zip_fs.open_write(archive_name) as f:
+                f.write(content.encode("utf-8") if isinstance(content, str) else content)
+
+def release_manifest_path(script_dir, project_name, version):
+    return os.path.join(script_dir, f"{project_name} v{version}.manifest.json")
+
+def build_release_manifest(project_name, version, members, map_function=map, known_digests=None, fs=DISK):
+    """
+    Per-file manifest of a release: {"project", "version", "files": {archive_name: {"size", "sha256"}}}.
+    Digests are taken from known_digests (see load_car_manifest_digests) when a file's size and
+    mtime still match; the rest are hashed through map_function (e.g. BuildExecutors.map_cpu),
+    or in this thread for members that are not on disk.
+    """
+    known_digests = known_digests or {}
+    sizes = {}
+    digests = {}
+    to_hash = []
+    for file_path, archive_name in members:
+        stat = fs.stat(file_path)
+        sizes[file_path] = stat.st_size
+        known = known_digests.get(os.path.normcase(os.path.abspath(file_path)))
+        if known is not None and known[:2] == (stat.st_size, stat.st_mtime_ns):
+            digests[file_path] = known[2]
+        else:
+            to_hash.append(file_path)
+    if not fs.is_disk:
+        map_function = lambda function, paths: (function(path, fs) for path in paths)
+    digests.update(zip(to_hash, map_function(hash_file, to_hash)))
+
+    files = {}
+    for file_path, archive_name in members:
+        files[archive_name] = {"size": sizes[file_path], "sha256": digests[file_path]}
+    return {"project": project_name, "version": version, "files": files}
+
+def write_release_manifest(path, manifest):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    logger.info(f"Release manifest written: {path}")
+
+def pack_release_zip(script_dir, build_dir, project_name, version, executors=None, fs=DISK):
     """
-    Creates a release zip file from the Build folder contents.
+    Creates a release zip file from the Build folder contents (on fs).
     The zip structure will be content/cars/each_car_folder.
     Also includes LICENSE.txt if it exists.
+    A per-file manifest (size and SHA-256 of every member) is written next to the zip so a
+    later version can be shipped as a patch against it (see pack_patch_zip).
     """
-    if not os.path.exists(build_dir):
+    if not fs.exists(build_dir):
         logger.error(f"Build directory not found: {build_dir}")
         return False
     
@@ -495,31 +1945,12 @@ def pack_release_zip(script_dir, build_dir, project_name, version):
     logger.info(f"Creating release zip: {zip_filename}")
     
     try:
-        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            # Add each car folder to content/cars/
-            for item in os.listdir(build_dir):
-                item_path = os.path.join(build_dir, item)
-                if os.path.isdir(item_path):
-                    car_name = item
-                    logger.info(f"Adding car '{car_name}' to release zip...")
-                    
-                    # Add all files in the car folder
-                    for root, dirs, files in os.walk(item_path):
-                        for file in files:
-                            file_path = os.path.join(root, file)
-                            # Calculate the relative path from the car folder
-                            rel_path = os.path.relpath(file_path, item_path)
-                            # Create the zip path as content/cars/car_name/rel_path
-                            zip_path_in_archive = f"content/cars/{car_name}/{rel_path}".replace('\\', '/')
-                            zipf.write(file_path, zip_path_in_archive)
-            
-            # Add LICENSE.txt if it exists
-            license_path = os.path.join(script_dir, "LICENSE.txt")
-            if os.path.exists(license_path):
-                zipf.write(license_path, "LICENSE.txt")
-                logger.info("Added LICENSE.txt to release zip")
-            else:
-                logger.warning("LICENSE.txt not found, skipping")
+        members = collect_release_files(script_dir, build_dir, fs)
+        write_release_zip(zip_path, members, executors, fs=fs)
+        map_function = executors.map_cpu if executors is not None else map
+        manifest = build_release_manifest(project_name, version, members, map_function,
+                                          load_car_manifest_digests(build_dir, fs), fs)
+        write_release_manifest(release_manifest_path(script_dir, project_name, version), manifest)
         
         logger.info(f"Release zip created successfully: {zip_path}")
         return True
@@ -528,112 +1959,1261 @@ def pack_release_zip(script_dir, build_dir, project_name, version):
         logger.error(f"Error creating release zip: {e}")
         return False
 
-def build_one_car(car_name, source_dir, build_dir, global_base_dir, ignore_patterns, info_version, info_year, progress):
-    item_path = os.path.join(source_dir, car_name)
-    logger.info(f"Processing car: {car_name}")
+def diff_release_manifests(old_manifest, new_manifest):
+    """Returns (changed, deleted): archive names added or modified in the new manifest, and those it no longer has."""
+    old_files = old_manifest["files"]
+    new_files = new_manifest["files"]
+    changed = sorted(name for name, entry in new_files.items() if old_files.get(name) != entry)
+    deleted = sorted(name for name in old_files if name not in new_files)
+    return changed, deleted
+
+def verify_patch(old_manifest, patch_zip_path, new_manifest):
+    """
+    Applies a patch zip to the old manifest (deleting its listed files, adding or replacing
+    every member with the size and SHA-256 of the bytes actually stored in the zip) and
+    checks that the result is exactly the new manifest. Returns a list of problems.
+    """
+    import zipfile
+
+    files = dict(old_manifest["files"])
+    problems = []
+    with zipfile.ZipFile(patch_zip_path) as zipf:
+        patch_info = json.loads(zipf.read(PATCH_INFO_NAME))
+        for name in patch_info["deleted"]:
+            if files.pop(name, None) is None:
+                problems.append(f"deletes '{name}', which the old release does not have")
+
+        for zinfo in zipf.infolist():
+            if zinfo.filename == PATCH_INFO_NAME:
+                continue
+            digest = hashlib.sha256()
+            with zipf.open(zinfo) as member:
+                for chunk in iter(lambda: member.read(HASH_CHUNK_SIZE), b""):
+                    digest.update(chunk)
+            files[zinfo.filename] = {"size": zinfo.file_size, "sha256": digest.hexdigest()}
+
+    expected = new_manifest["files"]
+    for name in sorted(set(files) | set(expected)):
+        if name not in expected:
+            problems.append(f"'{name}' would be left over after patching")
+        elif name not in files:
+            problems.append(f"'{name}' would be missing after patching")
+        elif files[name] != expected[name]:
+            problems.append(f"'{name}' would not match the new release after patching")
+    return problems
+
+def pack_patch_zip(script_dir, build_dir, project_name, version, from_manifest_path, executors=None, fs=DISK):
+    """
+    Creates "<project> v<old> to v<new> patch.zip" holding only the files that were added or
+    changed since the release described by from_manifest_path, plus PATCH_INFO_NAME with the
+    files to delete and the full manifest of the new release. The patch is verified against
+    both manifests before it is kept; the new release manifest is written next to it.
+    Build is read from fs.
+    """
+    if not fs.exists(build_dir):
+        logger.error(f"Build directory not found: {build_dir}")
+        return False
 
     try:
-        # Create a new folder for the car in Build
-        progress.update(car_name, "Preparing build folder")
-        car_build_dir = os.path.join(build_dir, car_name)
-        os.makedirs(car_build_dir, exist_ok=True)
+        with open(from_manifest_path, "r", encoding="utf-8") as f:
+            old_manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.error(f"Cannot read release manifest {from_manifest_path}: {e}")
+        return False
 
-        # Copy global base folder contents into the car build folder
-        progress.update(car_name, "Copying base content")
+    zip_path = os.path.join(script_dir, f"{project_name} v{old_manifest['version']} to v{version} patch.zip")
+    logger.info(f"Creating patch zip: {os.path.basename(zip_path)}")
+
+    try:
+        members = collect_release_files(script_dir, build_dir, fs)
+        map_function = executors.map_cpu if executors is not None else map
+        new_manifest = build_release_manifest(project_name, version, members, map_function,
+                                              load_car_manifest_digests(build_dir, fs), fs)
+        changed, deleted = diff_release_manifests(old_manifest, new_manifest)
+        changed_set = set(changed)
+
+        patch_info = {
+            "project": project_name,
+            "from_version": old_manifest["version"],
+            "to_version": version,
+            "deleted": deleted,
+            "manifest": new_manifest,
+        }
+        write_release_zip(
+            zip_path,
+            [member for member in members if member[1] in changed_set],
+            executors,
+            {PATCH_INFO_NAME: json.dumps(patch_info, indent=1, sort_keys=True)},
+            fs,
+        )
+
+        problems = verify_patch(old_manifest, zip_path, new_manifest)
+        if problems:
+            for problem in problems:
+                logger.error(f"Patch verification: {problem}")
+            os.remove(zip_path)
+            return False
+
+        write_release_manifest(release_manifest_path(script_dir, project_name, version), new_manifest)
+        unchanged = len(members) - len(changed)
+        logger.info(f"Patch zip created and verified: {len(changed)} added/changed, {len(deleted)} deleted, "
+                    f"{unchanged} unchanged file(s) left out: {zip_path}")
+        return True
+
+    except Exception as e:
+        logger.error(f"Error creating patch zip: {e}")
+        return False
+
+def validate_source_luts(source_dir, cars_to_build, ignore_patterns, cache_dir, workers):
+    """
+    Parses and checks every .lut/.rto table in Source/base and in the cars being built.
+    Returns True if all tables are well formed; otherwise logs each problem with its file and
+    line and returns False. Skipped with a warning if NumPy is not installed.
+    """
+    try:
+        import lut
+    except ImportError as e:
+        logger.warning(f"LUT validation skipped ({e}). Install numpy to enable it.")
+        return True
+
+    paths = []
+    for folder in ["base"] + list(cars_to_build):
+        for path in lut.find_lut_files(os.path.join(source_dir, folder)):
+            if not should_ignore_file(os.path.relpath(path, source_dir), ignore_patterns):
+                paths.append(path)
+
+    errors = lut.validate_lut_files(paths, cache_dir=cache_dir, workers=workers)
+    for error in errors:
+        logger.error(f"Invalid LUT {error}")
+
+    logger.info(f"Validated {len(paths)} LUT file(s): {len(errors)} problem(s) found.")
+    return not errors
+
+def collect_file_references(path):
+    """
+    Returns the file names referenced by a text file: anything that looks like a data file name
+    (LUT/RTO/INI values such as "POWER_CURVE=power.lut" or "FILE=", [INCLUDE: ...] headers,
+    quoted names in Lua) plus Lua require()s, mapped to their .lua files.
+    Mentions inside comments count too, which can only keep files, never drop them.
+    """
+    try:
+        with memory_budget.reserve(os.path.getsize(path)), open(path, "r", encoding="utf-8", errors="replace") as f:
+            text = f.read()
+    except OSError:
+        return []
+
+    references = [match.replace("\\", "/") for match in FILE_REFERENCE_RE.findall(text)]
+    if path.lower().endswith(".lua"):
+        for module in LUA_REQUIRE_RE.findall(text):
+            if not module.lower().endswith(".lua"):
+                module = module.replace(".", "/") + ".lua"
+            references.append(module)
+    return references
+
+def find_reachable_files(car_build_dir, roots):
+    """
+    Walks the reference graph of a built car starting at the given root files (paths relative
+    to the car folder) and returns the set of reachable relative paths, lowercased.
+    References resolve against the referencing file's folder first, then the car folder.
+    """
+    existing = {}
+    for root, dirs, files in os.walk(car_build_dir):
+        for file in files:
+            rel_path = os.path.relpath(os.path.join(root, file), car_build_dir).replace("\\", "/")
+            existing[rel_path.lower()] = rel_path
+
+    pending = [root.lower() for root in roots if root.lower() in existing]
+    reachable = set(pending)
+    while pending:
+        rel_path = existing[pending.pop()]
+        if not rel_path.lower().endswith((".ini", ".lua")):
+            continue
+
+        folder = os.path.dirname(rel_path)
+        for reference in collect_file_references(os.path.join(car_build_dir, rel_path)):
+            for candidate in (os.path.join(folder, reference), reference):
+                key = os.path.normpath(candidate).replace("\\", "/").lower()
+                if key in existing:
+                    if key not in reachable:
+                        reachable.add(key)
+                        pending.append(key)
+                    break
+
+    return reachable
+
+def tree_shake_car(car_build_dir, car_name, shake_config):
+    """
+    Removes files in the data/ and extension/ folders of a built car that no root file references,
+    directly or indirectly. Files matching the "keep" patterns are always shipped.
+    Logs every pruned file and returns (pruned_count, pruned_bytes).
+    """
+    roots = TREE_SHAKE_ROOTS + list(shake_config.get("roots", []))
+    keep_patterns = roots + list(shake_config.get("keep", []))
+    reachable = find_reachable_files(car_build_dir, roots)
+
+    pruned_count = 0
+    pruned_bytes = 0
+    for scope in TREE_SHAKE_SCOPE:
+        scope_dir = os.path.join(car_build_dir, scope)
+        for root, dirs, files in os.walk(scope_dir):
+            for file in files:
+                file_path = os.path.join(root, file)
+                rel_path = os.path.relpath(file_path, car_build_dir).replace("\\", "/")
+                if rel_path.lower() in reachable:
+                    continue
+                if any(fnmatch.fnmatch(rel_path.lower(), pattern.lower()) for pattern in keep_patterns):
+                    continue
+                try:
+                    size = os.path.getsize(file_path)
+                    os.remove(file_path)
+                    pruned_count += 1
+                    pruned_bytes += size
+                    # Prunes are rare and destructive: each one stays in build.log, not just the roll-up
+                    logger.info(f"Tree shaking: pruned unreferenced '{rel_path}' ({size} bytes) from {car_name}")
+                    build_events.emit("prune", file_path, size)
+                except OSError as e:
+                    logger.error(f"Tree shaking: could not remove {file_path}: {e}")
+
+    logger.info(f"Tree shaking: pruned {pruned_count} file(s), {pruned_bytes} bytes from {car_name}")
+    return pruned_count, pruned_bytes
+
+def minify_lua_scripts(car_build_dir, car_name, minifier):
+    """
+    Minifies every .lua file under the data/ and extension/ folders of a built car in place.
+    Scripts that fail to tokenize or verify, or cannot be read or written, are shipped unchanged
+    with a warning.
+    Returns the number of bytes saved.
+    """
+    from lua_minify import LuaMinifyError
+
+    saved = 0
+    for folder in ("data", "extension"):
+        for root, dirs, files in os.walk(os.path.join(car_build_dir, folder)):
+            for file in files:
+                if not file.lower().endswith(".lua"):
+                    continue
+                path = os.path.join(root, file)
+                try:
+                    # The file, its decoded text and the result.
+                    with memory_budget.reserve(3 * os.path.getsize(path)):
+                        before, after = minifier.minify_file(path)
+                    saved += before - after
+                except (LuaMinifyError, UnicodeDecodeError, OSError) as e:
+                    logger.warning(f"Could not minify {path} for {car_name}, shipping it unchanged: {e}")
+
+    logger.info(f"Minified Lua scripts for {car_name}: saved {saved} bytes")
+    return saved
+
+def optimize_car_pngs(car_build_dir, car_name, optimizer):
+    """
+    Losslessly recompresses every PNG in a built car (shadows, textures, skins, ui) in place.
+    All of the car's images are queued on the optimizer's process pool before any result is
+    awaited, as far as --max-memory allows; when the budget is used up the oldest one is
+    collected first. Images that fail pixel verification are shipped unchanged with a warning.
+    Returns the number of bytes saved.
+    """
+    from collections import deque
+    from png_optimize import PngError, working_set_size
+
+    saved = 0
+    pending = deque()
+
+    def collect_oldest():
+        nonlocal saved
+        path, reserved, data, future = pending.popleft()
         try:
-            for entry in os.scandir(global_base_dir):
-                if should_ignore_file(entry.path, ignore_patterns):
-                    logger.info(f"Skipping ignored file/folder '{entry.name}'")
+            before, after = optimizer.finish_file(path, data, future)
+            saved += before - after
+        except PngError as e:
+            logger.warning(f"Could not optimize {path} for {car_name}, shipping it unchanged: {e}")
+        finally:
+            memory_budget.release(reserved)
+
+    try:
+        for root, dirs, files in os.walk(car_build_dir):
+            for file in files:
+                if not file.lower().endswith(".png"):
                     continue
+                path = os.path.join(root, file)
+                size = working_set_size(path)
+                while pending and not memory_budget.try_acquire(size):
+                    collect_oldest()
+                reserved = size if pending else memory_budget.acquire(size)
+                try:
+                    pending.append((path, reserved) + optimizer.submit_file(path))
+                except BaseException:
+                    memory_budget.release(reserved)
+                    raise
+        while pending:
+            collect_oldest()
+    finally:
+        for path, reserved, data, future in pending:
+            memory_budget.release(reserved)
 
-                dst_item = os.path.join(car_build_dir, entry.name)
-                if entry.is_dir():
-                    shutil.copytree(entry.path, dst_item, dirs_exist_ok=True, copy_function=shutil.copyfile)
-                    logger.info(f"Copied folder '{entry.name}' from base into '{car_name}'")
-                else:
-                    shutil.copyfile(entry.path, dst_item)
-                    logger.info(f"Copied file '{entry.name}' from base into '{car_name}'")
+    logger.info(f"Optimized PNGs for {car_name}: saved {saved} bytes")
+    return saved
+
+class MatrixVariant:
+    """
+    A car generated from the kart-class matrix: the class folder and overlay folders to merge
+    over Source/base (layers, relative to Source), INI values to set afterwards
+    ({file: {section: {key: value}}}) and ui_car.json fields to override.
+    """
+
+    def __init__(self, name, layers, ini, ui, stager):
+        self.name = name
+        self.layers = layers
+        self.ini = ini
+        self.ui = ui
+        self.stager = stager
+
+def load_matrix(source_dir, info_data):
+    """Returns the [matrix] table from info.toml, else from Source/matrix.toml, else None."""
+    if "matrix" in info_data:
+        return info_data["matrix"]
+    matrix_path = os.path.join(source_dir, MATRIX_FILE)
+    if not os.path.exists(matrix_path):
+        return None
+    with open(matrix_path, "rb") as f:
+        return tomllib.load(f).get("matrix")
+
+def _format_matrix_value(value, fields):
+    if isinstance(value, str):
+        return value.format_map(fields)
+    if isinstance(value, dict):
+        return {key: _format_matrix_value(item, fields) for key, item in value.items()}
+    return value
+
+def _merge_matrix_tables(target, table):
+    for key, value in table.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            _merge_matrix_tables(target[key], value)
+        else:
+            target[key] = value
+
+def expand_matrix(matrix, source_dir, stager):
+    """
+    Expands a matrix spec into MatrixVariants: every class crossed with one option of every axis.
+
+        [matrix]
+        classes = ["ohyeah2389_modkart_dd2", "ohyeah2389_modkart_ka100sr"]
+        name = "{class}_{weight}"
+
+        [matrix.axes.weight.light]
+        ini."data/car.ini".BASIC.TOTALMASS = 160
+
+        [matrix.axes.weight.heavy]
+        overlays = ["heavy_ballast"]            # folders in Source/overlays, merged in order
+        ini."data/car.ini".BASIC.TOTALMASS = 185
+        ui.name = "{class} ({weight})"
+
+    Strings in "name", "ini" and "ui" are formatted with {class} and the chosen option of each
+    axis. Raises ValueError for unknown classes or overlays and for duplicate names.
+    """
+    classes = matrix.get("classes", [])
+    axes = matrix.get("axes", {})
+    name_template = matrix.get("name", "{class}_" + "_".join("{" + axis + "}" for axis in axes))
+
+    for class_name in classes:
+        if not os.path.isdir(os.path.join(source_dir, class_name)):
+            raise ValueError(f"matrix class '{class_name}' is not a folder in Source")
+
+    combinations = [{}]
+    for axis, options in axes.items():
+        combinations = [dict(chosen, **{axis: option}) for chosen in combinations for option in options]
+
+    variants = []
+    names = set()
+    for class_name in classes:
+        for chosen in combinations:
+            fields = {"class": class_name, **chosen}
+            layers = [class_name]
+            ini = {}
+            ui = {}
+            for axis, option in chosen.items():
+                spec = axes[axis][option]
+                for overlay in spec.get("overlays", []):
+                    overlay_path = os.path.join(OVERLAYS_FOLDER, overlay)
+                    if not os.path.isdir(os.path.join(source_dir, overlay_path)):
+                        raise ValueError(f"matrix overlay '{overlay}' is not a folder in Source/{OVERLAYS_FOLDER}")
+                    layers.append(overlay_path)
+                _merge_matrix_tables(ini, _format_matrix_value(spec.get("ini", {}), fields))
+                _merge_matrix_tables(ui, _format_matrix_value(spec.get("ui", {}), fields))
+
+            name = name_template.format_map(fields)
+            if name in names or os.path.isdir(os.path.join(source_dir, name)):
+                raise ValueError(f"matrix variant name '{name}' is not unique")
+            names.add(name)
+            variants.append(MatrixVariant(name, layers, ini, ui, stager))
+    return variants
+
+class LayerStager:
+    """
+    Merges Source/base plus a sequence of layers (class folder, overlays) once per unique
+    sequence into a staging folder that every variant with the same layers copies from.
+    Each prefix is staged on top of the previous one, so variants of a class share the class
+    merge even when their overlays differ. Staging folders are published with an atomic rename,
+    so worker processes holding their own copy never see a half-written stage.
+    """
+
+    def __init__(self, root, source_dir, global_base_dir, ignore_patterns, copy_function=shutil.copyfile):
+        self.root = root
+        self.source_dir = source_dir
+        self.global_base_dir = global_base_dir
+        self.ignore_patterns = ignore_patterns
+        self.copy_function = copy_function
+        self.locks = {}
+        self.lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["locks"] = {}
+        state["lock"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def stage(self, layers):
+        """Returns the staging folder holding base merged with every layer in order."""
+        key = "\0".join(layers)
+        stage_dir = os.path.join(self.root, hashlib.sha1(key.encode("utf-8")).hexdigest()[:16])
+        with self.lock:
+            key_lock = self.locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            if os.path.isdir(stage_dir):
+                return stage_dir
+
+            import tempfile
+
+            os.makedirs(self.root, exist_ok=True)
+            tmp_dir = tempfile.mkdtemp(dir=self.root, suffix=".tmp")
+            if len(layers) > 1:
+                shutil.copytree(self.stage(layers[:-1]), tmp_dir, dirs_exist_ok=True, copy_function=shutil.copyfile)
+            else:
+                copy_base_content(self.global_base_dir, tmp_dir, self.ignore_patterns, shutil.copyfile)
+            merge_car_layer(os.path.join(self.source_dir, layers[-1]), tmp_dir, self.ignore_patterns,
+                            self.copy_function, " + ".join(layers))
+
+            try:
+                os.rename(tmp_dir, stage_dir)
+                logger.info(f"Staged layers: base + {' + '.join(layers)}")
+            except OSError:
+                # Another worker process published the same stage first.
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+            return stage_dir
+
+def apply_ini_overrides(car_build_dir, overrides, fs=DISK):
+    """Sets matrix variant INI values: overrides maps a car-relative file to {section: {key: value}}."""
+    for rel_path, sections in overrides.items():
+        ini_path = os.path.join(car_build_dir, rel_path)
+        if not fs.exists(ini_path):
+            logger.warning(f"Matrix INI override target '{rel_path}' not found in {car_build_dir}; creating it")
+            fs.makedirs(os.path.dirname(ini_path))
+        try:
+            config = case_config_parser()
+            read_config(config, ini_path, fs)
+            for section_name, options in sections.items():
+                if not config.has_section(section_name):
+                    config.add_section(section_name)
+                for option_name, value in options.items():
+                    if isinstance(value, bool):
+                        value = int(value)
+                    config.set(section_name, option_name, str(value))
+            write_config(config, ini_path, fs)
+            build_events.emit("ini_override", ini_path, fs.stat(ini_path).st_size)
+        except Exception as e:
+            logger.error(f"Error applying matrix overrides to {ini_path}: {e}")
+
+def index_car_config(index_path, version, car_name, car_build_dir, source_dir, variant=None):
+    """
+    Replaces the car's rows in the config index (see config_index.py) with the effective value
+    and source layer of every INI key it ships.
+    """
+    import config_index
+
+    layers = variant.layers if variant is not None else [car_name]
+    try:
+        rows = config_index.collect_rows(car_build_dir, source_dir, layers, variant.ini if variant is not None else None)
+        config_index.store_car(index_path, version, car_name, rows)
+        logger.info(f"Indexed {len(rows)} config value(s) for {car_name}")
+    except Exception as e:
+        logger.error(f"Error indexing config for {car_name}: {e}")
+
+def copy_base_content(global_base_dir, dst, ignore_patterns, copy_function, fs=DISK):
+    """Copies the contents of Source/base into dst on fs. Raises on failure."""
+    for entry in os.scandir(global_base_dir):
+        dst_item = os.path.join(dst, entry.name)
+        if should_ignore_file(entry.path, ignore_patterns):
+            build_events.emit("skip", dst_item)
+            continue
+
+        if entry.is_dir():
+            copy_tree(entry.path, dst_item, copy_function, fs)
+        else:
+            copy_function(entry.path, dst_item)
+
+def merge_car_layer(layer_dir, dst, ignore_patterns, copy_function, car_name, fs=DISK):
+    """
+    Merges a car folder (or a matrix overlay folder) into dst on fs: folders are merged with
+    merge_directories, top-level files are copied over. Errors are logged per entry.
+    """
+    for entry in os.scandir(layer_dir):
+        dst_item = os.path.join(dst, entry.name)
+        if should_ignore_file(entry.path, ignore_patterns):
+            build_events.emit("skip", dst_item)
+            continue
+
+        try:
+            if entry.is_dir():
+                merge_directories(entry.path, dst_item, ignore_patterns, copy_function, fs)
+            else:
+                copy_function(entry.path, dst_item)
+        except Exception as e:
+            logger.error(f"Error copying {entry.path} for {car_name}: {e}")
+
+@contextmanager
+def on_disk(fs, path):
+    """
+    Yields a disk folder holding the subtree path of fs, for stages that run other programs on
+    real files; whatever they leave there replaces the subtree afterwards. On disk, path itself.
+    The copy is named like path, since QuickBMS derives the data.acd key from the folder name.
+    """
+    if fs.is_disk:
+        yield path
+        return
+
+    import tempfile
+    from build_fs import export_tree, import_tree
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        disk_path = os.path.join(tmp_dir, os.path.basename(path))
+        export_tree(fs, path, disk_path)
+        yield disk_path
+        import_tree(fs, disk_path, path)
+
+def check_renamed_files(car_build_dir, car_name, fs):
+    """
+    Warns about the renamed and patched files a built car should have but lacks. Returns False
+    if its sound bank was not renamed, which would ship the car without working sounds.
+    """
+    # model.kn5, lods.ini, the sound bank and ui_car.json were handled by the substitution
+    new_kn5_name = f"{car_name}.kn5"
+    if not fs.exists(os.path.join(car_build_dir, new_kn5_name)):
+        logger.warning(f"'{new_kn5_name}' (from 'model.kn5') not found for {car_name}")
+    bank_renamed = check_sfx_bank(car_build_dir, car_name, fs)
+    lods_ini_path = os.path.join(car_build_dir, "data", "lods.ini")
+    if fs.exists(lods_ini_path):
+        check_lods_ini(lods_ini_path, new_kn5_name, fs)
+    else:
+        logger.warning(f"'lods.ini' not found in '{car_build_dir}' for {car_name}")
+    if not fs.exists(os.path.join(car_build_dir, "ui", "ui_car.json")):
+        logger.warning(f"'ui/ui_car.json' not found for {car_name}")
+    return bank_renamed
+
+def copy_staged_layers(variant, car_build_dir, copy_function, fs):
+    # Base, class folder and overlays were merged once for every variant sharing them
+    staged_dir = variant.stager.stage(variant.layers)
+    copy_tree(staged_dir, car_build_dir, copy_function, fs)
+
+def car_build_steps(car_name, source_dir, build_dir, global_base_dir, ignore_patterns, info_version, info_year, tree_shake=None, lua_minifier=None, png_optimizer=None, shared_layer=None, variant=None, config_index_path=None, digest_cache=None, inputs=None, substitution=None, fs=None):
+    """
+    A car's build as a BuildStep generator: every stage that touches files or runs a program is
+    yielded for the runner (run_build_steps, or run_build_steps_async for --backend asyncio), so
+    the code between yields only decides what comes next. Returns False if a stage failed.
+    """
+    item_path = os.path.join(source_dir, car_name)
+    car_build_dir = os.path.join(build_dir, car_name)
+    fs = fs or DISK
+    logger.info(f"Processing car: {car_name}")
+
+    # Create a new folder for the car in Build
+    yield BuildStep("disk", "Preparing build folder", fs.makedirs, (car_build_dir,))
+
+    # Every copy hashes the file in the same pass (or reuses a digest) for the car's manifest
+    # and, for text files, patches in the car's identity on the way (see TokenSubstitution)
+    if substitution is None:
+        substitution = TokenSubstitution(SUBSTITUTE_TOKENS, SUBSTITUTE_EXTENSIONS)
+    layers = ["base"] + (variant.layers if variant is not None else [car_name])
+    car_substitution = substitution.for_car(car_name, info_version, info_year, variant.ui if variant is not None else None,
+                                            find_sfx_bank(source_dir, layers))
+    manifest = CarManifest(car_name, car_build_dir, digest_cache if digest_cache is not None else DigestCache(),
+                           shared_layer.copy if shared_layer is not None else shutil.copyfile, inputs,
+                           car_substitution, fs)
+    copy_function = build_events.copier(manifest.copy, fs)
+    if variant is not None:
+        try:
+            yield BuildStep("disk", "Copying staged layers", copy_staged_layers, (variant, car_build_dir, copy_function, fs))
+        except Exception as e:
+            logger.error(f"Error copying staged layers for {car_name}: {e}")
+            return False
+
+        yield BuildStep("disk", "Applying variant parameters", apply_ini_overrides, (car_build_dir, variant.ini, fs))
+    else:
+        # Copy global base folder contents into the car build folder
+        try:
+            yield BuildStep("disk", "Copying base content", copy_base_content,
+                            (global_base_dir, car_build_dir, ignore_patterns, copy_function, fs))
         except Exception as e:
             logger.error(f"Error copying base folder contents for {car_name}: {e}")
             return False
 
         # Copy all other files and folders from the car's source folder
-        progress.update(car_name, "Merging car content")
-        for entry in os.scandir(item_path):
-            if should_ignore_file(entry.path, ignore_patterns):
-                logger.info(f"Skipping ignored file/folder '{entry.name}'")
-                continue
+        yield BuildStep("disk", "Merging car content", merge_car_layer,
+                        (item_path, car_build_dir, ignore_patterns, copy_function, car_name, fs))
+
+    # INI files merged with an .addon.ini were written directly; substitute their tokens now
+    rewritten = yield BuildStep("disk", None, manifest.substitute_unrecorded)
+    if rewritten:
+        logger.info(f"Substituted tokens in {rewritten} merged file(s) for {car_name}")
+
+    if not (yield BuildStep("disk", "Checking renamed files", check_renamed_files, (car_build_dir, car_name, fs))):
+        return False
+
+    # The remaining stages work on real files; off disk, the car is only copied out for them
+    # if one of them has something to do.
+    disk_stages = (tree_shake, config_index_path, lua_minifier, png_optimizer)
+    packing = all(os.path.exists(path) for path in quickbms_tools())
+    if fs.is_disk or packing or any(stage is not None for stage in disk_stages):
+        staging = on_disk(fs, car_build_dir)
+        disk_build_dir = yield BuildStep("disk", None, staging.__enter__)
+        try:
+            # Drop data files nothing references before they are packed
+            if tree_shake is not None:
+                yield BuildStep("cpu", "Tree shaking", tree_shake_car, (disk_build_dir, car_name, tree_shake))
+
+            # Record the effective INI values and where they came from before data/ is packed
+            if config_index_path is not None:
+                yield BuildStep("cpu", "Indexing config", index_car_config,
+                                (config_index_path, info_version, car_name, disk_build_dir, source_dir, variant))
+
+            if lua_minifier is not None:
+                yield BuildStep("cpu", "Minifying Lua", minify_lua_scripts, (disk_build_dir, car_name, lua_minifier))
+
+            if png_optimizer is not None:
+                yield BuildStep("cpu", "Optimizing PNGs", optimize_car_pngs, (disk_build_dir, car_name, png_optimizer))
+
+            # Pack the data folder into data.acd
+            yield from pack_data_steps(disk_build_dir, car_name)
+        except BaseException:
+            staging.__exit__(*sys.exc_info())
+            raise
+        yield BuildStep("disk", None, staging.__exit__, (None, None, None))
+    else:
+        logger.warning(f"QuickBMS not found at {quickbms_tools()[0]}. Skipping data packing for {car_name}")
+
+    reused, rehashed = yield BuildStep("cpu", "Writing manifest", manifest.finalize, (build_dir,))
+    logger.info(f"Wrote manifest for {car_name}: {reused} digest(s) from copying, {rehashed} file(s) hashed after later stages")
+    return True
+
+def build_one_car(car_name, source_dir, build_dir, global_base_dir, ignore_patterns, info_version, info_year, progress, *options):
+    """Builds one car in the calling thread. options are car_build_steps()'s optional arguments, in order."""
+    build_events.bind(car_name, os.path.join(build_dir, car_name))
+    try:
+        return run_build_steps(car_build_steps(car_name, source_dir, build_dir, global_base_dir, ignore_patterns,
+                                               info_version, info_year, *options), car_name, progress)
+    finally:
+        build_events.flush_car(car_name)
+        progress.complete(car_name)
 
-            dst_item = os.path.join(car_build_dir, entry.name)
+async def run_subprocess_async(command, cwd):
+    """Runs command in cwd on the event loop; returns (returncode, stdout, stderr). Killed if cancelled."""
+    import asyncio
+    import locale
+
+    process = await asyncio.create_subprocess_exec(
+        *command, cwd=cwd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+    try:
+        stdout, stderr = await process.communicate()
+    except asyncio.CancelledError:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+        raise
+    encoding = locale.getpreferredencoding(False)
+    return process.returncode, stdout.decode(encoding, "replace"), stderr.decode(encoding, "replace")
+
+def _run_bound_step(car_name, car_build_dir, step):
+    # Executor side of run_build_steps_async: events go to the car whose step this thread runs.
+    build_events.bind(car_name, car_build_dir)
+    with memory_budget.reserve(step.memory):
+        return step.function(*step.args)
+
+async def run_build_steps_async(steps, car_name, car_build_dir, progress, limits, executor):
+    """
+    Runs a BuildStep generator on the event loop: "disk" and "cpu" steps on executor threads and
+    "subprocess" steps via asyncio subprocesses, each while holding limits[step.resource] (an
+    asyncio.Semaphore). If cancelled, the running program is killed and the generator closed so
+    its cleanup runs; a step already on a thread finishes first. Returns the generator's value.
+    """
+    import asyncio
+
+    loop = asyncio.get_running_loop()
+    send, value = steps.send, None
+    try:
+        while True:
             try:
-                if entry.is_dir():
-                    merge_directories(entry.path, dst_item, ignore_patterns)
-                    logger.info(f"Merged folder '{entry.name}' for {car_name}")
-                else:
-                    shutil.copyfile(entry.path, dst_item)
-                    logger.info(f"Copied file '{entry.name}' for {car_name}")
+                step = send(value)
+            except StopIteration as stop:
+                return stop.value
+            try:
+                if step.name is not None:
+                    progress.update(car_name, step.name)
+                async with limits[step.resource]:
+                    if step.resource != "subprocess":
+                        value = await loop.run_in_executor(executor, _run_bound_step, car_name, car_build_dir, step)
+                    else:
+                        # Reserve without blocking the loop; a reservation granted after a
+                        # cancellation is handed straight back.
+                        reserving = loop.run_in_executor(executor, memory_budget.acquire, step.memory)
+                        try:
+                            reserved = await asyncio.shield(reserving)
+                        except asyncio.CancelledError:
+                            reserving.add_done_callback(lambda future: memory_budget.release(future.result()))
+                            raise
+                        try:
+                            value = await run_subprocess_async(*step.args)
+                        finally:
+                            memory_budget.release(reserved)
+                send = steps.send
             except Exception as e:
-                logger.error(f"Error copying {entry.path} for {car_name}: {e}")
-
-        # Rename model.kn5 to [CAR_FOLDER_NAME].kn5 in the car build folder
-        progress.update(car_name, "Renaming model")
-        model_kn5_path = os.path.join(car_build_dir, "model.kn5")
-        new_kn5_name = f"{car_name}.kn5"
-        new_kn5_path = os.path.join(car_build_dir, new_kn5_name)
-        if os.path.exists(model_kn5_path):
+                send, value = steps.throw, e
+    finally:
+        steps.close()
+
+async def build_one_car_async(car_name, source_dir, build_dir, global_base_dir, ignore_patterns, info_version, info_year, progress, *options, limits, executor):
+    """build_one_car as a coroutine for --backend asyncio (see run_build_steps_async)."""
+    car_build_dir = os.path.join(build_dir, car_name)
+    try:
+        return await run_build_steps_async(
+            car_build_steps(car_name, source_dir, build_dir, global_base_dir, ignore_patterns, info_version, info_year, *options),
+            car_name, car_build_dir, progress, limits, executor)
+    finally:
+        build_events.flush_car(car_name)
+        progress.complete(car_name)
+
+async def build_cars_async(builds, jobs):
+    """
+    Builds every car at once as a coroutine; what actually runs concurrently is bounded per
+    resource by jobs, {"disk": N, "cpu": N, "subprocess": N}. builds is a list of
+    build_one_car() argument tuples. Returns {car_name: ok}, or raises CancelledError on Ctrl-C
+    once every car has stopped.
+    """
+    import asyncio
+
+    limits = {resource: asyncio.Semaphore(count) for resource, count in jobs.items()}
+    # One thread per disk and cpu slot, plus room for subprocess steps waiting on memory_budget.
+    executor = ThreadPoolExecutor(max_workers=sum(jobs.values()))
+    tasks = {}
+    try:
+        tasks = {
+            args[0]: asyncio.ensure_future(build_one_car_async(*args, limits=limits, executor=executor))
+            for args in builds
+        }
+        await asyncio.wait(tasks.values())
+        results = {}
+        for car_name, task in tasks.items():
             try:
-                os.rename(model_kn5_path, new_kn5_path)
-                logger.info(f"Renamed 'model.kn5' to '{new_kn5_name}'")
+                results[car_name] = bool(task.result())
             except Exception as e:
-                logger.error(f"Error renaming model.kn5 for {car_name}: {e}")
-        else:
-            logger.warning(f"'model.kn5' not found for {car_name}")
+                logger.error(f"Unhandled error while processing {car_name}: {e}")
+                results[car_name] = False
+        return results
+    finally:
+        for task in tasks.values():
+            task.cancel()
+        if tasks:
+            await asyncio.wait(tasks.values())
+        executor.shutdown(wait=True)
 
-        # After copying all files but before updating lods.ini, handle sfx files
-        progress.update(car_name, "Fixing SFX references")
-        handle_sfx_files(car_build_dir, car_name)
+def remove_pack_leftovers(build_dir):
+    """Deletes QuickBMS input files an interrupted build left in Build/<car>. Returns how many."""
+    removed = 0
+    for entry in os.scandir(build_dir) if os.path.isdir(build_dir) else ():
+        leftover = os.path.join(entry.path, PACK_INPUT_NAME)
+        if entry.is_dir() and os.path.exists(leftover):
+            os.remove(leftover)
+            removed += 1
+    return removed
 
-        # Update lods.ini in the built car folder.
-        progress.update(car_name, "Updating lods.ini")
-        lods_ini_path = os.path.join(car_build_dir, "data", "lods.ini")
-        if os.path.exists(lods_ini_path):
-            update_lods_ini(lods_ini_path, new_kn5_name)
-        else:
-            logger.warning(f"'lods.ini' not found in '{car_build_dir}' for {car_name}")
+def output_options(args, build_config):
+    """The command line options that change what a car's build produces, as recorded in its manifest."""
+    return {
+        "tree_shake": build_config.get("tree_shake", {}) if args.tree_shake else None,
+        "minify_lua": args.minify_lua,
+        "optimize_png": args.optimize_png,
+    }
 
-        # Update ui/ui_car.json in the built car folder.
-        progress.update(car_name, "Updating ui_car.json")
-        ui_json_path = os.path.join(car_build_dir, "ui", "ui_car.json")
-        if os.path.exists(ui_json_path):
-            update_ui_json(ui_json_path, info_version, info_year)
-        else:
-            logger.warning(f"'ui/ui_car.json' not found for {car_name}")
+def token_substitution(build_config):
+    """TokenSubstitution from the built-in tokens plus info.toml [build.substitute]."""
+    substitute_config = build_config.get("substitute", {})
+    return TokenSubstitution(
+        {**SUBSTITUTE_TOKENS, **substitute_config.get("tokens", {})},
+        substitute_config.get("extensions", SUBSTITUTE_EXTENSIONS),
+    )
 
-        # Pack the data folder into data.acd
-        progress.update(car_name, "Packing data.acd")
-        pack_data_folder(car_build_dir, car_name)
-        return True
-    finally:
-        progress.complete(car_name)
+def serve_address(args, script_dir):
+    """Unix socket path for serve/request, or (host, port) where Unix sockets are unavailable (Windows)."""
+    import socket
+
+    if not hasattr(socket, "AF_UNIX"):
+        return SERVE_TCP_ADDRESS
+    return args.socket or os.path.join(script_dir, ".builder_cache", SERVE_SOCKET_NAME)
+
+def serve_token_path(script_dir):
+    return os.path.join(script_dir, ".builder_cache", SERVE_TOKEN_NAME)
+
+def write_serve_token(path):
+    """Writes a new random token to path, readable by the current user only, and returns it."""
+    import secrets
+
+    token = secrets.token_hex(32)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if os.path.exists(path):
+        os.remove(path)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "w", encoding="ascii") as f:
+        f.write(token)
+    return token
+
+def read_serve_token(script_dir):
+    with open(serve_token_path(script_dir), "r", encoding="ascii") as f:
+        return f.read().strip()
+
+def _connect(address):
+    import socket
+
+    if isinstance(address, tuple):
+        return socket.create_connection(address)
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.connect(address)
+    return client
+
+class StreamProgress:
+    """Progress of a build requested over the serve socket: every stage is sent to the client as an event."""
+
+    def __init__(self, send):
+        self.send = send
+
+    def update(self, car_name, step):
+        self.send({"event": "stage", "car": car_name, "stage": step})
+
+    def complete(self, car_name):
+        self.send({"event": "complete", "car": car_name})
+
+class _EventLogHandler(logging.Handler):
+    """Forwards warnings and errors logged during a request to its client."""
+
+    def __init__(self, send):
+        super().__init__(logging.WARNING)
+        self.send = send
+
+    def emit(self, record):
+        self.send({"event": "log", "level": record.levelname, "message": record.getMessage()})
+
+class BuildServer:
+    """
+    State kept resident by "builder.py serve" between requests: info.toml and the matrix (re-read
+    when their stat changes), the stat index and digests, LUT tables already validated, the Lua
+    minifier's memory cache and the worker threads. Source is re-scanned with os.scandir + stat on
+    every request, so files added, changed or removed underneath the daemon are picked up and
+    only the changed ones are hashed.
+
+    Requests are JSON objects, one per line; each answer is a stream of JSON event lines ending
+    with {"event": "done", ...}. Every request also carries "token", the content of
+    .builder_cache/serve.token; a connection sending a wrong or missing token is answered with an
+    error and closed:
+
+        {"command": "status"}
+        {"command": "rebuild"}                      every out-of-date car
+        {"command": "rebuild", "cars": ["ohyeah2389_modkart_dd2"]}
+        {"command": "shutdown"}
+
+    Cars are rebuilt in place: only Build/<car> and its manifest are replaced. Output options
+    (--tree-shake, --minify-lua, ...) are the ones the daemon was started with.
+    """
+
+    def __init__(self, script_dir, source_dir, build_dir, args):
+        self.script_dir = script_dir
+        self.source_dir = source_dir
+        self.build_dir = build_dir
+        self.args = args
+        self.lock = threading.Lock()
+        self.stat_index_path = os.path.join(script_dir, ".builder_cache", STAT_INDEX_FILE)
+        self.stat_index_roots = [source_dir + os.sep] + [os.path.join(script_dir, name) for name in BUILD_INPUT_SCRIPTS]
+        self.digest_cache = DigestCache()
+        self.digest_cache.load(self.stat_index_path)
+        self.executors = BuildExecutors("threads", args.workers)
+        self.stage_root = os.path.join(script_dir, ".builder_cache", "stages", str(os.getpid()))
+        self.config_signature = None
+        self.validated_luts = {}
+        self.lua_minifier = None
+        if args.minify_lua:
+            from lua_minify import MinifyCache
+            self.lua_minifier = MinifyCache(os.path.join(script_dir, ".builder_cache", "lua"))
+        self.png_optimizer = None
+        if args.optimize_png:
+            from png_optimize import PngOptimizer
+            self.png_optimizer = PngOptimizer(os.path.join(script_dir, ".builder_cache", "png"))
+
+    def close(self):
+        self.executors.shutdown()
+        shutil.rmtree(self.stage_root, ignore_errors=True)
+        if self.png_optimizer is not None:
+            self.png_optimizer.close()
+        self.digest_cache.save(self.stat_index_path, self.stat_index_roots)
+
+    def refresh(self):
+        """Re-reads info.toml and the matrix if either changed since the last request."""
+        config_paths = [os.path.join(self.source_dir, "info.toml"), os.path.join(self.source_dir, MATRIX_FILE)]
+        signature = []
+        for path in config_paths:
+            try:
+                signature.append(DigestCache.signature(os.stat(path)))
+            except OSError:
+                signature.append(None)
+        if signature == self.config_signature:
+            return
+
+        with open(config_paths[0], "rb") as f:
+            data = tomllib.load(f)
+        info = data.get("info", {})
+        self.build_config = data.get("build", {})
+        self.info_version = info.get("version")
+        self.info_year = info.get("year")
+        if not self.info_version or not self.info_year:
+            raise ValueError("could not parse version and year from info.toml")
+        self.ignore_patterns = self.build_config.get("ignore", ["~*"])
+        self.substitution = token_substitution(self.build_config)
+        self.options = output_options(self.args, self.build_config)
+        self.matrix = load_matrix(self.source_dir, data)
+        self.config_signature = signature
+        logger.info("serve: (re)loaded info.toml")
+
+    def scan(self):
+        """Current (car_name, variant) builds and their inputs."""
+        global_base_dir = os.path.join(self.source_dir, "base")
+        shutil.rmtree(self.stage_root, ignore_errors=True)
+        variants = []
+        if self.matrix:
+            stager = LayerStager(self.stage_root, self.source_dir, global_base_dir, self.ignore_patterns)
+            variants = expand_matrix(self.matrix, self.source_dir, stager)
+        builds = [
+            (entry.name, None) for entry in sorted(os.scandir(self.source_dir), key=lambda entry: entry.name)
+            if entry.is_dir() and entry.name.lower() not in ("base", OVERLAYS_FOLDER)
+        ]
+        builds += [(variant.name, variant) for variant in variants]
+        inputs = collect_build_inputs(self.script_dir, self.source_dir, builds, self.ignore_patterns,
+                                      self.digest_cache, self.options)
+        return builds, inputs
+
+    def status(self, builds, inputs):
+        stale = {}
+        for car_name, variant in builds:
+            reasons = car_build_status(self.build_dir, car_name, inputs[car_name])
+            if reasons:
+                stale[car_name] = reasons
+        return stale
+
+    def validate_luts(self, folders):
+        """Validates the LUT files of folders that changed since they last passed. Returns True if all pass."""
+        try:
+            import lut
+        except ImportError:
+            return True
+        paths = []
+        for folder in folders:
+            for path in lut.find_lut_files(os.path.join(self.source_dir, folder)):
+                if not should_ignore_file(os.path.relpath(path, self.source_dir), self.ignore_patterns):
+                    paths.append(path)
+        digests = self.digest_cache.digest_many(paths)
+        changed = [path for path in paths if self.validated_luts.get(path) != digests.get(path)]
+        errors = lut.validate_lut_files(changed, cache_dir=os.path.join(self.script_dir, ".builder_cache", "lut"),
+                                        workers=self.args.workers)
+        for error in errors:
+            logger.error(f"Invalid LUT {error}")
+        failed = {error.path for error in errors}
+        for path in changed:
+            if path not in failed:
+                self.validated_luts[path] = digests.get(path)
+        return not errors
+
+    def handle(self, request, send):
+        """Runs one request, sending its events. Returns the final "done" event."""
+        start = time.perf_counter()
+        command = request.get("command")
+        with self.lock:
+            log_handler = _EventLogHandler(send)
+            logger.addHandler(log_handler)
+            try:
+                self.refresh()
+                builds, inputs = self.scan()
+                stale = self.status(builds, inputs)
+                if command == "status":
+                    send({"event": "status", "cars": {car_name: stale.get(car_name, []) for car_name in inputs}})
+                    return {"event": "done", "ok": True, "seconds": time.perf_counter() - start}
+                if command != "rebuild":
+                    raise ValueError(f"unknown command {command!r}")
+
+                requested = request.get("cars") or sorted(stale)
+                unknown = [car_name for car_name in requested if car_name not in inputs]
+                if unknown:
+                    raise ValueError(f"unknown car(s): {', '.join(unknown)}")
+                targets = [(car_name, variant) for car_name, variant in builds if car_name in requested]
+                folders = sorted({"base"} | {layer for car_name, variant in targets
+                                             for layer in (variant.layers if variant is not None else [car_name])})
+                if not self.args.skip_lut_validation and not self.validate_luts(folders):
+                    return {"event": "done", "ok": False, "seconds": time.perf_counter() - start}
+
+                results = self.rebuild(targets, inputs, StreamProgress(send))
+                return {"event": "done", "ok": all(results.values()), "rebuilt": results,
+                        "seconds": time.perf_counter() - start}
+            except Exception as e:
+                logger.error(f"serve: {command} failed: {e}")
+                return {"event": "done", "ok": False, "error": str(e), "seconds": time.perf_counter() - start}
+            finally:
+                logger.removeHandler(log_handler)
+                self.digest_cache.save(self.stat_index_path, self.stat_index_roots)
+
+    def rebuild(self, targets, inputs, progress):
+        """Rebuilds Build/<car> for each (car_name, variant) in targets. Returns {car_name: ok}."""
+        os.makedirs(self.build_dir, exist_ok=True)
+        for car_name, variant in targets:
+            shutil.rmtree(os.path.join(self.build_dir, car_name), ignore_errors=True)
+            if os.path.exists(car_manifest_path(self.build_dir, car_name)):
+                os.remove(car_manifest_path(self.build_dir, car_name))
+
+        futures = {
+            self.executors.cars.submit(
+                build_one_car,
+                car_name,
+                self.source_dir,
+                self.build_dir,
+                os.path.join(self.source_dir, "base"),
+                self.ignore_patterns,
+                self.info_version,
+                self.info_year,
+                progress,
+                self.options["tree_shake"],
+                self.lua_minifier,
+                self.png_optimizer,
+                None,
+                variant,
+                os.path.join(self.script_dir, "config_index.sqlite") if self.args.index_config else None,
+                self.digest_cache,
+                inputs[car_name],
+                self.substitution,
+            ): car_name
+            for car_name, variant in targets
+        }
+        results = {}
+        for future in as_completed(futures):
+            try:
+                results[futures[future]] = bool(future.result())
+            except Exception as e:
+                logger.error(f"Unhandled error while processing {futures[future]}: {e}")
+                results[futures[future]] = False
+        return results
+
+def serve(script_dir, source_dir, build_dir, args):
+    """Runs the build daemon (see BuildServer) until a "shutdown" request or Ctrl-C."""
+    import hmac
+    import socketserver
+
+    server_state = BuildServer(script_dir, source_dir, build_dir, args)
+    address = serve_address(args, script_dir)
+    token_path = serve_token_path(script_dir)
+    token = write_serve_token(token_path)
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            send_lock = threading.Lock()
+
+            def send(event):
+                line = (json.dumps(event) + "\n").encode("utf-8")
+                with send_lock:
+                    try:
+                        self.wfile.write(line)
+                        self.wfile.flush()
+                    except OSError:
+                        pass
+
+            for line in self.rfile:
+                if not line.strip():
+                    continue
+                try:
+                    request = json.loads(line)
+                except ValueError as e:
+                    send({"event": "done", "ok": False, "error": f"invalid JSON: {e}"})
+                    continue
+                if not isinstance(request, dict) or not hmac.compare_digest(str(request.get("token", "")), token):
+                    logger.warning("serve: rejected a request without a valid token")
+                    send({"event": "done", "ok": False, "error": f"missing or invalid token (see {token_path})"})
+                    return
+                if request.get("command") == "shutdown":
+                    send({"event": "done", "ok": True})
+                    threading.Thread(target=self.server.shutdown).start()
+                    return
+                send(server_state.handle(request, send))
+
+    if isinstance(address, tuple):
+        server_class = type("BuildTCPServer", (socketserver.ThreadingMixIn, socketserver.TCPServer), {})
+    else:
+        server_class = socketserver.ThreadingUnixStreamServer
+        if os.path.exists(address):
+            os.remove(address)
+        os.makedirs(os.path.dirname(address), exist_ok=True)
+    server_class.daemon_threads = True
+    with server_class(address, Handler) as server:
+        message = f"Build server listening on {address}"
+        logger.info(message)
+        print(message)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server_state.close()
+            if not isinstance(address, tuple) and os.path.exists(address):
+                os.remove(address)
+            if os.path.exists(token_path):
+                os.remove(token_path)
+    logger.info("Build server stopped.")
+
+def send_request(address, request, on_event=print, token=None):
+    """
+    Sends one request to a running build server, with token (see write_serve_token), passing
+    each event to on_event. Returns the "done" event.
+    """
+    if token is not None:
+        request = {**request, "token": token}
+    with _connect(address) as client:
+        client.sendall((json.dumps(request) + "\n").encode("utf-8"))
+        with client.makefile("rb") as events:
+            for line in events:
+                event = json.loads(line)
+                on_event(event)
+                if event.get("event") == "done":
+                    return event
+    return {"event": "done", "ok": False, "error": "connection closed"}
+
+def package_release(args, script_dir, build_dir, project_name, version, executors, profiler, fs=DISK):
+    """Runs --pack-release or --pack-patch on the Build folder on fs. Returns True on success."""
+    if profiler is not None:
+        profiler.stage("release", "Packing release zip")
+    if args.pack_patch:
+        packed = pack_patch_zip(script_dir, build_dir, project_name, version, args.pack_patch, executors, fs)
+    else:
+        packed = pack_release_zip(script_dir, build_dir, project_name, version, executors, fs)
+    if profiler is not None:
+        profiler.finish()
+    if packed:
+        logger.info("Release packaging complete.")
+    else:
+        logger.error("Release packaging failed.")
+    return packed
 
 def main():
     # Parse command line arguments
     parser = argparse.ArgumentParser(description='Build car folders and optionally create release packages')
+    parser.add_argument('command', nargs='?', choices=['build', 'serve', 'request'], default='build', help='build (default); serve: run the build daemon; request: send "status", "rebuild [CAR...]" or "shutdown" to it')
+    parser.add_argument('targets', nargs='*', help='For request: the request name and, for rebuild, car names')
+    parser.add_argument('--socket', type=str, metavar='PATH', help=f'Unix socket for serve/request (default: .builder_cache/{SERVE_SOCKET_NAME})')
     parser.add_argument('--pack-release', action='store_true', help='Create a release zip file from the Build folder contents')
+    parser.add_argument('--pack-patch', type=str, metavar='FROM_MANIFEST', help='Create a patch zip with only the files changed since the release described by FROM_MANIFEST')
     parser.add_argument('--only', type=str, metavar='CAR_NAME', help='Build only the specified car folder instead of all cars')
+    parser.add_argument('--max-memory', type=parse_byte_size, metavar='SIZE', help='Cap the file data all workers buffer at once, e.g. 512M or 2G (default: no limit)')
     parser.add_argument('--workers', type=int, default=4, metavar='N', help='Number of cars to build in parallel (default: 4)')
+    parser.add_argument('--tree-shake', action='store_true', help='Only ship data/ and extension/ files reachable from the files the game loads')
+    parser.add_argument('--minify-lua', action='store_true', help='Strip comments and whitespace from the Lua scripts in data/ and extension/')
+    parser.add_argument('--optimize-png', action='store_true', help='Losslessly recompress every PNG in the built cars')
+    parser.add_argument('--suggest-base', action='store_true', help='Report files duplicated across car folders and which could move into Source/base, then exit')
+    parser.add_argument('--share-duplicates', action='store_true', help='Read files duplicated across car folders once and reuse them for every car')
+    parser.add_argument('--index-config', action='store_true', help='Record every effective INI value and its source layer in config_index.sqlite')
+    parser.add_argument('--skip-lut-validation', action='store_true', help='Do not check .lut/.rto tables before building')
+    parser.add_argument('--log-level', choices=['DEBUG', 'INFO'], default='INFO', help='build.log level; DEBUG logs every copied file (default: INFO)')
+    parser.add_argument('--log-jsonl', type=str, metavar='PATH', help='Write structured build events to PATH as JSON lines')
+    parser.add_argument('--backend', choices=BACKENDS, default='threads', help='threads: everything on threads; hybrid: cars on threads, zip deflate and hashing on processes; processes: cars on processes too; asyncio: every car at once, bounded per resource by --disk-jobs, --cpu-jobs and --subprocess-jobs (default: threads)')
+    parser.add_argument('--disk-jobs', type=int, default=ASYNC_DISK_JOBS, metavar='N', help=f'--backend asyncio: copy/merge steps running at once (default: {ASYNC_DISK_JOBS})')
+    parser.add_argument('--cpu-jobs', type=int, default=os.cpu_count() or 1, metavar='N', help='--backend asyncio: tree shake, indexing, minify, PNG and manifest steps running at once (default: number of CPUs)')
+    parser.add_argument('--subprocess-jobs', type=int, default=ASYNC_SUBPROCESS_JOBS, metavar='N', help=f'--backend asyncio: QuickBMS processes running at once (default: {ASYNC_SUBPROCESS_JOBS})')
+    parser.add_argument('--in-memory', action='store_true', help='Assemble the cars in memory instead of in Build (see build_fs.py); with --pack-release or --pack-patch the release is packed from memory')
+    parser.add_argument('--rev', type=str, metavar='COMMIT', help='Build Source as of a git commit, branch or tag, read from the object store without a checkout')
+    parser.add_argument('--status', action='store_true', help='Report which cars are out of date with Source and exit without building')
+    parser.add_argument('--force', action='store_true', help='Rebuild even if every car is up to date')
+    parser.add_argument('--profile', type=str, metavar='DIR', help='Write per-car, per-stage cProfile and tracemalloc results to DIR')
     args = parser.parse_args()
 
-    if args.workers < 1:
-        sys.stderr.write("--workers must be at least 1.\n")
+    if min(args.workers, args.disk_jobs, args.cpu_jobs, args.subprocess_jobs) < 1:
+        sys.stderr.write("--workers, --disk-jobs, --cpu-jobs and --subprocess-jobs must be at least 1.\n")
         sys.exit(1)
+    if args.in_memory and args.backend == "processes":
+        sys.stderr.write("--in-memory builds every car in this process; use --backend threads, hybrid or asyncio.\n")
+        sys.exit(1)
+    memory_budget.limit = args.max_memory
     
     # Get the directory in which the script is located
     script_dir = os.path.dirname(os.path.abspath(__file__))
     source_dir = os.path.join(script_dir, "Source")
     build_dir = os.path.join(script_dir, "Build")
-    log_path, _ = setup_logging(script_dir)
+    build_start = time.perf_counter()
+
+    # A client of the build daemon must not touch build.log, which the daemon is writing
+    if args.command == "request":
+        if not args.targets or args.targets[0] not in ("status", "rebuild", "shutdown"):
+            sys.stderr.write("request needs one of: status, rebuild [CAR...], shutdown\n")
+            sys.exit(2)
+        request = {"command": args.targets[0]}
+        if args.targets[1:]:
+            request["cars"] = args.targets[1:]
+        try:
+            token = read_serve_token(script_dir)
+        except OSError as e:
+            sys.stderr.write(f"Cannot read the build server token (is it running?): {e}\n")
+            sys.exit(1)
+        try:
+            done = send_request(serve_address(args, script_dir), request, lambda event: print(json.dumps(event), flush=True),
+                                token)
+        except OSError as e:
+            sys.stderr.write(f"Cannot reach the build server: {e}\n")
+            sys.exit(1)
+        sys.exit(0 if done.get("ok") else 1)
+    log_path, _ = setup_logging(script_dir, getattr(logging, args.log_level), args.log_jsonl)
     logger.info(f"Build log initialized at {log_path}")
+
+    # With --rev, Source (info.toml, base and every car layer) comes from that revision's git objects
+    rev_digests = {}
+    if args.rev:
+        from git_source import GitSourceError, materialize_source, repo_root
+
+        try:
+            repo_dir = repo_root(script_dir)
+            source_folder = os.path.relpath(source_dir, repo_dir).replace('\\', '/')
+            commit, source_dir, rev_digests = materialize_source(
+                repo_dir, args.rev, source_folder, os.path.join(script_dir, ".builder_cache", "git"))
+        except (GitSourceError, OSError) as e:
+            logger.error(f"Cannot read {args.rev} from git: {e}")
+            sys.exit(1)
+        logger.info(f"Building {source_folder} from {args.rev} ({commit}), {len(rev_digests)} file(s) at {source_dir}")
+    profiler = BuildProfiler(os.path.abspath(args.profile)) if args.profile else None
+    if profiler is not None and args.backend == "processes":
+        logger.warning("Profiling: with --backend processes, car stages run in worker processes and are not profiled.")
+    if profiler is not None and args.backend == "asyncio":
+        logger.warning("Profiling: with --backend asyncio, cars' stages interleave on shared threads and are not profiled.")
+    elif profiler is not None and args.workers > 1 and args.backend != "processes":
+        logger.warning("Profiling: memory is only measured for stages that run alone; with --workers > 1 most "
+                       "car stages overlap and are skipped. Use --workers 1 to measure every stage.")
+    if args.command == "serve":
+        if args.rev or args.backend != "threads" or args.in_memory:
+            logger.error("serve builds the working tree into Build on threads; --rev, --backend and --in-memory are not supported")
+            sys.exit(1)
+        serve(script_dir, source_dir, build_dir, args)
+        return
+
+    executors = BuildExecutors(args.backend, args.workers)
+    atexit.register(executors.shutdown)
     
     # Parse info.toml from the Source folder
     info_toml_path = os.path.join(source_dir, "info.toml")
@@ -659,12 +3239,12 @@ def main():
         logger.error("Could not parse version and year from info.toml")
         sys.exit(1)
     
-    # If --pack-release is specified, create release zip and exit
-    if args.pack_release:
-        if pack_release_zip(script_dir, build_dir, project_name, info_version):
-            logger.info("Release packaging complete.")
-        else:
-            logger.error("Release packaging failed.")
+    # If --pack-release is specified, create release zip and exit (after building, with --in-memory)
+    if (args.pack_release or args.pack_patch) and not args.in_memory:
+        packed = package_release(args, script_dir, build_dir, project_name, info_version, executors, profiler)
+        if profiler is not None:
+            profiler.report()
+        if not packed:
             sys.exit(1)
         return
     
@@ -673,70 +3253,203 @@ def main():
         logger.error(f"Source directory not found: {source_dir}")
         sys.exit(1)
     
-    # If --only is specified, validate that the car exists
-    if args.only:
-        only_car_path = os.path.join(source_dir, args.only)
-        if not os.path.exists(only_car_path) or not os.path.isdir(only_car_path):
-            logger.error(f"Car folder '{args.only}' not found in Source directory")
-            sys.exit(1)
-        if args.only.lower() == "base":
-            logger.error("Cannot build the 'base' folder as it's not a car")
-            sys.exit(1)
-        logger.info(f"Building only car: {args.only}")
-    
     # Get the global base folder from Source/base
     global_base_dir = os.path.join(source_dir, "base")
     if not os.path.exists(global_base_dir):
         logger.error(f"Global base folder not found: {global_base_dir}")
         sys.exit(1)
-    
-    # Handle an existing Build directory (delete with prompt if non-empty)
-    if os.path.exists(build_dir):
-        if not confirm_deletion(build_dir):
-            logger.warning("Build process cancelled.")
-            sys.exit(0)
-        try:
-            shutil.rmtree(build_dir)
-            logger.info(f"Deleted existing '{build_dir}' folder.")
-        except Exception as e:
-            logger.error(f"Error deleting {build_dir}: {e}")
+
+    # Expand the kart-class matrix, if there is one, into generated variants
+    stage_root = os.path.join(script_dir, ".builder_cache", "stages", str(os.getpid()))
+    stager = None
+    variants = []
+    try:
+        matrix = load_matrix(source_dir, data)
+        if matrix:
+            stager = LayerStager(stage_root, source_dir, global_base_dir, ignore_patterns)
+            variants = expand_matrix(matrix, source_dir, stager)
+            logger.info(f"Kart-class matrix: {len(variants)} generated variant(s).")
+    except Exception as e:
+        logger.error(f"Invalid kart-class matrix: {e}")
+        sys.exit(1)
+    variant_names = {variant.name for variant in variants}
+
+    # If --only is specified, validate that the car exists
+    if args.only:
+        only_car_path = os.path.join(source_dir, args.only)
+        if args.only.lower() in ("base", OVERLAYS_FOLDER):
+            logger.error(f"Cannot build the '{args.only}' folder as it's not a car")
             sys.exit(1)
-    
-    # Create a fresh Build directory
-    os.makedirs(build_dir)
-    logger.info(f"Created Build folder at '{build_dir}'")
-    
+        if args.only not in variant_names and not os.path.isdir(only_car_path):
+            logger.error(f"Car folder '{args.only}' not found in Source directory or the kart-class matrix")
+            sys.exit(1)
+        logger.info(f"Building only car: {args.only}")
+        variants = [variant for variant in variants if variant.name == args.only]
+
     cars_to_build = []
     for entry in os.scandir(source_dir):
-        if not entry.is_dir() or entry.name.lower() == "base":
+        if not entry.is_dir() or entry.name.lower() in ("base", OVERLAYS_FOLDER):
             continue
         if args.only and entry.name != args.only:
             continue
         cars_to_build.append(entry.name)
 
-    total_cars = len(cars_to_build)
+    stat_index_path = os.path.join(script_dir, ".builder_cache", STAT_INDEX_FILE)
+    # With --rev, keep the working tree's entries too: the next plain build or --status uses them.
+    source_roots = {os.path.join(script_dir, "Source") + os.sep, source_dir + os.sep}
+    stat_index_roots = sorted(source_roots) + [os.path.join(script_dir, name) for name in BUILD_INPUT_SCRIPTS]
+    digest_cache = DigestCache()
+    digest_cache.load(stat_index_path)
+    for path, digest in rev_digests.items():
+        digest_cache.seed(path, digest)
+
+    if args.suggest_base:
+        groups = find_duplicate_car_files(source_dir, cars_to_build, ignore_patterns, executors.map_cpu, digest_cache)
+        digest_cache.save(stat_index_path, stat_index_roots)
+        report_duplicate_car_files(groups, cars_to_build, global_base_dir)
+        return
+
+    # Compare what each car would be built from with what it was built from (stat index fast path)
+    builds = [(car_name, None) for car_name in cars_to_build] + [(variant.name, variant) for variant in variants]
+    build_options = output_options(args, build_config)
+    build_inputs = collect_build_inputs(script_dir, source_dir, builds, ignore_patterns, digest_cache, build_options, executors.map_cpu)
+    digest_cache.save(stat_index_path, stat_index_roots)
+    stale = {}
+    if os.path.isdir(build_dir):
+        for car_name, variant in builds:
+            reasons = car_build_status(build_dir, car_name, build_inputs[car_name])
+            if reasons:
+                stale[car_name] = reasons
+        if not args.only:
+            for entry in os.scandir(build_dir):
+                if entry.is_dir() and entry.name not in build_inputs:
+                    stale[entry.name] = ["no longer in Source"]
+    else:
+        stale = {car_name: ["not built"] for car_name in build_inputs}
+
+    if args.status:
+        car_names = sorted(set(build_inputs) | set(stale))
+        for car_name in car_names:
+            status = f"out of date ({'; '.join(stale[car_name])})" if car_name in stale else "up to date"
+            print(f"{car_name}: {status}")
+        summary = (f"{len(stale)} of {len(car_names)} car(s) out of date; {digest_cache.hashed} changed file(s) "
+                   f"hashed, checked in {time.perf_counter() - build_start:.3f} s")
+        logger.info(summary)
+        print(summary)
+        sys.exit(1 if stale else 0)
+
+    if builds and not stale and not args.force and not args.in_memory:
+        summary = f"Build is up to date ({len(builds)} car(s), checked in {time.perf_counter() - build_start:.3f} s); pass --force to rebuild."
+        logger.info(summary)
+        print(summary)
+        return
+
+    lut_folders = sorted(set(cars_to_build) | {layer for variant in variants for layer in variant.layers})
+    if lut_folders and not args.skip_lut_validation:
+        cache_dir = os.path.join(script_dir, ".builder_cache", "lut")
+        if not validate_source_luts(source_dir, lut_folders, ignore_patterns, cache_dir, args.workers):
+            logger.error("LUT validation failed; fix the tables listed above or pass --skip-lut-validation.")
+            sys.exit(1)
+
+    if args.in_memory:
+        # Build is left alone; the cars are assembled under the same paths in RAM
+        from build_fs import MemoryFileSystem
+
+        output_fs = MemoryFileSystem()
+        output_fs.makedirs(build_dir)
+    else:
+        output_fs = DISK
+        # Handle an existing Build directory (delete with prompt if non-empty)
+        if os.path.exists(build_dir):
+            if not confirm_deletion(build_dir):
+                logger.warning("Build process cancelled.")
+                sys.exit(0)
+            try:
+                shutil.rmtree(build_dir)
+                logger.info(f"Deleted existing '{build_dir}' folder.")
+            except Exception as e:
+                logger.error(f"Error deleting {build_dir}: {e}")
+                sys.exit(1)
+
+        # Create a fresh Build directory
+        os.makedirs(build_dir)
+        logger.info(f"Created Build folder at '{build_dir}'")
+    
+    total_cars = len(builds)
     if total_cars == 0:
         logger.warning("No car folders found to build.")
     else:
-        logger.info(f"Building {total_cars} car(s) with {args.workers} worker(s).")
-        progress = BuildProgress(total_cars)
+        if args.backend == "asyncio":
+            logger.info(f"Building {total_cars} car(s) with at most {args.disk_jobs} disk, {args.cpu_jobs} CPU and "
+                        f"{args.subprocess_jobs} subprocess step(s) at once (asyncio backend).")
+        else:
+            logger.info(f"Building {total_cars} car(s) with {args.workers} worker(s) ({args.backend} backend).")
+        progress = BuildProgress(total_cars, profiler if args.backend != "asyncio" else None)
+        # Worker processes cannot draw the progress bar; the builder advances it as cars finish.
+        car_progress = BuildProgress(0) if args.backend == "processes" else progress
         failures = 0
 
-        with ThreadPoolExecutor(max_workers=args.workers) as executor:
-            futures = {
-                executor.submit(
-                    build_one_car,
-                    car_name,
-                    source_dir,
-                    build_dir,
-                    global_base_dir,
-                    ignore_patterns,
-                    info_version,
-                    info_year,
-                    progress,
-                ): car_name
-                for car_name in cars_to_build
-            }
+        lua_minifier = None
+        if args.minify_lua:
+            from lua_minify import MinifyCache
+            lua_minifier = MinifyCache(os.path.join(script_dir, ".builder_cache", "lua"))
+
+        shared_layer = None
+        if args.share_duplicates:
+            groups = find_duplicate_car_files(source_dir, cars_to_build, ignore_patterns, executors.map_cpu, digest_cache)
+            shared_layer = SharedLayer(source_dir, groups)
+            if args.backend == "processes":
+                shared_layer.publish()
+            if stager is not None:
+                stager.copy_function = shared_layer.copy
+            for path, digest in shared_layer.members.items():
+                digest_cache.seed(path, digest)
+            logger.info(f"Shared layer: {len(groups)} file(s) identical across cars will be read once.")
+
+        substitution = token_substitution(build_config)
+
+        png_optimizer = None
+        if args.optimize_png:
+            from png_optimize import PngOptimizer
+            png_optimizer = PngOptimizer(os.path.join(script_dir, ".builder_cache", "png"))
+
+        car_builds = [
+            (
+                car_name,
+                source_dir,
+                build_dir,
+                global_base_dir,
+                ignore_patterns,
+                info_version,
+                info_year,
+                car_progress,
+                build_config.get("tree_shake", {}) if args.tree_shake else None,
+                lua_minifier,
+                png_optimizer,
+                shared_layer,
+                variant,
+                os.path.join(script_dir, "config_index.sqlite") if args.index_config else None,
+                digest_cache,
+                build_inputs[car_name],
+                substitution,
+                output_fs,
+            )
+            for car_name, variant in builds
+        ]
+
+        if args.backend == "asyncio":
+            import asyncio
+
+            jobs = {"disk": args.disk_jobs, "cpu": args.cpu_jobs, "subprocess": args.subprocess_jobs}
+            try:
+                results = asyncio.run(build_cars_async(car_builds, jobs))
+            except (KeyboardInterrupt, asyncio.CancelledError):
+                removed = remove_pack_leftovers(build_dir) if output_fs.is_disk else 0
+                logger.error(f"Build interrupted; removed {removed} leftover QuickBMS input file(s).")
+                sys.exit(130)
+            failures = sum(1 for ok in results.values() if not ok)
+        else:
+            futures = {executors.cars.submit(build_one_car, *car_args): car_args[0] for car_args in car_builds}
 
             for future in as_completed(futures):
                 car_name = futures[future]
@@ -746,10 +3459,44 @@ def main():
                 except Exception as e:
                     failures += 1
                     logger.error(f"Unhandled error while processing {car_name}: {e}")
+                if car_progress is not progress:
+                    progress.complete(car_name)
 
+        executors.shutdown()
+        if stager is not None:
+            shutil.rmtree(stage_root, ignore_errors=True)
+        if png_optimizer is not None:
+            png_optimizer.close()
+        if shared_layer is not None:
+            shared_layer.close()
+            logger.info(f"Shared layer: read {shared_layer.read_bytes} bytes of duplicated files from Source once; "
+                        f"{shared_layer.reused_bytes} bytes were written from memory instead of being read again.")
+
+        digest_cache.save(stat_index_path, stat_index_roots)
         if failures:
             logger.warning(f"Build completed with {failures} car(s) reporting errors.")
 
+    if args.in_memory:
+        logger.info(f"Built {total_cars} car(s) in memory: {format_bytes(output_fs.total_bytes())}.")
+        if args.pack_release or args.pack_patch:
+            license_path = os.path.join(script_dir, "LICENSE.txt")
+            if os.path.exists(license_path):
+                output_fs.copy_in(license_path, license_path)
+            if not package_release(args, script_dir, build_dir, project_name, info_version, executors, profiler, output_fs):
+                sys.exit(1)
+
+    if profiler is not None:
+        profiler.report()
+
+    if args.backend == "processes":
+        summary = f"Build took {time.perf_counter() - build_start:.3f} s; build events were recorded by the worker processes."
+    else:
+        summary = build_events.summary(time.perf_counter() - build_start)
+    logger.info(summary)
+    print(summary)
+    memory_summary = memory_report()
+    logger.info(memory_summary)
+    print(memory_summary)
     logger.info("Build process complete.")
 
 if __name__ == "__main__":
@@ -0,0 +1,266 @@
+"""
+config_index.py
+
+SQLite index of the effective configuration of built cars, with provenance.
+
+For every INI file a built car ships in data/ and extension/, the index holds one row per
+(version, car, file, section, key) with the effective value and the layer it came from:
+
+    base                    Source/base
+    <folder>                a full INI file in a car folder or matrix overlay (replaces base's)
+    <folder> addon          a <name>.addon.ini merged over it
+    matrix                  a kart-class matrix parameter
+    builder                 rewritten by the builder itself (e.g. lods.ini FILE=)
+
+builder.py --index-config updates the rows of each car it builds. Querying needs no build:
+
+    python config_index.py query TOTALMASS
+    python config_index.py query --car "*dd2*" --file data/engine.ini "*"
+    python config_index.py diff-cars ohyeah2389_modkart_dd2 ohyeah2389_modkart_rokshifter
+    python config_index.py diff-versions "0.6.5 Open Alpha" "0.6.6 Open Alpha"
+"""
+
+import os
+import sys
+import time
+import sqlite3
+import argparse
+import configparser
+from typing import Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_INDEX_NAME = "config_index.sqlite"
+INDEXED_FOLDERS = ("data", "extension")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS config (
+    version TEXT NOT NULL,
+    car TEXT NOT NULL,
+    file TEXT NOT NULL,
+    section TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    source TEXT NOT NULL,
+    PRIMARY KEY (version, car, file, section, key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS config_by_key ON config (key, section);
+CREATE TABLE IF NOT EXISTS versions (
+    version TEXT PRIMARY KEY,
+    indexed_at REAL NOT NULL
+);
+"""
+
+Row = Tuple[str, str, str, str, str]
+
+
+class _IniParser(configparser.ConfigParser):
+    """Lenient parser: keeps key case, allows duplicates (last wins) and '%' in values."""
+
+    def __init__(self):
+        super().__init__(strict=False, interpolation=None)
+
+    def optionxform(self, optionstr: str) -> str:
+        return optionstr
+
+
+def read_ini(path: str) -> Dict[str, Dict[str, str]]:
+    """{section: {key: value}} with inline ';' comments stripped from values."""
+    parser = _IniParser()
+    parser.read(path, encoding="utf-8")
+    return {
+        section: {key: value.split(";", 1)[0].strip() for key, value in parser.items(section)}
+        for section in parser.sections()
+    }
+
+
+def _is_delete_section(items: Dict[str, str]) -> bool:
+    return len(items) == 1 and next(iter(items)).upper() == "DELETE" and next(iter(items.values())) == "1"
+
+
+def layer_origins(source_dir: str, layers: List[str], rel_path: str) -> Dict[Tuple[str, str], Tuple[str, str]]:
+    """
+    Replays the builder's layering for one INI file: Source/base, then each layer folder (full
+    files replace, .addon.ini files merge and can DELETE sections). Returns
+    {(section, key): (source, value)}.
+    """
+    origins = {}
+    for layer in ["base"] + list(layers):
+        full_path = os.path.join(source_dir, layer, rel_path)
+        if os.path.isfile(full_path):
+            origins = {
+                (section, key): (layer, value)
+                for section, items in read_ini(full_path).items()
+                for key, value in items.items()
+            }
+        addon_path = full_path[:-len(".ini")] + ".addon.ini"
+        if layer != "base" and os.path.isfile(addon_path):
+            for section, items in read_ini(addon_path).items():
+                if _is_delete_section(items):
+                    origins = {k: v for k, v in origins.items() if k[0] != section}
+                    continue
+                for key, value in items.items():
+                    origins[(section, key)] = (f"{layer} addon", value)
+    return origins
+
+
+def collect_rows(car_build_dir: str, source_dir: str, layers: List[str],
+                 overrides: Optional[Dict[str, dict]] = None) -> List[Row]:
+    """
+    Rows (file, section, key, value, source) for every INI file in the built car's data/ and
+    extension/ folders. overrides are the matrix INI parameters applied to the car, if any.
+    """
+    rows = []
+    for folder in INDEXED_FOLDERS:
+        for root, dirs, files in os.walk(os.path.join(car_build_dir, folder)):
+            dirs.sort()
+            for file in sorted(files):
+                if not file.lower().endswith(".ini"):
+                    continue
+                path = os.path.join(root, file)
+                rel_path = os.path.relpath(path, car_build_dir).replace("\\", "/")
+                try:
+                    effective = read_ini(path)
+                except (configparser.Error, UnicodeDecodeError):
+                    continue
+
+                origins = layer_origins(source_dir, layers, rel_path)
+                for section, options in (overrides or {}).get(rel_path, {}).items():
+                    for key, value in options.items():
+                        value = str(int(value)) if isinstance(value, bool) else str(value)
+                        origins[(section, key)] = ("matrix", value)
+
+                for section, items in effective.items():
+                    for key, value in items.items():
+                        source, layer_value = origins.get((section, key), ("builder", None))
+                        if layer_value != value:
+                            source = "builder"
+                        rows.append((rel_path, section, key, value, source))
+    return rows
+
+
+def connect(index_path: str) -> sqlite3.Connection:
+    connection = sqlite3.connect(index_path, timeout=60)
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def store_car(index_path: str, version: str, car: str, rows: Iterable[Row]):
+    """Replaces the indexed rows of one car for one version."""
+    connection = connect(index_path)
+    try:
+        with connection:
+            connection.execute("INSERT OR REPLACE INTO versions VALUES (?, ?)", (version, time.time()))
+            connection.execute("DELETE FROM config WHERE version = ? AND car = ?", (version, car))
+            connection.executemany(
+                "INSERT OR REPLACE INTO config VALUES (?, ?, ?, ?, ?, ?, ?)",
+                ((version, car) + tuple(row) for row in rows),
+            )
+    finally:
+        connection.close()
+
+
+def latest_version(connection: sqlite3.Connection) -> Optional[str]:
+    """The most recently indexed version."""
+    row = connection.execute("SELECT version FROM versions ORDER BY indexed_at DESC LIMIT 1").fetchone()
+    return row[0] if row else None
+
+
+def query(connection: sqlite3.Connection, key: str = "*", version: Optional[str] = None, car: str = "*",
+          file: str = "*", section: str = "*") -> List[tuple]:
+    """Rows matching glob patterns, as (version, car, file, section, key, value, source)."""
+    version = version or latest_version(connection)
+    return connection.execute(
+        "SELECT version, car, file, section, key, value, source FROM config "
+        "WHERE version = ? AND car GLOB ? AND file GLOB ? AND section GLOB ? AND key GLOB ? "
+        "ORDER BY key, file, section, car",
+        (version, car, file, section, key),
+    ).fetchall()
+
+
+def diff_cars(connection: sqlite3.Connection, car_a: str, car_b: str, version: Optional[str] = None) -> List[tuple]:
+    """(file, section, key, value_a, value_b) wherever the two cars differ; None means absent."""
+    version = version or latest_version(connection)
+    return connection.execute(
+        """
+        SELECT file, section, key, MAX(CASE WHEN car = ? THEN value END), MAX(CASE WHEN car = ? THEN value END)
+        FROM config WHERE version = ? AND car IN (?, ?)
+        GROUP BY file, section, key
+        HAVING COUNT(*) < 2 OR MIN(value) != MAX(value)
+        ORDER BY file, section, key
+        """,
+        (car_a, car_b, version, car_a, car_b),
+    ).fetchall()
+
+
+def diff_versions(connection: sqlite3.Connection, version_a: str, version_b: str, car: str = "*") -> List[tuple]:
+    """(car, file, section, key, value_a, value_b) for every value that changed between versions."""
+    return connection.execute(
+        """
+        SELECT car, file, section, key,
+               MAX(CASE WHEN version = ? THEN value END), MAX(CASE WHEN version = ? THEN value END)
+        FROM config WHERE version IN (?, ?) AND car GLOB ?
+        GROUP BY car, file, section, key
+        HAVING COUNT(*) < 2 OR MIN(value) != MAX(value)
+        ORDER BY car, file, section, key
+        """,
+        (version_a, version_b, version_a, version_b, car),
+    ).fetchall()
+
+
+def _print_table(header: Tuple[str, ...], rows: List[tuple]):
+    rows = [tuple("-" if value is None else str(value) for value in row) for row in rows]
+    widths = [max([len(title)] + [len(row[i]) for row in rows]) for i, title in enumerate(header)]
+    print("  ".join(title.ljust(width) for title, width in zip(header, widths)))
+    for row in rows:
+        print("  ".join(value.ljust(width) for value, width in zip(row, widths)))
+    print(f"({len(rows)} row(s))")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the builder's index of effective car configuration")
+    parser.add_argument("--db", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), DEFAULT_INDEX_NAME),
+                        help=f"Index file (default: {DEFAULT_INDEX_NAME} next to this script)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    query_parser = commands.add_parser("query", help="Show a key (glob pattern) across cars")
+    query_parser.add_argument("key")
+    query_parser.add_argument("--version", help="Version to query (default: the latest indexed)")
+    query_parser.add_argument("--car", default="*")
+    query_parser.add_argument("--file", default="*")
+    query_parser.add_argument("--section", default="*")
+
+    cars_parser = commands.add_parser("diff-cars", help="Show every value that differs between two cars")
+    cars_parser.add_argument("car_a")
+    cars_parser.add_argument("car_b")
+    cars_parser.add_argument("--version", help="Version to compare (default: the latest indexed)")
+
+    versions_parser = commands.add_parser("diff-versions", help="Show every value that changed between two versions")
+    versions_parser.add_argument("version_a")
+    versions_parser.add_argument("version_b")
+    versions_parser.add_argument("--car", default="*")
+
+    commands.add_parser("versions", help="List indexed versions")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        print(f"No index at {args.db}; build with builder.py --index-config first.")
+        return 1
+
+    connection = connect(args.db)
+    if args.command == "query":
+        _print_table(("version", "car", "file", "section", "key", "value", "source"),
+                     query(connection, args.key, args.version, args.car, args.file, args.section))
+    elif args.command == "diff-cars":
+        _print_table(("file", "section", "key", args.car_a, args.car_b),
+                     diff_cars(connection, args.car_a, args.car_b, args.version))
+    elif args.command == "diff-versions":
+        _print_table(("car", "file", "section", "key", args.version_a, args.version_b),
+                     diff_versions(connection, args.version_a, args.version_b, args.car))
+    else:
+        _print_table(("version", "cars", "values"), connection.execute(
+            "SELECT v.version, COUNT(DISTINCT c.car), COUNT(c.car) FROM versions v "
+            "LEFT JOIN config c ON c.version = v.version GROUP BY v.version ORDER BY v.indexed_at").fetchall())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
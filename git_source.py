@@ -0,0 +1,244 @@
+"""
+git_source.py
+
+Source folders of any git revision, read straight from the object store for builder.py --rev.
+
+The tree is listed with "git ls-tree" and every blob is streamed through one long-lived
+"git cat-file --batch" process into a content-addressed store under the cache folder
+(blobs/<id[:2]>/<id>), hashed with SHA-256 on the way. A revision's Source folder is then
+assembled from hard links to those blobs (copies where linking is not possible) and published
+with an atomic rename, so the working tree is never touched and a blob shared by many
+revisions is read from git once. Files are taken exactly as stored in git, i.e. without the
+line-ending conversion a checkout may apply.
+
+Usage (materialize a revision's Source folder without building):
+    python git_source.py v0.6.5
+"""
+
+import os
+import sys
+import json
+import shutil
+import hashlib
+import argparse
+import tempfile
+import threading
+import subprocess
+from typing import Dict, List, Optional, Tuple
+
+CHUNK_SIZE = 1024 * 1024
+BLOB_MODES = ("100644", "100755")
+SYMLINK_MODE = "120000"
+
+
+class GitSourceError(RuntimeError):
+    """Raised when git fails or the revision does not contain the requested folder."""
+
+
+def _git(repo_dir: str, *args: str) -> str:
+    result = subprocess.run(["git", "-C", repo_dir, *args], capture_output=True, text=True)
+    if result.returncode != 0:
+        raise GitSourceError(f"git {' '.join(args)} failed: {result.stderr.strip()}")
+    return result.stdout
+
+
+def repo_root(path: str) -> str:
+    """Top level of the git work tree containing path."""
+    return _git(path, "rev-parse", "--show-toplevel").strip()
+
+
+def resolve_commit(repo_dir: str, rev: str) -> str:
+    """Full commit id of rev (a branch, tag or abbreviated id)."""
+    return _git(repo_dir, "rev-parse", "--verify", "--quiet", f"{rev}^{{commit}}").strip()
+
+
+def list_tree(repo_dir: str, commit: str, folder: str) -> List[Tuple[str, str, str]]:
+    """(mode, blob id, path relative to folder) of every file under folder at commit."""
+    output = _git(repo_dir, "ls-tree", "-r", "-z", "--full-tree", commit, "--", folder)
+    entries = []
+    prefix = folder.rstrip("/") + "/"
+    for record in output.split("\0"):
+        if not record:
+            continue
+        info, path = record.split("\t", 1)
+        mode, kind, object_id = info.split(" ")
+        if kind == "blob" and path.startswith(prefix):
+            entries.append((mode, object_id, path[len(prefix):]))
+    return entries
+
+
+class CatFileBatch:
+    """One "git cat-file --batch" process answering object requests one at a time."""
+
+    def __init__(self, repo_dir: str):
+        self.process = subprocess.Popen(
+            ["git", "-C", repo_dir, "cat-file", "--batch"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+        )
+        self.lock = threading.Lock()
+
+    def stream(self, object_id: str, write) -> int:
+        """Passes the object's content to write() in chunks. Returns its size."""
+        with self.lock:
+            self.process.stdin.write(object_id.encode("ascii") + b"\n")
+            self.process.stdin.flush()
+            header = self.process.stdout.readline().decode("ascii").split()
+            if len(header) != 3:
+                raise GitSourceError(f"git cat-file: object {object_id} is missing")
+            size = remaining = int(header[2])
+            while remaining:
+                chunk = self.process.stdout.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    raise GitSourceError(f"git cat-file: object {object_id} ended early")
+                write(chunk)
+                remaining -= len(chunk)
+            self.process.stdout.read(1)  # trailing newline
+            return size
+
+    def read(self, object_id: str) -> bytes:
+        chunks = []
+        self.stream(object_id, chunks.append)
+        return b"".join(chunks)
+
+    def close(self):
+        if self.process.poll() is None:
+            self.process.stdin.close()
+            self.process.wait()
+
+
+class BlobStore:
+    """
+    Content-addressed files under cache_dir/blobs keyed by git blob id, with the SHA-256 of each
+    recorded in cache_dir/sha256.json for the builder's digest caches.
+    """
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        self.digests_path = os.path.join(cache_dir, "sha256.json")
+        self.digests: Dict[str, str] = {}
+        self.fetched = 0
+        if os.path.exists(self.digests_path):
+            try:
+                with open(self.digests_path, "r", encoding="utf-8") as f:
+                    self.digests = json.load(f)
+            except (OSError, ValueError):
+                self.digests = {}
+
+    def path(self, object_id: str) -> str:
+        return os.path.join(self.cache_dir, "blobs", object_id[:2], object_id)
+
+    def fetch(self, batch: CatFileBatch, object_id: str) -> str:
+        """Path of the stored blob, streaming it from git first if it is not stored yet."""
+        blob_path = self.path(object_id)
+        if os.path.exists(blob_path) and object_id in self.digests:
+            return blob_path
+
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        digest = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(blob_path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                def write(chunk):
+                    digest.update(chunk)
+                    f.write(chunk)
+                batch.stream(object_id, write)
+            os.replace(tmp_path, blob_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.digests[object_id] = digest.hexdigest()
+        self.fetched += 1
+        return blob_path
+
+    def save(self):
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(self.digests, f, separators=(",", ":"))
+        os.replace(tmp_path, self.digests_path)
+
+
+def _place(blob_path: str, dst: str):
+    try:
+        os.link(blob_path, dst)
+    except OSError:
+        shutil.copyfile(blob_path, dst)
+
+
+def materialize_source(repo_dir: str, rev: str, folder: str, cache_dir: str,
+                       batch: Optional[CatFileBatch] = None) -> Tuple[str, str, Dict[str, str]]:
+    """
+    Assembles folder (e.g. "Source") as of rev under cache_dir/trees/<commit>/ and returns
+    (commit, folder path, {file path: SHA-256}). A revision assembled before is reused as is.
+    """
+    commit = resolve_commit(repo_dir, rev)
+    tree_dir = os.path.join(cache_dir, "trees", commit)
+    folder_dir = os.path.join(tree_dir, folder)
+    entries = list_tree(repo_dir, commit, folder)
+    if not entries:
+        raise GitSourceError(f"{rev} ({commit[:12]}) has no files under {folder}/")
+
+    store = BlobStore(cache_dir)
+    own_batch = batch is None
+    batch = batch or CatFileBatch(repo_dir)
+    try:
+        if not os.path.isdir(tree_dir):
+            os.makedirs(os.path.dirname(tree_dir), exist_ok=True)
+            tmp_dir = tempfile.mkdtemp(dir=os.path.dirname(tree_dir), suffix=".tmp")
+            try:
+                for mode, object_id, rel_path in entries:
+                    dst = os.path.join(tmp_dir, folder, *rel_path.split("/"))
+                    os.makedirs(os.path.dirname(dst), exist_ok=True)
+                    if mode == SYMLINK_MODE:
+                        try:
+                            os.symlink(batch.read(object_id).decode("utf-8"), dst)
+                        except OSError:
+                            pass
+                    elif mode in BLOB_MODES:
+                        _place(store.fetch(batch, object_id), dst)
+                os.rename(tmp_dir, tree_dir)
+            except OSError:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+                if not os.path.isdir(tree_dir):
+                    raise
+            except BaseException:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+                raise
+        else:
+            # Digests of blobs fetched by an older store file are recovered without asking git.
+            for mode, object_id, rel_path in entries:
+                if mode in BLOB_MODES and object_id not in store.digests:
+                    store.fetch(batch, object_id)
+        store.save()
+    finally:
+        if own_batch:
+            batch.close()
+
+    digests = {
+        os.path.join(folder_dir, *rel_path.split("/")): store.digests[object_id]
+        for mode, object_id, rel_path in entries
+        if mode in BLOB_MODES
+    }
+    return commit, folder_dir, digests
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Materialize a revision's Source folder from git without a checkout")
+    parser.add_argument("rev", help="Commit, branch or tag")
+    parser.add_argument("--folder", default="Source")
+    parser.add_argument("--cache", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), ".builder_cache", "git"))
+    args = parser.parse_args()
+
+    try:
+        repo_dir = repo_root(os.path.dirname(os.path.abspath(__file__)))
+        commit, folder_dir, digests = materialize_source(repo_dir, args.rev, args.folder, args.cache)
+    except GitSourceError as e:
+        print(e)
+        return 1
+    print(f"{args.rev} ({commit[:12]}): {len(digests)} file(s) in {folder_dir}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
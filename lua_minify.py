@@ -0,0 +1,348 @@
+"""
+lua_minify.py
+
+Pure-Python Lua (5.1 / LuaJIT) minifier used by the builder's --minify-lua release stage.
+
+The source is tokenized, comments are dropped and whitespace is reduced to the minimum needed
+to keep adjacent tokens apart. Line breaks are kept by default so line numbers in in-game
+error messages still point at the right line of the original script. Strings, including
+[[long strings]] and [==[leveled]==] ones, are copied verbatim.
+
+Every result is checked by re-tokenizing it and comparing the token stream with the
+original's; minify() raises LuaMinifyError rather than return something that differs.
+
+Usage (round-trip check over scripts, nothing is written):
+    python lua_minify.py --check Source/base/data Source/base/extension
+"""
+
+import os
+import sys
+import hashlib
+import argparse
+import tempfile
+import threading
+from typing import Dict, List, Optional, Tuple
+
+# Bump when the output format changes so cached results are not reused.
+MINIFIER_VERSION = "2"
+
+NAME = "name"
+NUMBER = "number"
+STRING = "string"
+OP = "op"
+COMMENT = "comment"
+SPACE = "space"
+
+OPERATORS = (
+    "...", "..", "==", "~=", "<=", ">=", "::", "//", "<<", ">>",
+    "+", "-", "*", "/", "%", "^", "#", "&", "~", "|", "<", ">", "=",
+    "(", ")", "{", "}", "[", "]", ";", ":", ",", ".",
+)
+
+
+class LuaMinifyError(ValueError):
+    """Raised for source the tokenizer cannot read or output that fails verification."""
+
+
+def _long_bracket_level(source: str, pos: int) -> int:
+    """Level of a long bracket opening at pos ("[[" -> 0, "[==[" -> 2), or -1 if there is none."""
+    if source[pos] != "[":
+        return -1
+    end = pos + 1
+    while end < len(source) and source[end] == "=":
+        end += 1
+    if end < len(source) and source[end] == "[":
+        return end - pos - 1
+    return -1
+
+
+def _long_bracket_end(source: str, pos: int, level: int) -> int:
+    """Index just past the long bracket that opens at pos."""
+    close = "]" + "=" * level + "]"
+    end = source.find(close, pos + level + 2)
+    if end < 0:
+        raise LuaMinifyError(f"unfinished long string/comment starting at offset {pos}")
+    return end + len(close)
+
+
+def tokenize(source: str) -> List[Tuple[str, str]]:
+    """
+    Split Lua source into (kind, text) tokens, including comments and whitespace, so that
+    joining every text reproduces the source exactly.
+    """
+    tokens = []
+    pos = 0
+    length = len(source)
+
+    if source.startswith("#"):
+        end = source.find("\n")
+        end = length if end < 0 else end
+        tokens.append((COMMENT, source[:end]))
+        pos = end
+
+    while pos < length:
+        char = source[pos]
+
+        if char in " \t\r\n\f\v":
+            end = pos + 1
+            while end < length and source[end] in " \t\r\n\f\v":
+                end += 1
+            tokens.append((SPACE, source[pos:end]))
+            pos = end
+            continue
+
+        if source.startswith("--", pos):
+            level = _long_bracket_level(source, pos + 2) if pos + 2 < length else -1
+            if level >= 0:
+                end = _long_bracket_end(source, pos + 2, level)
+            else:
+                end = source.find("\n", pos)
+                end = length if end < 0 else end
+            tokens.append((COMMENT, source[pos:end]))
+            pos = end
+            continue
+
+        if char.isalpha() or char == "_":
+            end = pos + 1
+            while end < length and (source[end].isalnum() or source[end] == "_"):
+                end += 1
+            tokens.append((NAME, source[pos:end]))
+            pos = end
+            continue
+
+        if char.isdigit() or (char == "." and pos + 1 < length and source[pos + 1].isdigit()):
+            # Mirrors the Lua lexer: a numeral runs over alphanumerics and dots, plus an exponent
+            # sign after e/E (decimal) or p/P (hexadecimal, where e is a digit).
+            exponent = "pP" if source.startswith(("0x", "0X"), pos) else "eE"
+            end = pos
+            while end < length:
+                current = source[end]
+                if current in exponent and end + 1 < length and source[end + 1] in "+-":
+                    end += 2
+                elif current.isalnum() or current in "._":
+                    end += 1
+                else:
+                    break
+            tokens.append((NUMBER, source[pos:end]))
+            pos = end
+            continue
+
+        if char in "\"'":
+            end = pos + 1
+            while True:
+                if end >= length or source[end] == "\n":
+                    raise LuaMinifyError(f"unfinished string starting at offset {pos}")
+                if source.startswith("\\z", end):
+                    # \z skips the whitespace that follows it, line breaks included.
+                    end += 2
+                    while end < length and source[end] in " \t\r\n\f\v":
+                        end += 1
+                    continue
+                if source[end] == "\\":
+                    end += 3 if source.startswith("\r\n", end + 1) else 2
+                    continue
+                if source[end] == char:
+                    end += 1
+                    break
+                end += 1
+            tokens.append((STRING, source[pos:end]))
+            pos = end
+            continue
+
+        if char == "[":
+            level = _long_bracket_level(source, pos)
+            if level >= 0:
+                end = _long_bracket_end(source, pos, level)
+                tokens.append((STRING, source[pos:end]))
+                pos = end
+                continue
+
+        for operator in OPERATORS:
+            if source.startswith(operator, pos):
+                tokens.append((OP, operator))
+                pos += len(operator)
+                break
+        else:
+            raise LuaMinifyError(f"unexpected character {char!r} at offset {pos}")
+
+    return tokens
+
+
+def significant_tokens(tokens: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+    """Tokens that affect the program, i.e. everything except comments and whitespace."""
+    return [token for token in tokens if token[0] not in (COMMENT, SPACE)]
+
+
+def _needs_space(previous: Tuple[str, str], following: Tuple[str, str]) -> bool:
+    """True if writing the two tokens back to back would lex differently."""
+    try:
+        return significant_tokens(tokenize(previous[1] + following[1])) != [previous, following]
+    except LuaMinifyError:
+        return True
+
+
+def minify(source: str, preserve_lines: bool = True) -> str:
+    """
+    Return minified Lua source. With preserve_lines, every line break of the original
+    (including those inside dropped comments) is kept so line numbers stay valid.
+    Raises LuaMinifyError if the source cannot be tokenized or verification fails.
+    """
+    tokens = tokenize(source)
+    output = []
+    previous = None
+    pending_newlines = 0
+    pending_space = False
+
+    for kind, text in tokens:
+        if kind in (SPACE, COMMENT):
+            newlines = text.count("\n")
+            if preserve_lines:
+                pending_newlines += newlines
+            pending_space = True
+            continue
+
+        if previous is not None:
+            if pending_newlines:
+                output.append("\n" * pending_newlines)
+            elif pending_space and _needs_space(previous, (kind, text)):
+                output.append(" ")
+        elif pending_newlines:
+            output.append("\n" * pending_newlines)
+
+        output.append(text)
+        previous = (kind, text)
+        pending_newlines = 0
+        pending_space = False
+
+    if source.endswith("\n"):
+        output.append("\n")
+
+    result = "".join(output)
+    if significant_tokens(tokenize(result)) != significant_tokens(tokens):
+        raise LuaMinifyError("minified output does not match the original token stream")
+    return result
+
+
+class MinifyCache:
+    """
+    Content-hash keyed cache of minified scripts. Results are memoized in memory for the
+    current build (so identical base scripts copied into every car are minified once) and
+    stored under cache_dir for later builds.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, preserve_lines: bool = True):
+        self.cache_dir = cache_dir
+        self.preserve_lines = preserve_lines
+        self._memory: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # Shipped to builder worker processes: the lock cannot be pickled, the disk cache is shared.
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _key(self, content: bytes) -> str:
+        digest = hashlib.sha256(content)
+        digest.update(f"|v{MINIFIER_VERSION}|lines={int(self.preserve_lines)}".encode())
+        return digest.hexdigest()
+
+    @staticmethod
+    def _store(cache_path: str, result: bytes):
+        # The result is valid either way; a cache that cannot be written only costs later builds.
+        tmp_path = None
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(cache_path), suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(result)
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            if tmp_path is not None:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+
+    def minify_bytes(self, content: bytes) -> bytes:
+        key = self._key(content)
+        with self._lock:
+            cached = self._memory.get(key)
+        if cached is not None:
+            return cached
+
+        cache_path = os.path.join(self.cache_dir, key[:2], key + ".lua") if self.cache_dir else None
+        if cache_path and os.path.exists(cache_path):
+            with open(cache_path, "rb") as f:
+                result = f.read()
+        else:
+            source = content.decode("utf-8")
+            result = minify(source, self.preserve_lines).encode("utf-8")
+            if cache_path:
+                self._store(cache_path, result)
+
+        with self._lock:
+            self._memory[key] = result
+        return result
+
+    def minify_file(self, path: str) -> Tuple[int, int]:
+        """Minify a file in place. Returns (original_size, new_size)."""
+        with open(path, "rb") as f:
+            content = f.read()
+        result = self.minify_bytes(content)
+        if result != content:
+            with open(path, "wb") as f:
+                f.write(result)
+        return len(content), len(result)
+
+
+def _find_lua_files(paths: List[str]) -> List[str]:
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                found.extend(os.path.join(root, f) for f in files if f.lower().endswith(".lua"))
+        else:
+            found.append(path)
+    return sorted(found)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Minify Lua scripts or check that minification round-trips")
+    parser.add_argument("paths", nargs="+", help="Lua files or folders to process")
+    parser.add_argument("--check", action="store_true", help="Only verify that every script minifies and round-trips")
+    parser.add_argument("--single-line", action="store_true", help="Do not preserve line breaks")
+    args = parser.parse_args()
+
+    failures = 0
+    total_before = total_after = 0
+    for path in _find_lua_files(args.paths):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                source = f.read()
+            result = minify(source, preserve_lines=not args.single_line)
+            # Minifying twice must be a no-op once comments and extra whitespace are gone.
+            if minify(result, preserve_lines=not args.single_line) != result:
+                raise LuaMinifyError("minification is not idempotent")
+        except (LuaMinifyError, UnicodeDecodeError) as e:
+            failures += 1
+            print(f"FAIL {path}: {e}")
+            continue
+
+        total_before += len(source.encode("utf-8"))
+        total_after += len(result.encode("utf-8"))
+        print(f"ok   {path}: {len(source)} -> {len(result)} chars")
+        if not args.check:
+            with open(path, "w", encoding="utf-8", newline="") as f:
+                f.write(result)
+
+    print(f"{total_before} -> {total_after} bytes, {failures} failure(s)")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+"""
+lut.py
+
+Parsing, caching and validation of the Assetto Corsa ".lut" and ".rto" tables in Source.
+
+Both formats are one "key|value" pair per line, with ";" starting a comment. Files are UTF-8,
+optionally with a BOM; comments may hold bytes in any other encoding. Numeric tables
+(power.lut, tire curves, ...) are parsed into float arrays that can be interpolated; tables
+with text keys (gearing.rto, the *_options.lut setup selectors) keep their keys as labels.
+
+Parsed tables are cached as memory-mapped .npy sidecars keyed by the SHA-256 of the file
+content, so unchanged tables are never parsed twice across builds and tools.
+
+Requires NumPy.
+"""
+
+import os
+import re
+import hashlib
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+
+LUT_EXTENSIONS = (".lut", ".rto")
+# Bytes that are not UTF-8, as load_lut decodes them (surrogateescape); only allowed in comments.
+UNDECODABLE_RE = re.compile("[\udc80-\udcff]")
+
+
+class LutError(ValueError):
+    """A problem in a LUT file, located by path and (1-based) line number."""
+
+    def __init__(self, path: str, line: Optional[int], message: str):
+        self.path = path
+        self.line = line
+        self.message = message
+        location = f"{path}:{line}" if line else path
+        super().__init__(f"{location}: {message}")
+
+
+class LutTable:
+    """
+    A parsed LUT.
+
+    x is a float array for numeric tables and None for labelled ones, in which case labels
+    holds the text keys. lines holds the source line number of every row.
+    """
+
+    def __init__(self, path: str, x: Optional[np.ndarray], y: np.ndarray, lines: np.ndarray,
+                 labels: Optional[Tuple[str, ...]] = None):
+        self.path = path
+        self.x = x
+        self.y = y
+        self.lines = lines
+        self.labels = labels
+
+    @property
+    def is_numeric(self) -> bool:
+        return self.x is not None
+
+    def __len__(self) -> int:
+        return len(self.y)
+
+    def __repr__(self) -> str:
+        kind = "numeric" if self.is_numeric else "labelled"
+        return f"<LutTable {os.path.basename(self.path)} {kind} rows={len(self)}>"
+
+    def interpolate(self, x):
+        """
+        Linearly interpolate the table at x (scalar or array), clamping outside the table
+        range like the game does.
+        """
+        if not self.is_numeric:
+            raise TypeError(f"{self.path} has text keys and cannot be interpolated")
+        return np.interp(x, self.x, self.y)
+
+    def lookup(self, label: str) -> float:
+        """Value for a text key of a labelled table (e.g. a gear set name in gearing.rto)."""
+        if self.is_numeric:
+            raise TypeError(f"{self.path} has numeric keys; use interpolate()")
+        return float(self.y[self.labels.index(label)])
+
+
+def _parse_float(text: str) -> Optional[float]:
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
+def parse_lut(text: str, path: str = "<string>") -> LutTable:
+    """
+    Parse LUT text into a LutTable.
+    Raises LutError for malformed lines, mixed numeric/text keys or an empty table.
+    """
+    keys = []
+    values = []
+    lines = []
+
+    if text.startswith("\ufeff"):
+        text = text[1:]
+    for line_number, raw_line in enumerate(text.splitlines(), start=1):
+        line = raw_line.split(";", 1)[0].strip()
+        if not line:
+            continue
+        if UNDECODABLE_RE.search(line):
+            raise LutError(path, line_number, "not valid UTF-8 text")
+
+        parts = line.split("|")
+        if len(parts) != 2:
+            raise LutError(path, line_number, f"expected 'key|value', got '{raw_line.strip()}'")
+
+        key = parts[0].strip()
+        value = _parse_float(parts[1].strip())
+        if not key:
+            raise LutError(path, line_number, "missing key")
+        if value is None:
+            raise LutError(path, line_number, f"value '{parts[1].strip()}' is not a number")
+
+        keys.append(key)
+        values.append(value)
+        lines.append(line_number)
+
+    if not keys:
+        raise LutError(path, None, "table is empty")
+
+    numeric_keys = [_parse_float(key) for key in keys]
+    y = np.array(values, dtype=np.float64)
+    line_array = np.array(lines, dtype=np.int64)
+
+    if all(key is None for key in numeric_keys):
+        return LutTable(path, None, y, line_array, tuple(keys))
+
+    for key, numeric, line_number in zip(keys, numeric_keys, lines):
+        if numeric is None:
+            raise LutError(path, line_number, f"key '{key}' is not a number in a numeric table")
+
+    return LutTable(path, np.array(numeric_keys, dtype=np.float64), y, line_array)
+
+
+def check_lut(table: LutTable) -> List[LutError]:
+    """
+    Check a parsed table for values the game cannot use: NaN/infinite entries and, for
+    numeric tables, keys that are not strictly increasing.
+    """
+    errors = []
+
+    bad_values = ~np.isfinite(table.y)
+    if table.is_numeric:
+        bad_values |= ~np.isfinite(table.x)
+    for line_number in table.lines[bad_values]:
+        errors.append(LutError(table.path, int(line_number), "NaN or infinite entry"))
+
+    if table.is_numeric and len(table) > 1:
+        not_increasing = np.flatnonzero(np.diff(table.x) <= 0) + 1
+        for index in not_increasing:
+            errors.append(LutError(
+                table.path,
+                int(table.lines[index]),
+                f"key {table.x[index]:g} does not increase from {table.x[index - 1]:g} "
+                f"(line {int(table.lines[index - 1])})",
+            ))
+
+    return errors
+
+
+def _cache_paths(cache_dir: str, digest: str) -> Tuple[str, str]:
+    base = os.path.join(cache_dir, digest[:2], digest)
+    return base + ".npy", base + ".labels"
+
+
+def _write_atomic(path: str, write):
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _read_cache(cache_dir: str, digest: str, path: str) -> Optional[LutTable]:
+    array_path, labels_path = _cache_paths(cache_dir, digest)
+    if not os.path.exists(array_path):
+        return None
+    try:
+        rows = np.load(array_path, mmap_mode="r")
+        labels = None
+        if os.path.exists(labels_path):
+            with open(labels_path, "r", encoding="utf-8") as f:
+                labels = tuple(f.read().split("\n"))
+        x = None if labels is not None else rows[0]
+        return LutTable(path, x, rows[1], rows[2].astype(np.int64), labels)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_cache(cache_dir: str, digest: str, table: LutTable):
+    array_path, labels_path = _cache_paths(cache_dir, digest)
+    x = table.x if table.is_numeric else np.full(len(table), np.nan)
+    rows = np.vstack([x, table.y, table.lines.astype(np.float64)])
+    if table.labels is not None:
+        _write_atomic(labels_path, lambda f: f.write("\n".join(table.labels).encode("utf-8")))
+    _write_atomic(array_path, lambda f: np.save(f, rows))
+
+
+def load_lut(path: str, cache_dir: Optional[str] = None) -> LutTable:
+    """
+    Load and parse a LUT file. With cache_dir, parsed tables are stored as .npy sidecars keyed
+    by content hash and memory-mapped on later loads. Raises LutError on malformed files.
+    """
+    with open(path, "rb") as f:
+        content = f.read()
+
+    digest = hashlib.sha256(content).hexdigest()
+    if cache_dir:
+        cached = _read_cache(cache_dir, digest, path)
+        if cached is not None:
+            return cached
+
+    # Undecodable bytes are kept as surrogates so parse_lut can allow them in comments only
+    table = parse_lut(content.decode("utf-8-sig", errors="surrogateescape"), path)
+    if cache_dir:
+        try:
+            _write_cache(cache_dir, digest, table)
+        except OSError:
+            pass
+    return table
+
+
+def validate_lut_file(path: str, cache_dir: Optional[str] = None) -> List[LutError]:
+    """Parse and check one file, returning every problem found instead of raising."""
+    try:
+        table = load_lut(path, cache_dir)
+    except LutError as e:
+        return [e]
+    except OSError as e:
+        return [LutError(path, None, f"cannot read file: {e}")]
+    return check_lut(table)
+
+
+def find_lut_files(root: str) -> List[str]:
+    """All .lut/.rto files under root, sorted."""
+    found = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        for filename in filenames:
+            if filename.lower().endswith(LUT_EXTENSIONS):
+                found.append(os.path.join(dirpath, filename))
+    return sorted(found)
+
+
+def validate_lut_files(paths: Iterable[str], cache_dir: Optional[str] = None, workers: int = 4) -> List[LutError]:
+    """Validate many files in parallel; errors are returned in path order."""
+    paths = sorted(set(paths))
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        results = executor.map(lambda p: validate_lut_file(p, cache_dir), paths)
+        return [error for errors in results for error in errors]
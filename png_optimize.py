@@ -0,0 +1,395 @@
+"""
+png_optimize.py
+
+Pure-Python lossless PNG recompression used by the builder's --optimize-png release stage.
+
+Each image is decoded to its raw scanlines, re-filtered with every fixed PNG filter type plus
+a per-row adaptive choice, and deflated with several zlib settings; the smallest result wins.
+Ancillary chunks (text, timestamps, colour profiles, ...) are dropped; tRNS is kept because it
+changes the decoded pixels. The winner is decoded again and its pixels compared with the
+original's, so an image is never shipped with different pixels. Interlaced images and images
+that do not get smaller are left as they are.
+
+Usage (prints savings, writes nothing unless --write):
+    python png_optimize.py Source/base/texture Source/ohyeah2389_modkart_dd2
+"""
+
+import os
+import sys
+import zlib
+import struct
+import hashlib
+import argparse
+import tempfile
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+# Bump when the optimization strategy changes so cached results are not reused.
+OPTIMIZER_VERSION = "1"
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+KEPT_CHUNKS = (b"IHDR", b"PLTE", b"tRNS")
+CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+ZLIB_SETTINGS = (
+    (9, zlib.Z_DEFAULT_STRATEGY),
+    (9, zlib.Z_FILTERED),
+)
+
+
+class PngError(ValueError):
+    """Raised for files that are not PNGs this module can decode."""
+
+
+def read_chunks(data: bytes) -> List[Tuple[bytes, bytes]]:
+    """Split a PNG file into (type, payload) chunks, checking the signature and CRCs."""
+    if not data.startswith(PNG_SIGNATURE):
+        raise PngError("missing PNG signature")
+
+    chunks = []
+    pos = len(PNG_SIGNATURE)
+    while pos < len(data):
+        if pos + 8 > len(data):
+            raise PngError("truncated chunk header")
+        length, chunk_type = struct.unpack(">I4s", data[pos:pos + 8])
+        payload = data[pos + 8:pos + 8 + length]
+        crc_bytes = data[pos + 8 + length:pos + 12 + length]
+        if len(payload) != length or len(crc_bytes) != 4:
+            raise PngError(f"truncated {chunk_type!r} chunk")
+        if zlib.crc32(chunk_type + payload) != struct.unpack(">I", crc_bytes)[0]:
+            raise PngError(f"bad CRC in {chunk_type!r} chunk")
+        chunks.append((chunk_type, payload))
+        pos += 12 + length
+        if chunk_type == b"IEND":
+            break
+    return chunks
+
+
+def write_chunk(chunk_type: bytes, payload: bytes) -> bytes:
+    return struct.pack(">I", len(payload)) + chunk_type + payload + struct.pack(">I", zlib.crc32(chunk_type + payload))
+
+
+def _geometry(ihdr: bytes) -> Tuple[int, int, int, int]:
+    """Returns (height, stride, bytes_per_pixel, interlace) from an IHDR payload."""
+    width, height, bit_depth, color_type, _, _, interlace = struct.unpack(">IIBBBBB", ihdr)
+    if color_type not in CHANNELS:
+        raise PngError(f"unsupported color type {color_type}")
+    bits_per_pixel = CHANNELS[color_type] * bit_depth
+    stride = (width * bits_per_pixel + 7) // 8
+    return height, stride, max(1, bits_per_pixel // 8), interlace
+
+
+def _paeth(a: int, b: int, c: int) -> int:
+    p = a + b - c
+    pa = abs(p - a)
+    pb = abs(p - b)
+    pc = abs(p - c)
+    if pa <= pb and pa <= pc:
+        return a
+    if pb <= pc:
+        return b
+    return c
+
+
+def unfilter(filtered: bytes, height: int, stride: int, bpp: int) -> List[bytes]:
+    """Undo PNG scanline filtering, returning the raw rows."""
+    if len(filtered) != height * (stride + 1):
+        raise PngError("image data size does not match the header")
+
+    rows = []
+    previous = bytes(stride)
+    for y in range(height):
+        start = y * (stride + 1)
+        filter_type = filtered[start]
+        line = filtered[start + 1:start + 1 + stride]
+
+        if filter_type == 0:
+            row = bytes(line)
+        elif filter_type == 2:
+            row = bytes((a + b) & 0xFF for a, b in zip(line, previous))
+        elif filter_type in (1, 3, 4):
+            out = bytearray(line)
+            for i in range(stride):
+                left = out[i - bpp] if i >= bpp else 0
+                if filter_type == 1:
+                    predictor = left
+                elif filter_type == 3:
+                    predictor = (left + previous[i]) >> 1
+                else:
+                    predictor = _paeth(left, previous[i], previous[i - bpp] if i >= bpp else 0)
+                out[i] = (out[i] + predictor) & 0xFF
+            row = bytes(out)
+        else:
+            raise PngError(f"unknown filter type {filter_type} on row {y}")
+
+        rows.append(row)
+        previous = row
+    return rows
+
+
+def filter_row(filter_type: int, row: bytes, previous: bytes, bpp: int) -> bytes:
+    """Apply one PNG filter to a raw row."""
+    if filter_type == 0:
+        return row
+    left = bytes(bpp) + row[:-bpp] if bpp < len(row) else bytes(len(row))
+    if filter_type == 1:
+        return bytes((c - a) & 0xFF for c, a in zip(row, left))
+    if filter_type == 2:
+        return bytes((c - b) & 0xFF for c, b in zip(row, previous))
+    if filter_type == 3:
+        return bytes((c - ((a + b) >> 1)) & 0xFF for c, a, b in zip(row, left, previous))
+    upper_left = bytes(bpp) + previous[:-bpp] if bpp < len(previous) else bytes(len(previous))
+    return bytes((c - _paeth(a, b, d)) & 0xFF for c, a, b, d in zip(row, left, previous, upper_left))
+
+
+def _row_cost(filtered: bytes) -> int:
+    """Minimum-sum-of-absolute-differences heuristic: bytes read as signed values."""
+    return sum(value if value < 128 else 256 - value for value in filtered)
+
+
+def filter_candidates(rows: List[bytes], bpp: int, adaptive: bool) -> Dict[str, bytes]:
+    """Filtered image data for each fixed filter type, plus a per-row adaptive choice."""
+    per_type = {t: [] for t in range(5)}
+    adaptive_rows = []
+    previous = bytes(len(rows[0])) if rows else b""
+
+    for row in rows:
+        options = [(t, filter_row(t, row, previous, bpp)) for t in range(5)]
+        for t, filtered in options:
+            per_type[t].append(bytes([t]) + filtered)
+        if adaptive:
+            t, filtered = min(options, key=lambda option: _row_cost(option[1]))
+            adaptive_rows.append(bytes([t]) + filtered)
+        previous = row
+
+    candidates = {f"filter{t}": b"".join(parts) for t, parts in per_type.items()}
+    if adaptive:
+        candidates["adaptive"] = b"".join(adaptive_rows)
+    return candidates
+
+
+def decode_pixels(data: bytes) -> Tuple[bytes, List[bytes]]:
+    """Returns the header-and-palette signature and the raw rows of a PNG."""
+    chunks = read_chunks(data)
+    if not chunks or chunks[0][0] != b"IHDR":
+        raise PngError("IHDR is not the first chunk")
+    ihdr = chunks[0][1]
+    height, stride, bpp, interlace = _geometry(ihdr)
+    if interlace:
+        raise PngError("interlaced images are not supported")
+    idat = b"".join(payload for chunk_type, payload in chunks if chunk_type == b"IDAT")
+    try:
+        filtered = zlib.decompress(idat)
+    except zlib.error as e:
+        raise PngError(f"cannot inflate image data: {e}")
+    header = b"".join(t + p for t, p in chunks if t in KEPT_CHUNKS)
+    return header, unfilter(filtered, height, stride, bpp)
+
+
+def working_set_size(path: str) -> int:
+    """
+    Upper estimate of the memory optimizing the file takes: the file and its result, plus the raw
+    scanlines and each filter candidate (six, with adaptive). Unreadable headers count as the file size.
+    """
+    size = os.path.getsize(path)
+    try:
+        with open(path, "rb") as f:
+            head = f.read(len(PNG_SIGNATURE) + 8 + 13)
+        height, stride, _, _ = _geometry(head[len(PNG_SIGNATURE) + 8:])
+    except (OSError, struct.error, PngError):
+        return size
+    return 2 * size + 8 * height * (stride + 1)
+
+
+def optimize_png_bytes(data: bytes) -> bytes:
+    """
+    Losslessly recompress a PNG. Returns the original bytes if the image cannot be decoded,
+    is interlaced, or would not get smaller. The result is always pixel-identical.
+    """
+    try:
+        chunks = read_chunks(data)
+        if not chunks or chunks[0][0] != b"IHDR":
+            return data
+        height, stride, bpp, interlace = _geometry(chunks[0][1])
+        if interlace:
+            return data
+        header, rows = decode_pixels(data)
+    except PngError:
+        return data
+
+    # Per-row adaptive filtering is pointless for palette and sub-byte images.
+    adaptive = chunks[0][1][9] not in (3,) and chunks[0][1][8] >= 8
+    best_idat = None
+    for filtered in filter_candidates(rows, bpp, adaptive).values():
+        for level, strategy in ZLIB_SETTINGS:
+            compressor = zlib.compressobj(level, zlib.DEFLATED, 15, 9, strategy)
+            idat = compressor.compress(filtered) + compressor.flush()
+            if best_idat is None or len(idat) < len(best_idat):
+                best_idat = idat
+
+    output = [PNG_SIGNATURE]
+    for chunk_type, payload in chunks:
+        if chunk_type in KEPT_CHUNKS:
+            output.append(write_chunk(chunk_type, payload))
+    output.append(write_chunk(b"IDAT", best_idat))
+    output.append(write_chunk(b"IEND", b""))
+    result = b"".join(output)
+
+    if len(result) >= len(data):
+        return data
+    if decode_pixels(result) != (header, rows):
+        raise PngError("optimized image does not decode to the original pixels")
+    return result
+
+
+class PngOptimizer:
+    """
+    Optimizes PNG files on a process pool, keyed by the SHA-256 of their content: submissions
+    of an image already being optimized share its future, and each result is stored under
+    cache_dir, where every later submission (in this build or the next) finds it. Only
+    in-flight images are held in memory, so a long-lived optimizer (builder.py serve) does not
+    grow. Safe to call from multiple threads.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, workers: Optional[int] = None):
+        self.cache_dir = cache_dir
+        self._executor = ProcessPoolExecutor(max_workers=workers)
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __getstate__(self):
+        # Shipped to builder worker processes: a copy optimizes inline in that process and
+        # shares only the disk cache with the original.
+        return {"cache_dir": self.cache_dir}
+
+    def __setstate__(self, state):
+        self.cache_dir = state["cache_dir"]
+        self._executor = None
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def _cache_path(self, key: str) -> Optional[str]:
+        if not self.cache_dir:
+            return None
+        return os.path.join(self.cache_dir, key[:2], key + ".png")
+
+    def _store(self, cache_path: str, future: Future):
+        # A failed write only costs later submissions of the image.
+        if future.cancelled() or future.exception() is not None:
+            return
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(cache_path), suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(future.result())
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            pass
+
+    def _done(self, key: str, cache_path: Optional[str], future: Future):
+        # Done callback of the first submission of an image: once the result is in the disk
+        # cache, later submissions read it from there instead of this future.
+        if cache_path:
+            self._store(cache_path, future)
+        with self._lock:
+            if self._futures.get(key) is future:
+                del self._futures[key]
+
+    def submit_bytes(self, data: bytes) -> Future:
+        """
+        Starts optimizing data and returns a future for the result, so callers can queue many
+        images on the pool before waiting. The future raises PngError if verification fails.
+        """
+        key = hashlib.sha256(data + f"|v{OPTIMIZER_VERSION}".encode()).hexdigest()
+
+        with self._lock:
+            future = self._futures.get(key)
+            if future is not None:
+                return future
+            cache_path = self._cache_path(key)
+            future = Future()
+            if cache_path and os.path.exists(cache_path):
+                with open(cache_path, "rb") as f:
+                    future.set_result(f.read())
+                return future
+            if self._executor is not None:
+                future = self._executor.submit(optimize_png_bytes, data)
+            else:
+                try:
+                    future.set_result(optimize_png_bytes(data))
+                except PngError as e:
+                    future.set_exception(e)
+            self._futures[key] = future
+        future.add_done_callback(lambda done: self._done(key, cache_path, done))
+        return future
+
+    def optimize_bytes(self, data: bytes) -> bytes:
+        return self.submit_bytes(data).result()
+
+    def submit_file(self, path: str) -> Tuple[bytes, Future]:
+        """Reads path and submits it; pass both to finish_file() to write the result back."""
+        with open(path, "rb") as f:
+            data = f.read()
+        return data, self.submit_bytes(data)
+
+    @staticmethod
+    def finish_file(path: str, data: bytes, future: Future) -> Tuple[int, int]:
+        """Waits for a submit_file() result and writes it over path. Returns (original_size, new_size)."""
+        result = future.result()
+        if result != data:
+            with open(path, "wb") as f:
+                f.write(result)
+        return len(data), len(result)
+
+    def optimize_file(self, path: str) -> Tuple[int, int]:
+        """Optimize a file in place. Returns (original_size, new_size)."""
+        return self.finish_file(path, *self.submit_file(path))
+
+
+def _find_png_files(paths: List[str]) -> List[str]:
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                found.extend(os.path.join(root, f) for f in files if f.lower().endswith(".png"))
+        else:
+            found.append(path)
+    return sorted(found)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Losslessly recompress PNG files")
+    parser.add_argument("paths", nargs="+", help="PNG files or folders to process")
+    parser.add_argument("--write", action="store_true", help="Overwrite files with their optimized versions")
+    args = parser.parse_args()
+
+    total_before = total_after = 0
+    with ProcessPoolExecutor() as executor:
+        paths = _find_png_files(args.paths)
+        contents = []
+        for path in paths:
+            with open(path, "rb") as f:
+                contents.append(f.read())
+        for path, data, result in zip(paths, contents, executor.map(optimize_png_bytes, contents)):
+            total_before += len(data)
+            total_after += len(result)
+            print(f"{path}: {len(data)} -> {len(result)} bytes")
+            if args.write and result != data:
+                with open(path, "wb") as f:
+                    f.write(result)
+
+    print(f"{total_before} -> {total_after} bytes ({total_before - total_after} saved)")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,131 @@
+import os
+import re
+
+import pytest
+
+import builder
+from build_fs import DISK, MemoryFileSystem
+
+SOURCE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Source")
+
+
+@pytest.fixture
+def memory_fs(tmp_path):
+    fs = MemoryFileSystem()
+    for rel_path, content in {"a/one.txt": b"1", "a/b/two.txt": b"22", "a/b/c/three.txt": b"333", "d.txt": b"4"}.items():
+        with fs.open_write(str(tmp_path / rel_path)) as f:
+            f.write(content)
+    return fs
+
+
+def test_write_is_visible_on_close(tmp_path):
+    fs = MemoryFileSystem()
+    path = str(tmp_path / "new" / "file.bin")
+    f = fs.open_write(path)
+    f.write(b"data")
+    assert not fs.exists(path)
+    f.close()
+    assert fs.read_bytes(path) == b"data"
+    assert fs.isdir(str(tmp_path / "new"))
+    assert not os.path.exists(path)
+
+
+def test_walk(tmp_path, memory_fs):
+    walked = [(os.path.relpath(root, tmp_path), dirs, files) for root, dirs, files in memory_fs.walk(str(tmp_path))]
+    assert walked == [
+        (".", ["a"], ["d.txt"]),
+        ("a", ["b"], ["one.txt"]),
+        (os.path.join("a", "b"), ["c"], ["two.txt"]),
+        (os.path.join("a", "b", "c"), [], ["three.txt"]),
+    ]
+    assert list(memory_fs.walk(str(tmp_path / "missing"))) == []
+
+    # Pruning dirs in place skips those folders, like os.walk.
+    roots = []
+    for root, dirs, files in memory_fs.walk(str(tmp_path)):
+        roots.append(os.path.relpath(root, tmp_path))
+        dirs[:] = [name for name in dirs if name != "b"]
+    assert roots == [".", "a"]
+
+
+def test_remove(tmp_path, memory_fs):
+    memory_fs.remove(str(tmp_path / "a" / "one.txt"))
+    assert not memory_fs.exists(str(tmp_path / "a" / "one.txt"))
+    assert [entry.name for entry in memory_fs.scan(str(tmp_path / "a"))] == ["b"]
+    with pytest.raises(FileNotFoundError):
+        memory_fs.remove(str(tmp_path / "a" / "one.txt"))
+    with pytest.raises(FileNotFoundError):
+        memory_fs.remove(str(tmp_path / "a" / "b"))
+
+
+def test_link_shares_content(tmp_path, memory_fs):
+    src, dst = str(tmp_path / "a" / "b" / "two.txt"), str(tmp_path / "e" / "copy.txt")
+    memory_fs.link(src, dst)
+    assert memory_fs.read_bytes(dst) == b"22"
+    assert memory_fs.files[os.path.abspath(dst)][0] is memory_fs.files[os.path.abspath(src)][0]
+
+    # Rewriting the source does not change the link.
+    with memory_fs.open_write(src) as f:
+        f.write(b"changed")
+    assert memory_fs.read_bytes(dst) == b"22"
+    with pytest.raises(FileNotFoundError):
+        memory_fs.link(str(tmp_path / "missing"), dst)
+
+
+def test_rmtree(tmp_path, memory_fs):
+    before = memory_fs.total_bytes()
+    memory_fs.rmtree(str(tmp_path / "a" / "b"))
+    assert not memory_fs.isdir(str(tmp_path / "a" / "b"))
+    assert not memory_fs.exists(str(tmp_path / "a" / "b" / "c" / "three.txt"))
+    assert [entry.name for entry in memory_fs.scan(str(tmp_path / "a"))] == ["one.txt"]
+    assert memory_fs.total_bytes() == before - 5
+
+    # A sibling sharing the folder's name as a prefix is left alone.
+    with memory_fs.open_write(str(tmp_path / "ab" / "keep.txt")) as f:
+        f.write(b"k")
+    memory_fs.rmtree(str(tmp_path / "a"))
+    assert memory_fs.read_bytes(str(tmp_path / "ab" / "keep.txt")) == b"k"
+    assert sorted(entry.name for entry in memory_fs.scan(str(tmp_path))) == ["ab", "d.txt"]
+
+
+def build_tree(fs, build_dir):
+    """{car-relative path: content} of every car built from Source on fs."""
+    with open(os.path.join(SOURCE_DIR, "info.toml"), "rb") as f:
+        data = builder.tomllib.load(f)
+    build_config = data.get("build", {})
+    fs.makedirs(build_dir)
+    results = {}
+    for car_name in sorted(os.listdir(SOURCE_DIR)):
+        if car_name == "base" or not os.path.isdir(os.path.join(SOURCE_DIR, car_name)):
+            continue
+        steps = builder.car_build_steps(
+            car_name, SOURCE_DIR, build_dir, os.path.join(SOURCE_DIR, "base"), build_config.get("ignore", ["~*"]),
+            data["info"]["version"], data["info"]["year"], substitution=builder.token_substitution(build_config), fs=fs)
+        results[car_name] = builder.run_build_steps(steps, car_name)
+
+    tree = {}
+    for root, dirs, files in fs.walk(build_dir):
+        for name in files:
+            path = os.path.join(root, name)
+            rel_path = os.path.relpath(path, build_dir).replace("\\", "/")
+            if rel_path.endswith(".manifest.json"):
+                continue
+            content = fs.read_bytes(path)
+            if name == "ui_car.json":
+                content = re.sub(rb"Car compiled on [0-9: -]+\.", b"Car compiled on <time>.", content)
+            tree[rel_path] = content
+    return results, tree
+
+
+def test_source_builds_the_same_in_memory(tmp_path):
+    build_dir = str(tmp_path / "Build")
+    disk_results, disk_tree = build_tree(DISK, build_dir)
+    memory_fs = MemoryFileSystem()
+    memory_results, memory_tree = build_tree(memory_fs, str(tmp_path / "Memory" / "Build"))
+
+    assert memory_results == disk_results
+    assert all(disk_results.values())
+    assert len(disk_tree) > 50
+    assert sorted(memory_tree) == sorted(disk_tree)
+    assert memory_tree == disk_tree
+    assert not os.path.exists(tmp_path / "Memory")
@@ -0,0 +1,29 @@
+import builder
+
+
+LODS_INI = (
+    b"[COCKPIT_HR]\r\nDISTANCE_SWITCH=25\r\n\r\n"
+    b"[LOD_0]\r\nFILE=template_car.kn5\r\nIN=0\r\nOUT=2000\r\n\r\n"
+    b"[LOD_1]\r\nFILE=template_car_lod_b.kn5\r\n"
+)
+
+
+def test_set_lod0_file_only_touches_lod0():
+    result = builder.set_lod0_file(LODS_INI, b"kart_a.kn5")
+    assert result == LODS_INI.replace(b"FILE=template_car.kn5", b"FILE=kart_a.kn5")
+    assert builder.set_lod0_file(b"[LOD_0]\n FILE = old.kn5 ; mesh\n", b"kart_a.kn5") == b"[LOD_0]\n FILE = kart_a.kn5\n"
+
+
+def test_car_build_points_lod0_at_car_kn5_without_tokens(tmp_path):
+    source = tmp_path / "Source"
+    (source / "base" / "data").mkdir(parents=True)
+    (source / "base" / "data" / "lods.ini").write_bytes(LODS_INI)
+    (source / "kart_a").mkdir()
+    (source / "kart_a" / "model.kn5").write_bytes(b"kn5")
+    for extensions in (builder.SUBSTITUTE_EXTENSIONS, (".json",)):
+        substitution = builder.TokenSubstitution(builder.SUBSTITUTE_TOKENS, extensions)
+        steps = builder.car_build_steps("kart_a", str(source), str(tmp_path / "Build"), str(source / "base"),
+                                        [], "1.0", 2025, substitution=substitution, fs=builder.DISK)
+        assert builder.run_build_steps(steps, "kart_a") is not False
+        built = (tmp_path / "Build" / "kart_a" / "data" / "lods.ini").read_bytes()
+        assert b"FILE=kart_a.kn5\r\n" in built and b"FILE=template_car_lod_b.kn5" in built
@@ -0,0 +1,142 @@
+import os
+
+import pytest
+
+from lua_minify import COMMENT, NAME, NUMBER, OP, STRING, LuaMinifyError, MinifyCache, minify, significant_tokens, tokenize
+
+# Inputs minifiers commonly break on: adjacent operators that would fuse, numerals that swallow
+# dots or signs, comments and strings that look like each other, and long brackets with levels.
+ADVERSARIAL = [
+    "x = [==[ a ]] b ]=] c ]==]..y\n",
+    "local s = [[\nfirst\n]]--[[ comment ]]local t = 1\n",
+    "--[==[ level 2\n]] still comment\n]==]x = 1\n",
+    "--[[c]]x=1--[==[\n]==]y=2\n",
+    "a = b - -c\n",
+    "a = b - - -c\n",
+    "a = b.. ..c\n",
+    "a = b .. ...\n",
+    "a = 1 .. 2\n",
+    "x = 1..2\n",
+    "a = 0x1p4 + 1e-3 + 1E+10 + .5 + 3.\n",
+    "a = 0xe - 1\n",
+    "a = 0xe-1\n",
+    's = "a\\z\n      b"\n',
+    "s = '\\065\\66\\0067\\u{48}\\u{10FFFF}\\x41\\n\\\\'\n",
+    's = "line\\\ncontinued"\n',
+    "x = 1 -- trailing comment without newline",
+    "s = '--not a comment' -- but this is\n",
+    's = "--[[ not a long comment ]]"\n',
+    "#!/usr/bin/env lua\nprint(1)\n",
+    "t = { [ [[key]] ] = 1, [1]=2 }\n",
+    "a = b [=[x]=]\n",
+    "local a <const> = 1 // 2 << 3 >> 4 ~ 5 & 6 | ~7\n",
+    "goto continue ::continue::\n",
+    "f{...}\nf'x' f\"y\" f[[z]]\n",
+]
+
+
+def round_trip(source, preserve_lines=True):
+    result = minify(source, preserve_lines)
+    assert significant_tokens(tokenize(result)) == significant_tokens(tokenize(source))
+    assert minify(result, preserve_lines) == result
+    return result
+
+
+@pytest.mark.parametrize("source", ADVERSARIAL)
+def test_round_trip_preserving_lines(source):
+    result = round_trip(source)
+    assert result.count("\n") == source.count("\n")
+
+
+@pytest.mark.parametrize("source", ADVERSARIAL)
+def test_round_trip_single_line(source):
+    round_trip(source, preserve_lines=False)
+
+
+def test_tokenize_reproduces_source():
+    for source in ADVERSARIAL:
+        assert "".join(text for kind, text in tokenize(source)) == source
+
+
+@pytest.mark.parametrize("source, expected", [
+    ("a - -b", [(NAME, "a"), (OP, "-"), (OP, "-"), (NAME, "b")]),
+    ("a.. ..b", [(NAME, "a"), (OP, ".."), (OP, ".."), (NAME, "b")]),
+    ("1..2", [(NUMBER, "1..2")]),
+    ("1 ..2", [(NUMBER, "1"), (OP, ".."), (NUMBER, "2")]),
+    ("0x1p4", [(NUMBER, "0x1p4")]),
+    ("0x1p-4", [(NUMBER, "0x1p-4")]),
+    ("1e-3", [(NUMBER, "1e-3")]),
+    ("0xe-1", [(NUMBER, "0xe"), (OP, "-"), (NUMBER, "1")]),
+    ('"a\\z\n  b"', [(STRING, '"a\\z\n  b"')]),
+    ("'\\ddd'", [(STRING, "'\\ddd'")]),
+    ("[==[ ]] ]==]", [(STRING, "[==[ ]] ]==]")]),
+    ("'--x'", [(STRING, "'--x'")]),
+])
+def test_tokens_follow_lua_lexer(source, expected):
+    assert significant_tokens(tokenize(source)) == expected
+
+
+@pytest.mark.parametrize("source, expected", [
+    ("a = b - -c", "a=b- -c"),
+    ("a = b.. ..c", "a=b.. ..c"),
+    ("a = 1 .. 2", "a=1 ..2"),
+    ("a = 0xe - 1", "a=0xe-1"),
+    ("a = 1e1 - 1", "a=1e1-1"),
+    ("x = 1 -- trailing", "x=1"),
+    ("a--[[c]]b = 1", "a b=1"),
+])
+def test_minimal_spacing(source, expected):
+    assert round_trip(source) == expected
+
+
+def test_trailing_comment_keeps_final_newline_state():
+    assert minify("x = 1 -- c") == "x=1"
+    assert minify("x = 1 -- c\n") == "x=1\n"
+
+
+def test_comment_markers_inside_strings_are_kept():
+    source = "s = '-- keep' .. \"--[[ keep ]]\" -- drop\n"
+    result = round_trip(source)
+    assert "-- keep" in result and "--[[ keep ]]" in result and "drop" not in result
+    assert [kind for kind, text in tokenize(result) if kind == COMMENT] == []
+
+
+@pytest.mark.parametrize("source", ["s = 'open", "s = [==[ never closed ]=]", "--[[ open", "x = $"])
+def test_invalid_source_is_rejected(source):
+    with pytest.raises(LuaMinifyError):
+        minify(source)
+
+
+def test_cache_round_trip(tmp_path):
+    source = b"local x = 1 -- comment\nreturn x\n"
+    cache = MinifyCache(str(tmp_path / "cache"))
+    assert cache.minify_bytes(source) == b"local x=1\nreturn x\n"
+    assert MinifyCache(str(tmp_path / "cache")).minify_bytes(source) == b"local x=1\nreturn x\n"
+    assert len(list((tmp_path / "cache").rglob("*.lua"))) == 1
+
+
+def test_cache_write_failure_still_minifies(tmp_path):
+    # A file where the cache folder should be makes every cache write fail.
+    blocked = tmp_path / "cache"
+    blocked.write_bytes(b"")
+    script = tmp_path / "script.lua"
+    script.write_bytes(b"return 1 -- comment\n")
+    before, after = MinifyCache(str(blocked)).minify_file(str(script))
+    assert (before, after) == (20, 9)
+    assert script.read_bytes() == b"return 1\n"
+    assert sorted(os.listdir(tmp_path)) == ["cache", "script.lua"]
+
+
+def test_car_stage_ships_scripts_when_cache_cannot_be_written(tmp_path):
+    import builder
+
+    blocked = tmp_path / "cache"
+    blocked.write_bytes(b"")
+    scripts = tmp_path / "car" / "extension" / "lua"
+    scripts.mkdir(parents=True)
+    (scripts / "good.lua").write_bytes(b"return 1 -- comment\n")
+    (scripts / "bad.lua").write_bytes(b"return 'open\n")
+    saved = builder.minify_lua_scripts(str(tmp_path / "car"), "car", MinifyCache(str(blocked)))
+    assert saved == 11
+    assert (scripts / "good.lua").read_bytes() == b"return 1\n"
+    assert (scripts / "bad.lua").read_bytes() == b"return 'open\n"
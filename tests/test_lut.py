@@ -0,0 +1,106 @@
+import math
+
+import numpy as np
+import pytest
+
+from lut import LutError, check_lut, load_lut, parse_lut, validate_lut_file
+
+
+def test_numeric_table_with_comments_and_crlf():
+    table = parse_lut("; power curve\r\n0|10\r\n\r\n1000 | 20 ; peak\r\n  ;indented comment\r\n2000|15\r\n")
+    assert table.is_numeric
+    assert table.x.tolist() == [0, 1000, 2000]
+    assert table.y.tolist() == [10, 20, 15]
+    assert table.lines.tolist() == [2, 4, 6]
+    assert table.interpolate(500) == 15
+    assert table.interpolate(5000) == 15
+    assert check_lut(table) == []
+
+
+def test_bom_in_text_is_ignored():
+    table = parse_lut("\ufeff0|1\n1|2\n")
+    assert table.x.tolist() == [0, 1]
+
+
+def test_labelled_table():
+    table = parse_lut("STOCK|4.2\nSHORT|4.8 ; hill climbs\n")
+    assert not table.is_numeric
+    assert table.labels == ("STOCK", "SHORT")
+    assert table.lookup("SHORT") == 4.8
+    assert check_lut(table) == []
+    with pytest.raises(TypeError):
+        table.interpolate(1)
+
+
+@pytest.mark.parametrize("text, line, message", [
+    ("0|1\n1\n", 2, "expected 'key|value'"),
+    ("0|1\n1|2|3\n", 2, "expected 'key|value'"),
+    ("|1\n", 1, "missing key"),
+    ("0|x\n", 1, "is not a number"),
+    ("0|1\nSTOCK|2\n", 2, "key 'STOCK' is not a number"),
+    ("; only a comment\n", None, "table is empty"),
+])
+def test_malformed_tables(text, line, message):
+    with pytest.raises(LutError) as raised:
+        parse_lut(text, "power.lut")
+    assert raised.value.line == line
+    assert message in raised.value.message
+
+
+def test_non_increasing_keys():
+    errors = check_lut(parse_lut("0|1\n100|2\n100|3\n50|4\n", "power.lut"))
+    assert [(error.line, error.message) for error in errors] == [
+        (3, "key 100 does not increase from 100 (line 2)"),
+        (4, "key 50 does not increase from 100 (line 3)"),
+    ]
+
+
+def test_nan_and_infinite_entries():
+    table = parse_lut("0|1\n1|nan\ninf|2\n")
+    assert math.isnan(table.y[1])
+    errors = check_lut(table)
+    assert [(error.line, error.message) for error in errors] == [
+        (2, "NaN or infinite entry"),
+        (3, "NaN or infinite entry"),
+    ]
+
+
+def test_load_utf8_bom_file(tmp_path):
+    path = tmp_path / "power.lut"
+    path.write_bytes(b"\xef\xbb\xbf0|10\r\n1000|20\r\n")
+    assert validate_lut_file(str(path)) == []
+    assert load_lut(str(path)).x.tolist() == [0, 1000]
+
+
+def test_non_utf8_bytes_only_allowed_in_comments(tmp_path):
+    path = tmp_path / "gearing.rto"
+    path.write_bytes("; réglage d'usine\nSTOCK|4.2 ; café\n".encode("cp1252"))
+    assert validate_lut_file(str(path)) == []
+    assert load_lut(str(path)).labels == ("STOCK",)
+
+    path.write_bytes("STOCK|4.2\nCAFÉ|4.8\n".encode("cp1252"))
+    errors = validate_lut_file(str(path))
+    assert [(error.line, error.message) for error in errors] == [(2, "not valid UTF-8 text")]
+
+
+@pytest.mark.parametrize("text", ["0|1\n500|1.5\n1000|3\n", "STOCK|4.2\nSHORT|4.8\n"])
+def test_npy_cache_round_trip(tmp_path, text):
+    path = tmp_path / "table.lut"
+    path.write_text(text)
+    cache_dir = tmp_path / "cache"
+
+    parsed = load_lut(str(path), str(cache_dir))
+    assert len(list(cache_dir.rglob("*.npy"))) == 1
+    cached = load_lut(str(path), str(cache_dir))
+    assert isinstance(cached.y, np.memmap)
+    assert cached.is_numeric == parsed.is_numeric
+    assert cached.labels == parsed.labels
+    assert np.array_equal(cached.y, parsed.y)
+    assert cached.lines.tolist() == parsed.lines.tolist()
+    if parsed.is_numeric:
+        assert np.array_equal(cached.x, parsed.x)
+
+    # A changed file gets its own entry instead of the stale one.
+    path.write_text(text + ("2000|4\n" if parsed.is_numeric else "LONG|3.9\n"))
+    assert len(load_lut(str(path), str(cache_dir))) == len(parsed) + 1
+    assert len(list(cache_dir.rglob("*.npy"))) == 2
@@ -0,0 +1,51 @@
+import struct
+import zlib
+
+from png_optimize import PNG_SIGNATURE, PngOptimizer, decode_pixels, write_chunk
+
+
+def make_png(width=64, height=64):
+    """An 8-bit RGB gradient stored unfiltered and uncompressed, so it always optimizes."""
+    rows = b"".join(
+        b"\x00" + bytes(channel for x in range(width) for channel in (x * 4 % 256, y * 4 % 256, (x + y) % 256))
+        for y in range(height)
+    )
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return PNG_SIGNATURE + write_chunk(b"IHDR", header) + write_chunk(b"IDAT", zlib.compress(rows, 0)) + write_chunk(b"IEND", b"")
+
+
+def test_results_are_not_kept_in_memory(tmp_path):
+    data = make_png()
+    optimizer = PngOptimizer(str(tmp_path / "png"), workers=1)
+    with optimizer:
+        result = optimizer.optimize_bytes(data)
+    # Shutting the pool down waits for the done callbacks.
+    assert len(result) < len(data)
+    assert decode_pixels(result) == decode_pixels(data)
+    assert optimizer._futures == {}
+    assert len(list((tmp_path / "png").rglob("*.png"))) == 1
+
+    # A repeat is served from the disk cache, not recomputed or held.
+    with PngOptimizer(str(tmp_path / "png"), workers=1) as optimizer:
+        assert optimizer.optimize_bytes(data) == result
+        assert optimizer._futures == {}
+
+
+def test_concurrent_submissions_share_the_in_flight_future(tmp_path):
+    data = make_png(96, 96)
+    with PngOptimizer(str(tmp_path / "png"), workers=1) as optimizer:
+        first = optimizer.submit_bytes(data)
+        second = optimizer.submit_bytes(data)
+        assert first.result() == second.result()
+        assert first is second or second.done()
+    assert optimizer._futures == {}
+
+
+def test_optimize_file_without_cache_dir(tmp_path):
+    path = tmp_path / "image.png"
+    path.write_bytes(make_png())
+    with PngOptimizer(None, workers=1) as optimizer:
+        before, after = optimizer.optimize_file(str(path))
+        assert after < before == len(make_png())
+    assert optimizer._futures == {}
+    assert path.stat().st_size == after
@@ -0,0 +1,97 @@
+import os
+import random
+import zipfile
+
+import pytest
+
+import builder
+from build_fs import ZipFileSystem, deflate_file
+
+
+@pytest.fixture
+def release_members(tmp_path):
+    """Members as collect_release_files() lists them: large ones go to the process pool."""
+    rng = random.Random(1234)
+    contents = {
+        "content/cars/kart_a/data.acd": bytes(rng.getrandbits(8) for _ in range(200_000)),
+        "content/cars/kart_a/kart_a.kn5": b"mesh data " * 40_000,
+        "content/cars/kart_a/ui/ui_car.json": b'{"name": "Kart A"}',
+        "content/cars/kart_b/skins/défaut/livery.png": b"\x89PNG" + b"\x00" * 100_000,
+        "content/cars/kart_b/sfx/kart_b.bank": b"",
+        "LICENSE.txt": b"license text\n",
+    }
+    members = []
+    for archive_name, content in contents.items():
+        path = tmp_path / "Build" / archive_name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(content)
+        members.append((str(path), archive_name))
+    return members, contents
+
+
+@pytest.mark.parametrize("backend", builder.BACKENDS)
+def test_release_zip_is_valid_on_every_backend(tmp_path, release_members, backend):
+    members, contents = release_members
+    executors = builder.BuildExecutors(backend, 2)
+    zip_path = tmp_path / f"{backend}.zip"
+    try:
+        builder.write_release_zip(str(zip_path), members, executors, extra_files={"patch.json": "{}"})
+    finally:
+        executors.shutdown()
+
+    with zipfile.ZipFile(zip_path) as archive:
+        assert archive.testzip() is None
+        assert archive.namelist() == [archive_name for path, archive_name in members] + ["patch.json"]
+        for archive_name, content in contents.items():
+            assert archive.read(archive_name) == content
+            assert archive.getinfo(archive_name).compress_type == zipfile.ZIP_DEFLATED
+        assert archive.read("patch.json") == b"{}"
+
+
+def test_offloaded_members_match_zipfile_compression(tmp_path, release_members):
+    members, contents = release_members
+    infos = {}
+    for backend in ("threads", "hybrid"):
+        executors = builder.BuildExecutors(backend, 2)
+        try:
+            builder.write_release_zip(str(tmp_path / f"{backend}.zip"), members, executors)
+        finally:
+            executors.shutdown()
+        with zipfile.ZipFile(tmp_path / f"{backend}.zip") as archive:
+            infos[backend] = [(info.filename, info.CRC, info.compress_size, info.date_time, info.external_attr)
+                              for info in archive.infolist()]
+    assert infos["hybrid"] == infos["threads"]
+
+
+def test_write_raw_member(tmp_path):
+    src = tmp_path / "big.bin"
+    src.write_bytes(b"abc" * 50_000)
+    raw = tmp_path / "big.raw"
+    crc, file_size, compress_size = deflate_file(str(src), str(raw))
+    assert file_size == 150_000 and compress_size == raw.stat().st_size
+
+    with ZipFileSystem(str(tmp_path / "out.zip")) as zip_fs:
+        assert zip_fs.raw_members
+        assert zip_fs.write_raw_member(str(src), "a/big.bin", str(raw), crc, file_size, compress_size)
+        with zip_fs.open_write("a/small.txt") as f:
+            f.write(b"small")
+        with pytest.warns(UserWarning, match="Duplicate name"):
+            zip_fs.write_raw_member(str(src), "a/big.bin", str(raw), crc, file_size, compress_size)
+        assert zip_fs.stat("a/big.bin").st_size == file_size
+
+    with zipfile.ZipFile(tmp_path / "out.zip") as archive:
+        assert archive.testzip() is None
+        assert [info.filename for info in archive.infolist()] == ["a/big.bin", "a/small.txt", "a/big.bin"]
+        assert archive.read("a/small.txt") == b"small"
+
+
+def test_write_raw_member_declines_without_zipfile_support(tmp_path):
+    src = tmp_path / "file.bin"
+    src.write_bytes(b"x" * 1000)
+    raw = tmp_path / "file.raw"
+    sizes = deflate_file(str(src), str(raw))
+    with ZipFileSystem(str(tmp_path / "out.zip")) as zip_fs:
+        zip_fs.raw_members = False
+        assert not zip_fs.write_raw_member(str(src), "file.bin", str(raw), *sizes)
+    with zipfile.ZipFile(tmp_path / "out.zip") as archive:
+        assert archive.namelist() == []
@@ -0,0 +1,62 @@
+import argparse
+import os
+import shutil
+import socket
+import threading
+import time
+
+import pytest
+
+import builder
+
+SOURCE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Source")
+
+pytestmark = pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="needs Unix sockets")
+
+
+@pytest.fixture
+def server(tmp_path):
+    script_dir = tmp_path / "project"
+    shutil.copytree(SOURCE_DIR, script_dir / "Source", symlinks=True)
+    args = argparse.Namespace(socket=None, workers=1, minify_lua=False, optimize_png=False, tree_shake=False,
+                              skip_lut_validation=True, index_config=False)
+    thread = threading.Thread(target=builder.serve,
+                              args=(str(script_dir), str(script_dir / "Source"), str(script_dir / "Build"), args))
+    thread.start()
+    address = builder.serve_address(args, str(script_dir))
+    token_path = builder.serve_token_path(str(script_dir))
+    for _ in range(100):
+        if os.path.exists(address) and os.path.exists(token_path):
+            break
+        time.sleep(0.05)
+    yield address, str(script_dir)
+    if thread.is_alive():
+        builder.send_request(address, {"command": "shutdown"}, lambda event: None, builder.read_serve_token(str(script_dir)))
+    thread.join(10)
+
+
+def test_requests_need_the_token(server):
+    address, script_dir = server
+    token_path = builder.serve_token_path(script_dir)
+    token = builder.read_serve_token(script_dir)
+    assert len(token) == 64
+    if os.name == "posix":
+        assert os.stat(token_path).st_mode & 0o077 == 0
+
+    for bad_token in (None, "", "0" * 64):
+        for command in ("status", "rebuild", "shutdown"):
+            done = builder.send_request(address, {"command": command}, lambda event: None, bad_token)
+            assert done["ok"] is False and "token" in done["error"]
+    assert not os.path.exists(os.path.join(script_dir, "Build"))
+
+    events = []
+    done = builder.send_request(address, {"command": "status"}, events.append, token)
+    assert done["ok"] is True
+    assert events[0]["event"] == "status" and "ohyeah2389_modkart_dd2" in events[0]["cars"]
+
+    assert builder.send_request(address, {"command": "shutdown"}, lambda event: None, token)["ok"] is True
+    for _ in range(100):
+        if not os.path.exists(token_path):
+            break
+        time.sleep(0.05)
+    assert not os.path.exists(token_path)
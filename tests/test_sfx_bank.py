@@ -0,0 +1,50 @@
+import builder
+
+
+def make_car(source_dir, car_name, bank_name, guids):
+    sfx = source_dir / car_name / "sfx"
+    sfx.mkdir(parents=True)
+    (sfx / bank_name).write_bytes(b"FSB5 bank data")
+    (sfx / "GUIDs.txt").write_text(guids)
+    (source_dir / "base").mkdir(exist_ok=True)
+
+
+def build(source_dir, build_dir, car_name):
+    steps = builder.car_build_steps(car_name, str(source_dir), str(build_dir), str(source_dir / "base"),
+                                    [], "1.0", 2025, fs=builder.DISK)
+    return builder.run_build_steps(steps, car_name, None)
+
+
+def test_find_sfx_bank_prefers_topmost_layer(tmp_path):
+    (tmp_path / "base" / "sfx").mkdir(parents=True)
+    (tmp_path / "base" / "sfx" / "template.bank").write_bytes(b"")
+    (tmp_path / "kart" / "sfx").mkdir(parents=True)
+    assert builder.find_sfx_bank(str(tmp_path), ["base", "kart"]) == "template"
+    (tmp_path / "kart" / "sfx" / "kart_sounds.bank").write_bytes(b"")
+    assert builder.find_sfx_bank(str(tmp_path), ["base", "kart"]) == "kart_sounds"
+    assert builder.find_sfx_bank(str(tmp_path), ["missing"]) is None
+
+
+def test_bank_is_renamed_and_references_follow(tmp_path):
+    make_car(tmp_path / "Source", "kart_a", "template_sounds.bank",
+             "{1} bank:/template_sounds\n{2} event:/cars/template_sounds/engine\n{3} event:/cars/other/engine\n")
+    assert build(tmp_path / "Source", tmp_path / "Build", "kart_a") is not False
+
+    sfx = tmp_path / "Build" / "kart_a" / "sfx"
+    assert sorted(path.name for path in sfx.iterdir()) == ["GUIDs.txt", "kart_a.bank"]
+    assert (sfx / "kart_a.bank").read_bytes() == b"FSB5 bank data"
+    assert (sfx / "GUIDs.txt").read_text() == \
+        "{1} bank:/kart_a\n{2} event:/cars/kart_a/engine\n{3} event:/cars/other/engine\n"
+
+
+def test_bank_already_named_after_car_is_kept(tmp_path):
+    make_car(tmp_path / "Source", "kart_a", "kart_a.bank", "{1} bank:/kart_a\n")
+    assert build(tmp_path / "Source", tmp_path / "Build", "kart_a") is not False
+    assert (tmp_path / "Build" / "kart_a" / "sfx" / "kart_a.bank").exists()
+
+
+def test_second_bank_fails_the_car(tmp_path):
+    make_car(tmp_path / "Source", "kart_a", "template_sounds.bank", "")
+    (tmp_path / "Source" / "kart_a" / "sfx" / "extra.bank").write_bytes(b"")
+    assert build(tmp_path / "Source", tmp_path / "Build", "kart_a") is False
+    assert not builder.check_sfx_bank(str(tmp_path / "Build" / "kart_a"), "kart_a")